@@ -0,0 +1,162 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+# Admission control in front of reply generation. Every reply needs one of
+# ADMISSION_MAX_CONCURRENT slots. When none is free the request waits in its
+# class's queue; freed slots go to the highest priority class first. A request
+# that cannot get a slot within its class's deadline, or finds the queue full,
+# is turned away at once (503) instead of waiting without bound.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+# slots text replies can never take, so a live call finds one free straight away
+ADMISSION_VOICE_RESERVED = int(os.getenv("ADMISSION_VOICE_RESERVED", "8"))
+
+VOICE = "voice"
+TEXT = "text"
+# replies started before the user finished talking (see VoiceManager/speculation.py)
+SPECULATIVE = "speculative"
+
+
+class PriorityClass:
+    def __init__(self, name: str, priority: int, max_queue: int, deadline: float, reserved: int = 0):
+        self.name = name
+        # lower goes first
+        self.priority = priority
+        self.max_queue = max_queue
+        self.deadline = deadline
+        # slots kept free for more important classes
+        self.reserved = reserved
+        self.active = 0
+        self.waiting: deque = deque()
+
+
+def default_classes():
+    return [
+        PriorityClass(
+            VOICE, 0,
+            max_queue=int(os.getenv("ADMISSION_VOICE_QUEUE", "64")),
+            deadline=float(os.getenv("ADMISSION_VOICE_DEADLINE_MS", "500")) / 1000,
+        ),
+        PriorityClass(
+            SPECULATIVE, 1,
+            max_queue=int(os.getenv("ADMISSION_SPECULATIVE_QUEUE", "0")),
+            deadline=0.0,
+            reserved=ADMISSION_VOICE_RESERVED,
+        ),
+        PriorityClass(
+            TEXT, 2,
+            max_queue=int(os.getenv("ADMISSION_TEXT_QUEUE", "256")),
+            deadline=float(os.getenv("ADMISSION_TEXT_DEADLINE_MS", "5000")) / 1000,
+            reserved=ADMISSION_VOICE_RESERVED,
+        ),
+    ]
+
+
+wait_seconds = metrics.histogram("admission_wait_seconds", "Time a reply waited for a generation slot", ["class"])
+shed_total = metrics.counter("admission_shed_total", "Replies turned away as busy", ["class", "reason"])
+active_gauge = metrics.gauge("admission_active", "Replies currently generating", ["class"])
+queued_gauge = metrics.gauge("admission_queued", "Replies waiting for a generation slot", ["class"])
+
+
+class Busy(Exception):
+    def __init__(self, class_name: str, reason: str):
+        super().__init__(f"No capacity for {class_name} replies ({reason})")
+        self.class_name = class_name
+        self.reason = reason
+
+
+class AdmissionController:
+    """Global concurrency cap with priority classes and bounded, deadline-limited queues."""
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, classes=None, enabled: bool = ADMISSION_ENABLED):
+        self.max_concurrent = max_concurrent
+        self.enabled = enabled
+        self.classes: Dict[str, PriorityClass] = {c.name: c for c in (classes or default_classes())}
+        self._by_priority = sorted(self.classes.values(), key=lambda c: c.priority)
+        self.active = 0
+        for c in self.classes.values():
+            active_gauge.labels(c.name).set_function(lambda c=c: c.active)
+            queued_gauge.labels(c.name).set_function(lambda c=c: len(c.waiting))
+
+    def _has_room(self, c: PriorityClass) -> bool:
+        return self.active < self.max_concurrent - c.reserved
+
+    async def acquire(self, class_name: str):
+        """Wait for a slot; raises Busy if the queue is full or the deadline passes."""
+        c = self.classes[class_name]
+        if not self.enabled:
+            return
+        # nobody of the same or higher priority may be overtaken
+        if self._has_room(c) and not any(o.waiting for o in self._by_priority if o.priority <= c.priority):
+            self._grant(c)
+            wait_seconds.labels(c.name).observe(0.0)
+            return
+        if len(c.waiting) >= c.max_queue:
+            shed_total.labels(c.name, "queue_full").inc()
+            raise Busy(c.name, "queue_full")
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        c.waiting.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), c.deadline)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                c.waiting.remove(waiter)
+                waiter.cancel()
+                shed_total.labels(c.name, "deadline").inc()
+                raise Busy(c.name, "deadline")
+        except asyncio.CancelledError:
+            # client went away while queued; give back a slot granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release(class_name)
+            elif waiter in c.waiting:
+                c.waiting.remove(waiter)
+            raise
+        wait_seconds.labels(c.name).observe(time.perf_counter() - started)
+
+    def release(self, class_name: str):
+        if not self.enabled:
+            return
+        c = self.classes[class_name]
+        c.active -= 1
+        self.active -= 1
+        self._dispatch()
+
+    def _grant(self, c: PriorityClass):
+        c.active += 1
+        self.active += 1
+
+    def _dispatch(self):
+        # hand free slots to waiters, most important class first
+        for c in self._by_priority:
+            while c.waiting and self._has_room(c):
+                waiter = c.waiting.popleft()
+                if waiter.done():
+                    continue
+                self._grant(c)
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, class_name: str):
+        await self.acquire(class_name)
+        try:
+            yield
+        finally:
+            self.release(class_name)
+
+
+admission = AdmissionController()
@@ -0,0 +1,122 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+# agent id -> settings, see agents.json
+AGENTS_CONFIG = os.getenv("AGENTS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents.json"))
+# how often the file is checked for changes (0 disables hot reload)
+AGENTS_RELOAD_INTERVAL = float(os.getenv("AGENTS_RELOAD_INTERVAL", "5"))
+
+# used when a request names no agent, or one that is not configured
+DEFAULT_AGENT_ID = "default"
+
+T = TypeVar("T")
+
+reloads = metrics.counter("agent_config_reloads_total", "Agent configuration reloads", ["result"])
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    agent_id: str
+    system_prompt: str = ""
+    model: str = "gpt-4o-mini"
+    # None keeps the LLM client's default
+    temperature: Optional[float] = None
+    memory_token_limit: int = 4000
+
+
+def parse_agents(data: dict) -> Dict[str, AgentConfig]:
+    known = {f.name for f in fields(AgentConfig)} - {"agent_id"}
+    configs = {}
+    for agent_id, settings in data.items():
+        unknown = set(settings) - known
+        if unknown:
+            raise ValueError(f"Agent {agent_id}: unknown settings {sorted(unknown)}")
+        configs[agent_id] = AgentConfig(agent_id=agent_id, **settings)
+    configs.setdefault(DEFAULT_AGENT_ID, AgentConfig(agent_id=DEFAULT_AGENT_ID))
+    return configs
+
+
+class AgentRegistry(Generic[T]):
+    """
+    Agent configurations from AGENTS_CONFIG, each compiled once into a template.
+
+    `compile(config)` builds what every session of the agent shares (see
+    llm_logic.AgentTemplate); `get()` is a dict lookup. When the file
+    changes only agents whose settings changed are compiled again, and a
+    file that fails to load or compile leaves the previous agents in place.
+    Unknown agent ids get the default agent.
+    """
+
+    def __init__(self, compile: Callable[[AgentConfig], T], path: str = AGENTS_CONFIG):
+        self.compile = compile
+        self.path = path
+        self._templates: Dict[str, T] = {}
+        self._configs: Dict[str, AgentConfig] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, agent_id: str) -> T:
+        templates = self._templates
+        if not templates:
+            self.reload()
+            templates = self._templates
+        template = templates.get(agent_id)
+        return template if template is not None else templates[DEFAULT_AGENT_ID]
+
+    @property
+    def configs(self) -> Dict[str, AgentConfig]:
+        return dict(self._configs)
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the file if it changed since the last load; True if the agents changed."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if not force and self._templates and mtime == self._mtime:
+                return False
+            try:
+                data = {}
+                if mtime is not None:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                configs = parse_agents(data)
+                templates = {
+                    agent_id: self._templates[agent_id] if self._configs.get(agent_id) == config else self.compile(config)
+                    for agent_id, config in configs.items()
+                }
+            except Exception as e:
+                reloads.labels("failed").inc()
+                logger.error(f"Failed to load agents from {self.path}, keeping the previous ones: {e!r}")
+                if not self._templates:
+                    raise
+                self._mtime = mtime
+                return False
+            changed = configs != self._configs
+            # swap in one go; sessions mid-turn keep the template they looked up
+            self._configs, self._templates, self._mtime = configs, templates, mtime
+            reloads.labels("ok").inc()
+            if changed:
+                logger.info(f"Loaded agents: {', '.join(sorted(configs))}")
+            return changed
+
+    async def watch(self, interval: float = AGENTS_RELOAD_INTERVAL):
+        """Reload on change until cancelled."""
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.reload)
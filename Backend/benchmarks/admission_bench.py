@@ -0,0 +1,140 @@
+"""
+Voice latency while text chats saturate the backend, with and without
+admission control (admission.py).
+
+Starts the backend in a subprocess with the fake LLM of scaling_bench.py
+behind a provider that serves --llm-capacity generations at a time (first
+come, first served, like a rate-limited API), then for --seconds runs
+--text callers hammering /chat/stream/text and --voice callers taking turns on
+/chat/stream/voice with a short pause between turns, like a phone call.
+Reports time to first byte for voice and how many requests of each kind
+were answered or turned away (503). The text load runs in its own
+process so a busy client loop does not inflate the voice timings.
+
+    cd Backend
+    python benchmarks/admission_bench.py --text 200 --voice 8
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(__file__))
+from scaling_bench import BACKEND_DIR, free_port, percentile, wait_for
+
+
+async def load(port: int, text_callers: int, voice_callers: int, seconds: float):
+    import httpx
+
+    stats = {kind: {"ok": 0, "busy": 0, "failed": 0, "ttfb": []} for kind in ("voice", "text")}
+    stop = time.monotonic() + seconds
+
+    async def call(client, kind, session_id, turn):
+        if kind == "voice":
+            request = client.stream(
+                "POST", "/chat/stream/voice", json={"session_id": session_id, "user_input": f"question {turn}"}
+            )
+        else:
+            request = client.stream(
+                "POST", "/chat/stream/text", params={"session_id": session_id, "user_input": f"question {turn}"}
+            )
+        started = time.perf_counter()
+        async with request as response:
+            if response.status_code == 503:
+                stats[kind]["busy"] += 1
+                await response.aread()
+                return
+            first = None
+            async for _ in response.aiter_raw():
+                if first is None:
+                    first = time.perf_counter() - started
+            stats[kind]["ok"] += 1
+            stats[kind]["ttfb"].append(first)
+
+    async def caller(client, kind, i):
+        turn = 0
+        while time.monotonic() < stop:
+            try:
+                await call(client, kind, f"{kind}_{i}_{time.time_ns()}", turn)
+            except httpx.HTTPError:
+                stats[kind]["failed"] += 1
+            turn += 1
+            # a caller listens to the reply and thinks before talking again
+            await asyncio.sleep(1.0 if kind == "voice" else 0.05)
+
+    limits = httpx.Limits(max_connections=text_callers + voice_callers)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        await asyncio.gather(
+            *(caller(client, "text", i) for i in range(text_callers)),
+            *(caller(client, "voice", i) for i in range(voice_callers)),
+        )
+    return stats
+
+
+def run(admission: bool, args):
+    data_dir = tempfile.mkdtemp(prefix="admission_bench_")
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "unused"),
+        CHAT_STORE_DIR=data_dir,
+        ADMISSION_ENABLED="true" if admission else "false",
+        ADMISSION_MAX_CONCURRENT=str(args.max_concurrent),
+    )
+    server = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(__file__), "scaling_bench.py"), "--serve-worker", str(port),
+        "--tokens", str(args.tokens), "--ttft-ms", str(args.ttft_ms),
+        "--token-delay-ms", str(args.token_delay_ms), "--cpu-ms", str(args.cpu_ms),
+        "--llm-capacity", str(args.llm_capacity),
+    ], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        text_load = subprocess.Popen(
+            [sys.executable, __file__, "--drive-text", str(port), "--text", str(args.text), "--seconds", str(args.seconds)],
+            stdout=subprocess.PIPE,
+        )
+        voice = asyncio.run(load(port, 0, args.voice, args.seconds))["voice"]
+        text = json.loads(text_load.communicate()[0])
+    finally:
+        server.terminate()
+        server.wait()
+
+    ttfb = voice["ttfb"] or [float("nan")]
+    print(
+        f"admission={'on ' if admission else 'off'} "
+        f"voice ok={voice['ok']:4d} busy={voice['busy']:3d} failed={voice['failed']:3d} "
+        f"ttfb p50={percentile(ttfb, 50) * 1000:6.0f}ms p95={percentile(ttfb, 95) * 1000:6.0f}ms | "
+        f"text ok={text['ok']:5d} busy={text['busy']:5d} failed={text['failed']:4d}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice latency under text overload, with and without admission control")
+    parser.add_argument("--text", type=int, default=200)
+    parser.add_argument("--voice", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--llm-capacity", type=int, default=32)
+    # the admission cap matches what the provider can serve
+    parser.add_argument("--max-concurrent", type=int, default=32)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-delay-ms", type=float, default=10)
+    parser.add_argument("--cpu-ms", type=float, default=1)
+    parser.add_argument("--mode", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--drive-text", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.drive_text:
+        print(json.dumps(asyncio.run(load(args.drive_text, args.text, 0, args.seconds))["text"]))
+        return
+
+    for mode in (["off", "on"] if args.mode == "both" else [args.mode]):
+        run(mode == "on", args)
+
+
+if __name__ == "__main__":
+    main()
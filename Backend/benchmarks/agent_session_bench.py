@@ -0,0 +1,110 @@
+"""
+Cost of creating a chat session, per agent.
+
+Writes an agents.json with a few agents (see agents.py) and, for each,
+creates --sessions new sessions two ways:
+
+  template   what llm_logic does: the agent's LLM, system prompt and its
+             token count are compiled once into an AgentTemplate, a
+             session is a memory over its history plus a reference to it
+  rebuild    the same settings built for every session: an OpenAI LLM with
+             its own HTTP client and a SimpleChatEngine.from_defaults
+
+No requests are sent; the API key is only needed to build the clients.
+Also reports how long a hot reload takes when one agent changes.
+
+    cd Backend
+    python benchmarks/agent_session_bench.py --sessions 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+AGENTS = {
+    "default": {},
+    "support": {
+        "system_prompt": "You are the support line of an online shop. Answer in two sentences at most. " * 8,
+        "temperature": 0.3,
+    },
+    "sales": {
+        "system_prompt": "You help callers pick a phone plan. Ask one question at a time.",
+        "model": "gpt-4o",
+        "memory_token_limit": 8000,
+    },
+}
+
+
+def per_session(fn, count: int):
+    samples = []
+    for i in range(count):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e6, statistics.mean(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session creation cost per agent: shared templates vs per-session builds")
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="agent_session_bench_")
+    config_path = os.path.join(data_dir, "agents.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(AGENTS, f)
+    os.environ.update(AGENTS_CONFIG=config_path, CHAT_STORE_DIR=data_dir)
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+    import llm_logic
+    from llama_index.llms.openai import OpenAI
+    from llama_index.core.chat_engine import SimpleChatEngine
+    from session_memory import RollingSummaryMemory
+
+    started = time.perf_counter()
+    llm_logic.agents.reload()
+    print(f"compile {len(AGENTS)} agents: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def rebuild(config, session_id):
+        history = llm_logic.load_chat_history(session_id, token_limit=config.memory_token_limit)
+        memory = RollingSummaryMemory.from_defaults(
+            chat_history=history, token_limit=config.memory_token_limit, summarizer=llm_logic.summarize_history
+        )
+        settings = {} if config.temperature is None else {"temperature": config.temperature}
+        llm = OpenAI(model=config.model, api_key=os.environ["OPENAI_API_KEY"], streaming=True, **settings)
+        # the HTTP client is made on the first request of every new LLM object
+        llm._get_aclient()
+        return SimpleChatEngine.from_defaults(llm=llm, memory=memory, system_prompt=config.system_prompt or None)
+
+    for agent_id in AGENTS:
+        template = llm_logic.agents.get(agent_id)
+        config = template.config
+        results = {
+            "template": per_session(lambda i: llm_logic.build_session(f"t_{agent_id}_{i}", template), args.sessions),
+            "rebuild": per_session(lambda i: rebuild(config, f"r_{agent_id}_{i}"), args.sessions),
+        }
+        print(
+            f"agent={agent_id:<8s} "
+            + "  ".join(f"{name} p50={p50:8.1f}us mean={mean:8.1f}us" for name, (p50, mean) in results.items())
+        )
+
+    # change one agent and reload: only that agent is compiled again
+    AGENTS["support"]["temperature"] = 0.5
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(AGENTS, f)
+    before = {agent_id: llm_logic.agents.get(agent_id) for agent_id in AGENTS}
+    started = time.perf_counter()
+    llm_logic.agents.reload(force=True)
+    elapsed = time.perf_counter() - started
+    recompiled = [agent_id for agent_id in AGENTS if llm_logic.agents.get(agent_id) is not before[agent_id]]
+    print(f"reload after editing support: {elapsed * 1000:.1f}ms, recompiled {recompiled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Save/load latency and throughput of the chat history backends.
+
+Fills a fresh store with N sessions of --history messages each, then times
+random per-turn saves (append of a user/assistant pair) and bounded loads
+(token_limit=4000, what build_session asks for) against it.
+
+    cd Backend
+    python benchmarks/chat_store_bench.py --sessions 1000,100000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from history_store import FileChatStore, SqliteChatStore
+
+TOKEN_LIMIT = 4000
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def make_store(backend: str, directory: str):
+    if backend == "file":
+        return FileChatStore(directory)
+    return SqliteChatStore(os.path.join(directory, "chat_history.db"))
+
+
+def turn(i: int):
+    return [
+        {"role": "user", "content": f"user message {i} " * 8},
+        {"role": "assistant", "content": f"assistant reply {i} " * 30},
+    ]
+
+
+def timed(fn, ops):
+    latencies = []
+    started = time.perf_counter()
+    for args in ops:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started
+
+
+def report(backend, sessions, name, latencies, wall):
+    print(
+        f"{backend:6s} sessions={sessions:<7d} {name:8s} "
+        f"p50={percentile(latencies, 50) * 1e6:8.0f}us p99={percentile(latencies, 99) * 1e6:8.0f}us "
+        f"throughput={len(latencies) / wall:9.0f} ops/s"
+    )
+
+
+def run(backend: str, sessions: int, history: int, ops: int):
+    directory = tempfile.mkdtemp(prefix=f"chat_store_{backend}_")
+    store = make_store(backend, directory)
+    try:
+        ids = [f"session_{i}" for i in range(sessions)]
+        fill = [(sid, turn(t)) for t in range(history // 2) for sid in ids]
+        latencies, wall = timed(store.append, fill)
+        report(backend, sessions, "populate", latencies, wall)
+
+        rng = random.Random(0)
+        picks = [rng.choice(ids) for _ in range(ops)]
+        latencies, wall = timed(store.append, [(sid, turn(i)) for i, sid in enumerate(picks)])
+        report(backend, sessions, "save", latencies, wall)
+
+        rng.shuffle(picks)
+        latencies, wall = timed(store.load, [(sid, TOKEN_LIMIT) for sid in picks])
+        report(backend, sessions, "load", latencies, wall)
+    finally:
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat store backend benchmark")
+    parser.add_argument("--sessions", default="1000,100000", help="comma separated session counts")
+    parser.add_argument("--history", type=int, default=20, help="messages per session before timing")
+    parser.add_argument("--ops", type=int, default=5000, help="timed saves and loads per run")
+    parser.add_argument("--backend", choices=["file", "sqlite", "both"], default="both")
+    args = parser.parse_args()
+
+    backends = ["file", "sqlite"] if args.backend == "both" else [args.backend]
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        for backend in backends:
+            run(backend, sessions, args.history, args.ops)
+
+
+if __name__ == "__main__":
+    main()
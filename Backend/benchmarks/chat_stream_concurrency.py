@@ -0,0 +1,114 @@
+"""
+Concurrent-stream capacity of the chat streaming path.
+
+Compares a synchronous generator over llama_index's blocking chat engine
+(the original streaming path, kept here as the baseline; Starlette iterates
+it on its threadpool, 40 threads by default) with the async generator
+(llm_logic.astream_chat_response) when N replies are requested at once. The LLM is
+replaced by benchmarks/fake_llm.py so only our own overhead is measured.
+
+    cd Backend
+    python benchmarks/chat_stream_concurrency.py --streams 200
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def blocking_stream(session_id: str, user_message: str):
+    # the original streaming path: SimpleChatEngine.stream_chat, iterated on a thread
+    import llm_logic
+    from llama_index.core.chat_engine import SimpleChatEngine
+
+    template = llm_logic.agents.get(llm_logic.DEFAULT_AGENT_ID)
+    session = llm_logic.build_session(session_id, template)
+    engine = SimpleChatEngine(
+        llm=template.llm, memory=session.memory, prefix_messages=template.prefix_messages,
+        callback_manager=template.llm.callback_manager,
+    )
+    yield from engine.stream_chat(user_message).response_gen
+    llm_logic.persist_session(session_id, session)
+
+
+async def consume(stream, started: float, result: dict, active: list):
+    first = None
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - started
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+    active[0] -= 1
+    result["ttft"] = first
+    result["total"] = time.perf_counter() - started
+
+
+async def run_mode(mode: str, streams: int):
+    from starlette.concurrency import iterate_in_threadpool
+    import llm_logic
+
+    results = [{} for _ in range(streams)]
+    active = [0, 0]
+    peak_threads = threading.active_count()
+    started = time.perf_counter()
+
+    def make_stream(i):
+        session_id = f"{mode}_{i}_{time.time_ns()}"
+        if mode == "sync":
+            return iterate_in_threadpool(blocking_stream(session_id, "hello"))
+        return llm_logic.astream_chat_response(session_id, "hello")
+
+    tasks = [asyncio.create_task(consume(make_stream(i), started, results[i], active)) for i in range(streams)]
+    while not all(t.done() for t in tasks):
+        peak_threads = max(peak_threads, threading.active_count())
+        await asyncio.sleep(0.05)
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+
+    ttft = [r["ttft"] for r in results]
+    total = [r["total"] for r in results]
+    print(
+        f"{mode:5s} streams={streams} wall={wall:6.2f}s "
+        f"ttft p50={percentile(ttft, 50) * 1000:7.0f}ms p95={percentile(ttft, 95) * 1000:7.0f}ms "
+        f"reply p95={percentile(total, 95) * 1000:7.0f}ms "
+        f"peak_concurrent={active[1]} peak_threads={peak_threads}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat stream capacity: sync vs async")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--token-delay-ms", type=float, default=20)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    args = parser.parse_args()
+
+    # keep the chat store out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="chat_bench_"))
+
+    import llm_logic
+    from benchmarks.fake_llm import FakeStreamingLLM
+    llm_logic.llm = FakeStreamingLLM(
+        tokens=args.tokens, ttft=args.ttft_ms / 1000, token_delay=args.token_delay_ms / 1000
+    )
+
+    modes = ["sync", "async"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run_mode(mode, args.streams))
+
+
+if __name__ == "__main__":
+    main()
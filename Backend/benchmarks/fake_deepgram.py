@@ -0,0 +1,135 @@
+"""
+Local stand-in for the Deepgram listen websocket (/v1/listen).
+
+Every audio chunk is expected to start with an 8 byte big-endian sequence
+number (see listen_load.py). For each chunk the server answers with an interim
+transcript "seq-<n>" after a configurable delay, and every `final_every`
+chunks it emits a final transcript covering the chunks since the last final.
+
+Run standalone:
+    python benchmarks/fake_deepgram.py --port 8765 --delay-ms 150
+and point the backend at it with DEEPGRAM_WS_URL=ws://127.0.0.1:8765
+"""
+import json
+import uuid
+import struct
+import asyncio
+import argparse
+
+import websockets
+
+CHUNK_SECONDS = 0.25
+
+
+def results_event(request_id: str, transcript: str, start: float, duration: float, is_final: bool) -> str:
+    return json.dumps({
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": duration,
+        "start": start,
+        "is_final": is_final,
+        "speech_final": is_final,
+        "channel": {
+            "alternatives": [{"transcript": transcript, "confidence": 0.99, "words": []}]
+        },
+        "metadata": {
+            "request_id": request_id,
+            "model_info": {"name": "fake", "version": "0", "arch": "fake"},
+            "model_uuid": "fake",
+        },
+        "from_finalize": False,
+    })
+
+
+def metadata_event(request_id: str, duration: float) -> str:
+    return json.dumps({
+        "type": "Metadata",
+        "request_id": request_id,
+        "sha256": "",
+        "created": "",
+        "duration": duration,
+        "channels": 1,
+    })
+
+
+class FakeDeepgram:
+    def __init__(self, delay: float = 0.15, final_every: int = 4):
+        self.delay = delay
+        self.final_every = final_every
+        self.connections = 0
+        self.active = 0
+
+    async def handler(self, websocket):
+        self.connections += 1
+        self.active += 1
+        request_id = str(uuid.uuid4())
+        pending = []
+        chunk_count = 0
+        sends = set()
+
+        async def send_later(payload: str):
+            await asyncio.sleep(self.delay)
+            try:
+                await websocket.send(payload)
+            except websockets.ConnectionClosed:
+                pass
+
+        def schedule(payload: str):
+            task = asyncio.create_task(send_later(payload))
+            sends.add(task)
+            task.add_done_callback(sends.discard)
+
+        def emit_final():
+            if pending:
+                start = pending[0][1]
+                text = " ".join(f"seq-{seq}" for seq, _ in pending)
+                schedule(results_event(request_id, text, start, CHUNK_SECONDS * len(pending), True))
+                pending.clear()
+
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    seq = struct.unpack("!Q", message[:8])[0] if len(message) >= 8 else chunk_count
+                    start = chunk_count * CHUNK_SECONDS
+                    chunk_count += 1
+                    pending.append((seq, start))
+                    if len(pending) >= self.final_every:
+                        emit_final()
+                    else:
+                        schedule(results_event(request_id, f"seq-{seq}", start, CHUNK_SECONDS, False))
+                    continue
+
+                control = json.loads(message).get("type")
+                if control == "CloseStream":
+                    emit_final()
+                    if sends:
+                        await asyncio.wait(set(sends))
+                    await websocket.send(metadata_event(request_id, chunk_count * CHUNK_SECONDS))
+                    await websocket.close()
+                    break
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.active -= 1
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0):
+        server = await websockets.serve(self.handler, host, port, max_queue=None)
+        return server, server.sockets[0].getsockname()[1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake Deepgram listen server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=150.0)
+    parser.add_argument("--final-every", type=int, default=4)
+    args = parser.parse_args()
+
+    fake = FakeDeepgram(delay=args.delay_ms / 1000, final_every=args.final_every)
+    server, port = await fake.serve(args.host, args.port)
+    print(f"Fake Deepgram listening on ws://{args.host}:{port}")
+    await server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Stand-in for the OpenAI LLM used by llm_logic, for benchmarks.
+
+Streams `tokens` tokens after `ttft` seconds, `token_delay` seconds apart,
+without any network access. The sync methods sleep, the async ones await,
+just like a real HTTP-backed client would block or yield.
+"""
+import time
+import asyncio
+from typing import Any, Sequence
+
+from llama_index.core.llms import (
+    LLM,
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+)
+
+
+class FakeStreamingLLM(LLM):
+    tokens: int = 40
+    ttft: float = 0.3
+    token_delay: float = 0.02
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeStreamingLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(is_chat_model=True, model_name="fake")
+
+    def _words(self):
+        return [f"word{i} " for i in range(self.tokens)]
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self.ttft + self.token_delay * self.tokens)
+        text = "".join(self._words())
+        return ChatResponse(message=ChatMessage(role="assistant", content=text))
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        def gen():
+            text = ""
+            time.sleep(self.ttft)
+            for word in self._words():
+                text += word
+                yield ChatResponse(message=ChatMessage(role="assistant", content=text), delta=word)
+                time.sleep(self.token_delay)
+        return gen()
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.ttft + self.token_delay * self.tokens)
+        text = "".join(self._words())
+        return ChatResponse(message=ChatMessage(role="assistant", content=text))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        async def gen():
+            text = ""
+            await asyncio.sleep(self.ttft)
+            for word in self._words():
+                text += word
+                yield ChatResponse(message=ChatMessage(role="assistant", content=text), delta=word)
+                await asyncio.sleep(self.token_delay)
+        return gen()
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self.chat([]).message.content)
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        def gen():
+            for chunk in self.stream_chat([]):
+                yield CompletionResponse(text=chunk.message.content, delta=chunk.delta)
+        return gen()
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=(await self.achat([])).message.content)
+
+    async def astream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        async def gen():
+            async for chunk in await self.astream_chat([]):
+                yield CompletionResponse(text=chunk.message.content, delta=chunk.delta)
+        return gen()
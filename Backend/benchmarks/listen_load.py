@@ -0,0 +1,220 @@
+"""
+Load benchmark for the /api/listen speech-to-text bridge.
+
+Starts the fake Deepgram upstream (fake_deepgram.py) and, unless --url is
+given, the backend itself in-process with DEEPGRAM_WS_URL pointed at the fake.
+N simulated browsers then push audio chunks at real-time pace and we report
+transcript latency percentiles plus thread count, RSS and CPU of the server.
+
+    cd Backend
+    python benchmarks/listen_load.py --sessions 200 --duration 20
+
+Against an already running server (start it with DEEPGRAM_WS_URL set to the
+fake, e.g. ws://127.0.0.1:8765 from `python benchmarks/fake_deepgram.py`):
+
+    python benchmarks/listen_load.py --url ws://127.0.0.1:8000/api/listen --server-pid <pid>
+
+Process stats are read from /proc and are therefore Linux only. When the server
+runs in-process its CPU figure includes the simulated browsers.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import statistics
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_deepgram import FakeDeepgram
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+class ProcStats:
+    """Samples threads, RSS and CPU time of one process from /proc."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.peak_threads = 0
+        self.peak_rss_mb = 0.0
+        self._cpu_start = self.cpu_seconds()
+        self._wall_start = time.perf_counter()
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def sample(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    self.peak_rss_mb = max(self.peak_rss_mb, int(line.split()[1]) / 1024)
+                elif line.startswith("Threads:"):
+                    self.peak_threads = max(self.peak_threads, int(line.split()[1]))
+
+    def cpu_percent(self) -> float:
+        wall = time.perf_counter() - self._wall_start
+        return 100 * (self.cpu_seconds() - self._cpu_start) / wall if wall else 0.0
+
+
+async def sample_forever(stats: ProcStats, interval: float = 0.5):
+    while True:
+        stats.sample()
+        await asyncio.sleep(interval)
+
+
+async def run_browser(url: str, duration: float, chunk_ms: int, chunk_bytes: int, grace: float, result: dict):
+    sent = {}
+    interim, final = [], []
+    n_chunks = int(duration * 1000 / chunk_ms)
+
+    async with websockets.connect(url, max_queue=None) as ws:
+        async def reader():
+            async for message in ws:
+                now = time.perf_counter()
+                data = json.loads(message)
+                if data.get("type") != "transcript":
+                    continue
+                seqs = [int(word.split("-", 1)[1]) for word in data["text"].split() if word.startswith("seq-")]
+                if not seqs or seqs[-1] not in sent:
+                    continue
+                (final if data["is_final"] else interim).append(now - sent[seqs[-1]])
+
+        reader_task = asyncio.create_task(reader())
+        padding = bytes(max(0, chunk_bytes - 8))
+        started = time.perf_counter()
+
+        for seq in range(n_chunks):
+            # pace against the schedule so slow sends do not accumulate drift
+            delay = started + seq * chunk_ms / 1000 - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent[seq] = time.perf_counter()
+            await ws.send(struct.pack("!Q", seq) + padding)
+
+        await asyncio.sleep(grace)
+        reader_task.cancel()
+
+    result["interim"] = interim
+    result["final"] = final
+    result["chunks"] = n_chunks
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_backend(port: int):
+    import uvicorn
+    from main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws_max_queue=1024)
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for /api/listen")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of audio per session")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions are started")
+    parser.add_argument("--chunk-ms", type=int, default=250, help="MediaRecorder timeslice")
+    parser.add_argument("--chunk-bytes", type=int, default=4000)
+    parser.add_argument("--delay-ms", type=float, default=150.0, help="fake upstream transcript delay")
+    parser.add_argument("--final-every", type=int, default=4)
+    parser.add_argument("--url", help="existing /api/listen endpoint; default starts the backend in-process")
+    parser.add_argument("--server-pid", type=int, help="pid to sample when using --url")
+    args = parser.parse_args()
+
+    fake = FakeDeepgram(delay=args.delay_ms / 1000, final_every=args.final_every)
+    fake_server, fake_port = await fake.serve()
+
+    server = None
+    if args.url:
+        url = args.url
+        pid = args.server_pid
+    else:
+        os.environ["DEEPGRAM_WS_URL"] = f"ws://127.0.0.1:{fake_port}"
+        os.environ.setdefault("DEEPGRAM_API_KEY", "benchmark")
+        port = free_port()
+        server, server_task = await start_backend(port)
+        url = f"ws://127.0.0.1:{port}/api/listen"
+        pid = os.getpid()
+
+    stats = ProcStats(pid) if pid else None
+    sampler = asyncio.create_task(sample_forever(stats)) if stats else None
+
+    results = [{} for _ in range(args.sessions)]
+    grace = args.delay_ms / 1000 + 1.0
+
+    async def staggered(i):
+        await asyncio.sleep(args.ramp * i / max(1, args.sessions))
+        try:
+            await run_browser(url, args.duration, args.chunk_ms, args.chunk_bytes, grace, results[i])
+        except Exception as e:
+            results[i]["error"] = repr(e)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(staggered(i) for i in range(args.sessions)))
+    wall = time.perf_counter() - wall
+
+    if sampler:
+        sampler.cancel()
+        stats.sample()
+
+    errors = [r["error"] for r in results if "error" in r]
+    interim = [x for r in results for x in r.get("interim", [])]
+    final = [x for r in results for x in r.get("final", [])]
+    session_p95 = [percentile(r["final"], 95) for r in results if r.get("final")]
+    expected_finals = sum(r.get("chunks", 0) for r in results) / args.final_every
+
+    print(f"sessions={args.sessions} duration={args.duration}s wall={wall:.1f}s errors={len(errors)}")
+    for name, values in (("interim", interim), ("final", final)):
+        print(
+            f"{name:8s} n={len(values):7d} "
+            f"p50={percentile(values, 50) * 1000:7.1f}ms "
+            f"p95={percentile(values, 95) * 1000:7.1f}ms "
+            f"p99={percentile(values, 99) * 1000:7.1f}ms"
+        )
+    if session_p95:
+        print(
+            f"per-session final p95: median={statistics.median(session_p95) * 1000:.1f}ms "
+            f"worst={max(session_p95) * 1000:.1f}ms"
+        )
+    print(f"finals delivered: {len(final)}/{int(expected_finals)}")
+    if stats:
+        print(
+            f"server pid={pid} peak_threads={stats.peak_threads} "
+            f"peak_rss={stats.peak_rss_mb:.1f}MB cpu={stats.cpu_percent():.1f}%"
+        )
+    if errors:
+        print("first error:", errors[0])
+
+    if server:
+        server.should_exit = True
+        await server_task
+    fake_server.close()
+    await fake_server.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
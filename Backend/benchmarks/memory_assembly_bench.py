@@ -0,0 +1,80 @@
+"""
+Time to assemble the prompt history for one turn versus history length.
+
+For each history length the memory is filled with that many messages,
+then a turn is simulated (put the user message, get the window) and timed.
+ChatMemoryBuffer re-tokenizes the window for every message it drops;
+RollingSummaryMemory tokenizes each message once.
+
+    cd Backend
+    python benchmarks/memory_assembly_bench.py --lengths 10,100,1000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from llama_index.core.llms import ChatMessage
+from llama_index.core.memory import ChatMemoryBuffer
+
+from session_memory import RollingSummaryMemory
+
+TOKEN_LIMIT = 4000
+
+
+def history(length: int):
+    return [
+        ChatMessage(
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"message {i} about the order, the delivery address and the invoice number " * 4,
+        )
+        for i in range(length)
+    ]
+
+
+async def instant_summary(summary, messages):
+    return f"{len(messages)} more messages"
+
+
+def time_turns(memory, turns: int):
+    samples = []
+    for i in range(turns):
+        started = time.perf_counter()
+        memory.put(ChatMessage(role="user", content=f"follow up question {i}"))
+        memory.get()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory assembly time vs history length")
+    parser.add_argument("--lengths", default="10,100,1000")
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    for length in (int(n) for n in args.lengths.split(",")):
+        messages = history(length)
+        variants = {
+            "ChatMemoryBuffer": ChatMemoryBuffer.from_defaults(chat_history=list(messages), token_limit=TOKEN_LIMIT),
+            "RollingSummaryMemory": RollingSummaryMemory.from_defaults(
+                chat_history=list(messages), token_limit=TOKEN_LIMIT, summarizer=instant_summary
+            ),
+        }
+        for name, memory in variants.items():
+            # first call after rehydration tokenizes everything once
+            started = time.perf_counter()
+            window = memory.get()
+            first = time.perf_counter() - started
+            samples = time_turns(memory, args.turns)
+            print(
+                f"history={length:<6d} {name:22s} first={first * 1000:9.2f}ms "
+                f"per_turn={statistics.median(samples) * 1000:9.3f}ms window={len(window)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Estimated provider prompt-cache hits over a long conversation, by how the
+history window is truncated (context_assembly.py).
+
+A conversation of --turns turns with random message lengths runs through
+RollingSummaryMemory, with a summarizer that answers at once. For every
+turn the prompt (system prompt, summary, window) is fed to PrefixTracker,
+which estimates the part the provider serves from its cache. Block 0 is
+the old behaviour: drop just enough of the oldest messages every turn.
+
+    cd Backend
+    python benchmarks/prompt_cache_bench.py --turns 300 --blocks 0,0.125,0.25,0.5
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+import statistics
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+import session_memory
+from session_memory import RollingSummaryMemory
+from context_assembly import PrefixTracker
+from usage import TOKENS_PER_MESSAGE, count_tokens
+
+WORDS = "order delivery address invoice refund tracking parcel courier warehouse payment account".split()
+
+
+def text(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+async def converse(block: float, args):
+    session_memory.CONTEXT_TRUNCATE_BLOCK = block
+    rng = random.Random(args.seed)
+    # its own generator, so every block size sees the same conversation
+    summary_rng = random.Random(args.seed + 1)
+    summaries = 0
+
+    async def summarizer(summary, messages):
+        nonlocal summaries
+        summaries += 1
+        return f"summary {summaries}: " + text(summary_rng, args.summary_words, args.summary_words)
+
+    memory = RollingSummaryMemory.from_defaults(chat_history=[], token_limit=args.token_limit, summarizer=summarizer)
+    prefix = [ChatMessage(role=MessageRole.SYSTEM, content=text(rng, args.system_words, args.system_words))]
+    prefix_tokens = sum(count_tokens(m.content) + TOKENS_PER_MESSAGE for m in prefix)
+    tracker = PrefixTracker()
+
+    ratios, prompt_tokens, uncached = [], [], []
+    for _ in range(args.turns):
+        memory.put(ChatMessage(role="user", content=text(rng, 5, 40)))
+        prompt = prefix + memory.get(initial_token_count=prefix_tokens)
+        cached, total = tracker.observe(prompt)
+        ratios.append(cached / total)
+        prompt_tokens.append(total)
+        uncached.append(total - cached)
+        memory.put(ChatMessage(role="assistant", content=text(rng, 10, 120)))
+        # the summary of what was cut lands before the next turn
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    print(
+        f"block={block:<6.3f} cached ratio mean={statistics.mean(ratios):5.2f} "
+        f"turns with a hit={sum(r > 0 for r in ratios) / len(ratios):5.1%} "
+        f"prompt tokens mean={statistics.mean(prompt_tokens):6.0f} "
+        f"uncached tokens mean={statistics.mean(uncached):6.0f} summaries={summaries}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt cache hit estimate vs history truncation block size")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--blocks", default="0,0.125,0.25,0.5")
+    parser.add_argument("--token-limit", type=int, default=4000)
+    parser.add_argument("--system-words", type=int, default=300)
+    parser.add_argument("--summary-words", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for block in (float(b) for b in args.blocks.split(",")):
+        asyncio.run(converse(block, args))
+
+
+if __name__ == "__main__":
+    main()
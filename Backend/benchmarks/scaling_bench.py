@@ -0,0 +1,202 @@
+"""
+Voice turn throughput through session_router.py with 1, 2, 4... workers.
+
+Each worker is the real backend app (main.py) with the LLM replaced by
+benchmarks/fake_llm.py, plus --cpu-ms of busy work per reply standing in
+for the OpenAI client's response parsing. Sessions state and history go
+to a shared SQLite store, as in production multi-worker mode. --sessions
+callers each run --turns turns back to back against the router and we
+report turns per second and time to first event.
+
+    cd Backend
+    python benchmarks/scaling_bench.py --workers 1 2 4 --sessions 64
+
+With the default CPU-bound reply work, throughput can only scale up to
+the number of CPU cores: the router is one more process that every byte
+passes through, so with fewer cores than workers + 1 extra workers only
+add contention (on a single core: 30.8, 26.3 and 22.0 turns/s for 1, 2
+and 4 workers). With --cpu-ms 0 and --llm-capacity N each worker serves
+N generations at a time, and as long as the wait for the provider
+dwarfs the CPU a turn costs throughput scales with the worker count
+regardless of cores; tests/test_scaling.py checks that.
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import List, Optional, Tuple
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on {port}")
+
+
+def serve_worker(port: int, tokens: int, ttft: float, token_delay: float, cpu: float, capacity: int = 0):
+    sys.path.insert(0, os.path.dirname(__file__))
+    import uvicorn
+    import llm_logic
+    from fake_llm import FakeStreamingLLM
+
+    # an LLM provider that serves `capacity` generations at a time, first come first served
+    provider = asyncio.Semaphore(capacity) if capacity else None
+
+    class BusyLLM(FakeStreamingLLM):
+        async def astream_chat(self, messages, **kwargs):
+            end = time.process_time() + cpu
+            while time.process_time() < end:
+                pass
+            if provider is None:
+                return await super().astream_chat(messages, **kwargs)
+            await provider.acquire()
+            try:
+                stream = await super().astream_chat(messages, **kwargs)
+            except BaseException:
+                provider.release()
+                raise
+
+            async def gen():
+                try:
+                    async for chunk in stream:
+                        yield chunk
+                finally:
+                    provider.release()
+            return gen()
+
+    llm_logic.llm = BusyLLM(tokens=tokens, ttft=ttft, token_delay=token_delay)
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def drive(port: int, sessions: int, turns: int, tag: str):
+    import httpx
+
+    ttft, replies = [], 0
+
+    async def caller(client, i):
+        nonlocal replies
+        session_id = f"{tag}_{i}"
+        for turn in range(turns):
+            started = time.perf_counter()
+            first = None
+            async with client.stream(
+                "POST", f"http://127.0.0.1:{port}/chat/stream/voice",
+                json={"session_id": session_id, "user_input": f"question {turn}"},
+            ) as response:
+                async for _ in response.aiter_raw():
+                    if first is None:
+                        first = time.perf_counter() - started
+            ttft.append(first)
+            replies += 1
+
+    limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=sessions)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(client, i) for i in range(sessions)))
+        wall = time.perf_counter() - started
+    return replies / wall, ttft
+
+
+def measure(workers: int, args, state_backend: str = "sqlite") -> Tuple[float, List[float]]:
+    """Turns per second and times to first event through the router with `workers` workers."""
+    data_dir = tempfile.mkdtemp(prefix="scaling_bench_")
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "unused"),
+        CHAT_STORE_DIR=data_dir,
+        CHAT_STORE_BACKEND="sqlite",
+        SESSION_STATE_BACKEND=state_backend,
+        SESSION_STATE_DB=os.path.join(data_dir, "session_state.db"),
+    )
+    ports = [free_port() for _ in range(workers)]
+    router_port = free_port()
+    processes = []
+    try:
+        for port in ports:
+            processes.append(subprocess.Popen([
+                sys.executable, __file__, "--serve-worker", str(port),
+                "--tokens", str(args.tokens), "--ttft-ms", str(args.ttft_ms),
+                "--token-delay-ms", str(args.token_delay_ms), "--cpu-ms", str(args.cpu_ms),
+                "--llm-capacity", str(args.llm_capacity),
+            ], cwd=BACKEND_DIR, env=dict(env, WORKER_ID=f"bench-{port}"), stdout=subprocess.DEVNULL))
+        processes.append(subprocess.Popen(
+            [sys.executable, "session_router.py", "--port", str(router_port), "--upstream"]
+            + [f"http://127.0.0.1:{port}" for port in ports],
+            cwd=BACKEND_DIR, env=env,
+        ))
+        for port in ports + [router_port]:
+            wait_for(port)
+
+        return asyncio.run(drive(router_port, args.sessions, args.turns, f"w{workers}_{time.time_ns()}"))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def run(workers: int, args) -> None:
+    rate, ttft = measure(workers, args)
+    print(
+        f"workers={workers} sessions={args.sessions} turns/s={rate:7.1f} "
+        f"ttft p50={percentile(ttft, 50) * 1000:6.0f}ms p95={percentile(ttft, 95) * 1000:6.0f}ms"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Turn throughput vs number of backend workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-delay-ms", type=float, default=10)
+    parser.add_argument("--cpu-ms", type=float, default=10)
+    parser.add_argument("--llm-capacity", type=int, default=0, help="concurrent generations the fake provider serves (0: unlimited)")
+    parser.add_argument("--serve-worker", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    if args.serve_worker:
+        serve_worker(
+            args.serve_worker, args.tokens, args.ttft_ms / 1000, args.token_delay_ms / 1000,
+            args.cpu_ms / 1000, args.llm_capacity,
+        )
+        return
+    print(f"cpu cores: {os.cpu_count()}")
+    for workers in args.workers:
+        if workers + 1 > (os.cpu_count() or 1):
+            print(f"workers={workers}: router and workers share {os.cpu_count()} cores, expect no scaling")
+        run(workers, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Backend cold start: import time by module, time until the port accepts
+connections and time until /ready says the worker is warm.
+
+Import times come from `python -X importtime -c "import main"`: the
+modules main.py imports directly, by cumulative time, and the heaviest
+packages overall, by their own time. Then the app is started with
+uvicorn --runs times and we wait for the port and for /ready.
+
+    cd Backend
+    python benchmarks/startup_bench.py --budget-ms 1500
+
+exits with status 1 if importing main takes longer than --budget-ms, so
+it can guard against a heavy import creeping back in.
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import subprocess
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(__file__))
+from scaling_bench import BACKEND_DIR, free_port, percentile, wait_for
+
+
+def server_env():
+    return dict(
+        os.environ,
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "unused"),
+        CHAT_STORE_DIR=tempfile.mkdtemp(prefix="startup_bench_"),
+        STT_POOL_SIZE="0",
+    )
+
+
+def import_times():
+    """[(depth, module, self_us, cumulative_us)] for `import main`, in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=server_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(rows, top: int) -> float:
+    total = next(cumulative for depth, name, _, cumulative in rows if name == "main" and depth == 0)
+    print(f"import main: {total / 1000:7.1f}ms")
+
+    print("\nimported by main.py (cumulative):")
+    direct = [(cumulative, name) for depth, name, _, cumulative in rows if depth == 1]
+    for cumulative, name in sorted(direct, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:7.1f}ms  {name}")
+
+    print("\npackages (own time of all their modules):")
+    packages = defaultdict(int)
+    for _, name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:7.1f}ms  {package}")
+    return total / 1e6
+
+
+def wait_ready(port: int, timeout: float = 120.0) -> dict:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = httpx.get(f"http://127.0.0.1:{port}/ready")
+        if response.status_code == 200:
+            return response.json()
+        time.sleep(0.02)
+    raise RuntimeError("worker did not become ready")
+
+
+def start_once():
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=server_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        listening = time.perf_counter() - started
+        warmup = wait_ready(port).get("warmup", {})
+        ready = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return listening, ready, warmup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend import time by module and time to listen / to ready")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--budget-ms", type=float, help="fail if importing main takes longer")
+    args = parser.parse_args()
+
+    import_seconds = report_imports(import_times(), args.top)
+
+    listening, ready, steps = [], [], defaultdict(list)
+    for _ in range(args.runs):
+        to_listen, to_ready, warmup = start_once()
+        listening.append(to_listen)
+        ready.append(to_ready)
+        for step, seconds in warmup.items():
+            steps[step].append(seconds)
+    print(f"\nuvicorn main:app, {args.runs} runs (p50 / max):")
+    print(f"  listening  {percentile(listening, 50) * 1000:7.0f}ms / {max(listening) * 1000:7.0f}ms")
+    print(f"  ready      {percentile(ready, 50) * 1000:7.0f}ms / {max(ready) * 1000:7.0f}ms")
+    for step, seconds in steps.items():
+        print(f"    warmup {step:<12} {percentile(seconds, 50) * 1000:7.0f}ms")
+
+    if args.budget_ms is not None and import_seconds * 1000 > args.budget_ms:
+        print(f"\nimport main took {import_seconds * 1000:.0f}ms, over the {args.budget_ms:.0f}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Frames per reply and client CPU: per-token frames vs batched NDJSON events.
+
+Starts a small server in a subprocess with two endpoints fed by the same
+paced token stream:
+
+  per-token  one `data: {"content": ...}` line per token, the framing the
+             voice worker used to parse line by line
+  ndjson     common/stream_protocol.encode_stream with the flush window
+
+then reads --replies replies concurrently with aiohttp, the way
+CustomLLMStream does, and reports frames per reply and client CPU time.
+
+    cd Backend
+    python benchmarks/stream_protocol_bench.py --replies 200
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_DIR)
+
+from common import stream_protocol
+
+
+def build_app(tokens: int, token_delay: float, window: float):
+    from starlette.applications import Starlette
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+
+    async def token_stream():
+        for i in range(tokens):
+            await asyncio.sleep(token_delay)
+            yield f" tok{i}"
+
+    async def per_token(request):
+        async def frames():
+            async for token in token_stream():
+                yield f"data: {json.dumps({'content': token})}\n\n"
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    async def ndjson(request):
+        return StreamingResponse(
+            stream_protocol.encode_stream(token_stream(), window=window),
+            media_type=stream_protocol.MEDIA_TYPE,
+        )
+
+    return Starlette(routes=[Route("/per-token", per_token), Route("/ndjson", ndjson)])
+
+
+def serve(port: int, tokens: int, token_delay: float, window: float):
+    import uvicorn
+    uvicorn.run(build_app(tokens, token_delay, window), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def read_per_token(response):
+    text, frames = "", 0
+    async for line in response.content:
+        decoded = line.decode("utf-8").strip()
+        if decoded.startswith("data: "):
+            frames += 1
+            text += json.loads(decoded[6:])["content"]
+    return text, frames
+
+
+async def read_ndjson(response):
+    text, frames = "", 0
+    decoder = stream_protocol.StreamDecoder()
+    async for data in response.content.iter_any():
+        for event in decoder.feed(data):
+            frames += 1
+            if event["type"] == stream_protocol.DELTA:
+                text += event["text"]
+    return text, frames
+
+
+async def run(port: int, path: str, replies: int):
+    import aiohttp
+
+    reader = read_per_token if path == "per-token" else read_ndjson
+    async with aiohttp.ClientSession() as session:
+        async def one():
+            async with session.get(f"http://127.0.0.1:{port}/{path}") as response:
+                return await reader(response)
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(replies)))
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    frames = sum(f for _, f in results) / replies
+    print(
+        f"{path:9s} replies={replies} frames/reply={frames:6.1f} "
+        f"client_cpu={cpu * 1000:7.0f}ms ({cpu / replies * 1000:.2f}ms/reply) wall={wall:5.2f}s"
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-token vs batched stream framing")
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=150)
+    parser.add_argument("--token-delay-ms", type=float, default=8)
+    parser.add_argument("--window-ms", type=float, default=stream_protocol.FLUSH_WINDOW * 1000)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.tokens, args.token_delay_ms / 1000, args.window_ms / 1000)
+        return
+
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, __file__, "--serve", str(port), "--tokens", str(args.tokens),
+        "--token-delay-ms", str(args.token_delay_ms), "--window-ms", str(args.window_ms),
+    ])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        for path in ("per-token", "ndjson"):
+            asyncio.run(run(port, path, args.replies))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
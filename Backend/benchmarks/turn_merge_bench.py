@@ -0,0 +1,159 @@
+"""
+Backend requests per user turn when the caller pauses mid-sentence.
+
+Simulates callers saying one sentence each, in 1-3 fragments with pauses
+of --pause-min..--pause-max seconds between them. Endpointing closes a user
+turn --endpoint seconds into every pause and a request goes out; its reply
+is heard --ttft seconds later, unless the caller starts talking again first
+(the request is cancelled). Strategies:
+
+  last        the old behaviour: only the newest fragment is sent, at once
+  merge/0     every fragment since the last heard reply, at once
+  merge/<ms>  the same through TurnAggregator (VoiceManager/turn_aggregator.py),
+              which waits <ms> before sending text that sounds unfinished
+
+Reports backend requests per sentence, replies the caller heard before
+finishing (answering part of the sentence), how much of the sentence the
+final reply answered, and the latency added to the final reply. Time is
+scaled by --scale; the turns run concurrently.
+
+    cd Backend
+    python benchmarks/turn_merge_bench.py --turns 300 --windows 0,300,500,800
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+import statistics
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+VOICE_DIR = os.path.join(REPO_DIR, "VoiceManager")
+# the voice worker's modules import the shared ones as `common`, from the repo root
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, VOICE_DIR)
+
+from turn_aggregator import TurnAggregator
+
+# "|" marks where a caller may pause
+SENTENCES = [
+    "I'd like to change the delivery address for my order and | um | send it to my office instead.",
+    "My parcel was supposed to arrive on Monday but | it still says | it's in the warehouse.",
+    "Can you tell me | when the refund for the | blue jacket will reach my account?",
+    "I was charged twice for the same order | so I need | one of the payments cancelled.",
+    "The courier left a note saying he tried to deliver it | but I was at home the whole day.",
+    "Could you check the tracking number for | order four five six | please?",
+    "I want to return the shoes because they are too small | and | get the next size up.",
+    "Is it possible to | pay for my order with a gift card | or only by credit card?",
+]
+WORD_SECONDS = 0.3
+
+
+def fragments(rng: random.Random):
+    pieces = [p.strip() for p in rng.choice(SENTENCES).split("|")]
+    count = rng.randint(1, min(3, len(pieces)))
+    # keep `count - 1` of the pauses, merge the pieces around the others
+    pauses = set(rng.sample(range(1, len(pieces)), count - 1))
+    parts, current = [], []
+    for i, piece in enumerate(pieces):
+        if i in pauses:
+            parts.append(" ".join(current))
+            current = []
+        current.append(piece)
+    parts.append(" ".join(current))
+    return parts
+
+
+class Caller:
+    def __init__(self, strategy: str, window: float, args):
+        self.strategy = strategy
+        self.args = args
+        self.scale = args.scale
+        self.aggregator = TurnAggregator(window * args.scale)
+        self.requests = self.calls = self.heard = 0
+        self.answer = None
+        self.answered_at = None
+
+    async def request(self, parts, now):
+        self.requests += 1
+        if self.strategy == "last":
+            text = parts[-1]
+        else:
+            text, _ = await self.aggregator.prepare(parts)
+        self.aggregator.sent(text)
+        self.calls += 1
+        await asyncio.sleep(self.args.ttft * self.scale)
+        # first audio: from here on the reply has been heard
+        self.heard += 1
+        self.answer = text
+        self.answered_at = now()
+        self.aggregator.answered()
+
+    async def speak(self, parts, rng):
+        args = self.args
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        def now():
+            return (loop.time() - started) / self.scale
+
+        pending, task = [], None
+        for i, part in enumerate(parts):
+            if task is not None:
+                if task.done():
+                    # the caller heard a reply to part of the sentence and goes on anyway
+                    pending = []
+                else:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(len(part.split()) * WORD_SECONDS * self.scale)
+            pending.append(part)
+            spoken_at = now()
+            pause = rng.uniform(args.pause_min, args.pause_max) if i < len(parts) - 1 else None
+            await asyncio.sleep(args.endpoint * self.scale)
+            task = asyncio.create_task(self.request(list(pending), now))
+            if pause is not None:
+                await asyncio.sleep(max(0.0, pause - args.endpoint) * self.scale)
+        await task
+        # latency over an immediate reply to the last fragment
+        added = self.answered_at - (spoken_at + args.endpoint + args.ttft)
+        premature = self.heard - 1
+        completeness = len(self.answer.split()) / len(" ".join(parts).split())
+        return self.calls, self.requests - self.calls, premature, completeness, added
+
+
+async def run(strategy: str, window: float, args):
+    rng = random.Random(args.seed)
+    turns = [(fragments(rng), random.Random(rng.random())) for _ in range(args.turns)]
+    results = await asyncio.gather(
+        *(Caller(strategy, window, args).speak(parts, turn_rng) for parts, turn_rng in turns)
+    )
+    calls, saved, premature, completeness, added = zip(*results)
+    name = strategy if strategy == "last" else f"merge/{window * 1000:.0f}"
+    print(
+        f"{name:<10s} requests/turn={statistics.mean(calls):4.2f} saved/turn={statistics.mean(saved):4.2f} "
+        f"premature replies/turn={statistics.mean(premature):4.2f} "
+        f"input answered={statistics.mean(completeness):6.1%} "
+        f"added latency p50={statistics.median(added) * 1000:5.0f}ms p95={statistics.quantiles(added, n=20)[-1] * 1000:5.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend requests per turn: merged and debounced user fragments")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--windows", default="0,300,500,800", help="TurnAggregator windows to compare, in ms")
+    parser.add_argument("--pause-min", type=float, default=0.6)
+    parser.add_argument("--pause-max", type=float, default=1.5)
+    parser.add_argument("--endpoint", type=float, default=0.5, help="silence before the user turn is closed, s")
+    parser.add_argument("--ttft", type=float, default=0.35, help="request to first audio, s")
+    parser.add_argument("--scale", type=float, default=0.2, help="wall seconds per simulated second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    asyncio.run(run("last", 0.0, args))
+    for window in (float(w) / 1000 for w in args.windows.split(",")):
+        asyncio.run(run("merge", window, args))
+
+
+if __name__ == "__main__":
+    main()
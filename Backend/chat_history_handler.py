@@ -1,39 +1,105 @@
 import json
 import os
-from typing import List
+import sys
+import time
+import threading
+from typing import List, Optional
 from llama_index.core.llms import ChatMessage
 
-STORE_DIR = "chat_store"
-os.makedirs(STORE_DIR, exist_ok=True)
+from history_store import STORE_DIR, create_store
+from persistence import WriteBehindPersister
+import metrics
 
+history_seconds = metrics.histogram("chat_history_seconds", "Time to load or save one session's chat history", ["op"])
+load_seconds = history_seconds.labels("load")
+save_seconds = history_seconds.labels("save")
 
-def session_file(session_id: str) -> str:
+# The backend is picked with CHAT_STORE_BACKEND (file | sqlite), see history_store.py
+store = create_store()
+
+
+def _append(session_id: str, records: List[dict]):
+    started = time.perf_counter()
+    store.append(session_id, records)
+    save_seconds.observe(time.perf_counter() - started)
+
+# Appends are queued and written in the background, see persistence.py
+persister = WriteBehindPersister(_append)
+
+_migrate_lock = threading.Lock()
+
+
+def legacy_session_file(session_id: str) -> str:
     return os.path.join(STORE_DIR, f"{session_id}.json")
 
-def load_chat_history(session_id: str) -> List[ChatMessage]:
-    path = session_file(session_id)
+def _record(message: ChatMessage) -> dict:
+    role = message.role.value if hasattr(message.role, "value") else message.role
+    return {"role": role, "content": message.content}
 
-    if not os.path.exists(path):
-        return []
+def _to_message(record: dict) -> ChatMessage:
+    return ChatMessage(role=record["role"], content=record["content"])
 
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
-    return [
-        ChatMessage(role=m["role"], content=m["content"])
-        for m in data.get("messages", [])
-    ]
+def load_chat_history(session_id: str, token_limit: Optional[int] = None) -> List[ChatMessage]:
+    """Load the most recent messages, roughly enough to fill `token_limit` tokens (all if None)."""
+    started = time.perf_counter()
+    persister.flush_session(session_id)
+    records = store.load(session_id, token_limit)
+    if not records and migrate_session(session_id):
+        records = store.load(session_id, token_limit)
+    load_seconds.observe(time.perf_counter() - started)
+    return [_to_message(r) for r in records]
+
+def append_chat_history(session_id: str, messages: List[ChatMessage]):
+    """Queue new messages to be appended to the session history."""
+    persister.enqueue(session_id, [_record(m) for m in messages])
 
 def save_chat_history(session_id: str, messages: List[ChatMessage]):
-    path = session_file(session_id)
-
-    data = {
-        "session_id": session_id,
-        "messages": [
-            {"role": m.role, "content": m.content}
-            for m in messages
-        ],
-    }
-
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    """Replace the session history with `messages`."""
+    persister.flush_session(session_id)
+    started = time.perf_counter()
+    store.replace(session_id, [_record(m) for m in messages])
+    save_seconds.observe(time.perf_counter() - started)
+
+def flush_chat_history(session_id: str):
+    """Write the session's queued messages and commit them, e.g. before another worker takes it over."""
+    persister.flush_session(session_id)
+    store.flush()
+
+def close_chat_store():
+    # write everything still queued before the store goes away
+    persister.close()
+    store.close()
+
+
+def migrate_session(session_id: str) -> bool:
+    """Move a legacy chat_store/<session_id>.json file into the store, if there is one."""
+    legacy = legacy_session_file(session_id)
+    with _migrate_lock:
+        if not os.path.exists(legacy):
+            return False
+
+        with open(legacy, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        store.replace(session_id, [
+            {"role": m["role"], "content": m["content"]} for m in data.get("messages", [])
+        ])
+        os.replace(legacy, legacy + ".migrated")
+        return True
+
+def migrate_legacy_store() -> int:
+    """Move every legacy JSON session file into the store. Returns the number migrated."""
+    migrated = 0
+    for name in os.listdir(STORE_DIR):
+        if name.endswith(".json") and migrate_session(name[:-len(".json")]):
+            migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        print(f"Migrated {migrate_legacy_store()} sessions")
+        close_chat_store()
+    else:
+        print("usage: python chat_history_handler.py migrate")
@@ -0,0 +1,83 @@
+import os
+from typing import List, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from usage import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, count_tokens
+
+load_dotenv()
+
+# Prompts are laid out so that one turn's prompt starts with the previous
+# turn's: system prompt, summary, then the history window, which only grows
+# at the end until it is full. Then it is cut in one go by
+# CONTEXT_TRUNCATE_BLOCK of the memory token limit, instead of by a message
+# or two every turn, which would change the start of every prompt and defeat
+# the provider's prompt caching.
+CONTEXT_TRUNCATE_BLOCK = float(os.getenv("CONTEXT_TRUNCATE_BLOCK", "0.25"))
+
+# OpenAI prompt caching: prefixes of at least 1024 tokens, matched in 128-token steps
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+PROMPT_CACHE_INCREMENT = int(os.getenv("PROMPT_CACHE_INCREMENT", "128"))
+
+RATIO_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+cached_ratio = metrics.histogram(
+    "chat_prompt_cached_ratio", "Estimated share of each prompt served from the provider's prompt cache",
+    buckets=RATIO_BUCKETS,
+)
+cached_tokens_total = metrics.counter("chat_prompt_cached_tokens_total", "Estimated prompt tokens served from the provider's prompt cache")
+
+
+def window_start(counts: List[int], start: int, budget: int, block: int) -> int:
+    """
+    Index of the first history message to send.
+
+    Stays at `start` (the previous turn's) while everything from there fits
+    in `budget` tokens. Otherwise moves forward past at least `block`
+    tokens, and as far as it takes to fit. The last message is always kept.
+    """
+    total = sum(counts[start:])
+    if total <= budget:
+        return start
+    dropped = 0
+    while start < len(counts) - 1 and (dropped < block or total - dropped > budget):
+        dropped += counts[start]
+        start += 1
+    return start
+
+
+def cacheable_tokens(common: int) -> int:
+    # what the provider can serve of a prefix it has seen before
+    if common < PROMPT_CACHE_MIN_TOKENS:
+        return 0
+    return common - common % PROMPT_CACHE_INCREMENT
+
+
+class PrefixTracker:
+    """
+    Estimates how much of each prompt of a session the provider can answer
+    from its prompt cache: the messages it shares, from the start, with the
+    session's previous prompt. Prefixes shared between sessions (the same
+    system prompt) are not counted, so short conversations are under-counted.
+    """
+
+    def __init__(self):
+        self._previous: List[Tuple[str, str]] = []
+
+    def observe(self, messages) -> Tuple[int, int]:
+        """Record a prompt sent to the LLM; returns (estimated cached tokens, prompt tokens)."""
+        current = [(m.role.value, str(m.content or "")) for m in messages]
+        counts = [count_tokens(content) + TOKENS_PER_MESSAGE for _, content in current]
+        total = sum(counts) + TOKENS_PER_REPLY
+        common = 0
+        for i, message in enumerate(current):
+            if i >= len(self._previous) or self._previous[i] != message:
+                break
+            common += counts[i]
+        self._previous = current
+
+        cached = cacheable_tokens(common)
+        cached_ratio.observe(cached / total)
+        cached_tokens_total.inc(cached)
+        return cached, total
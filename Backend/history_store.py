@@ -0,0 +1,337 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Storage backends for chat history. Both work on plain message records
+# ({"role": ..., "content": ...}) in conversation order; chat_history_handler
+# converts them to ChatMessage objects.
+
+CHAT_STORE_BACKEND = os.getenv("CHAT_STORE_BACKEND", "file")
+STORE_DIR = os.getenv("CHAT_STORE_DIR", "chat_store")
+CHAT_STORE_DB = os.getenv("CHAT_STORE_DB", os.path.join(STORE_DIR, "chat_history.db"))
+# SQLite group commit: flush after this many writes or this many ms, whichever comes first
+CHAT_STORE_COMMIT_BATCH = int(os.getenv("CHAT_STORE_COMMIT_BATCH", "64"))
+CHAT_STORE_COMMIT_INTERVAL_MS = float(os.getenv("CHAT_STORE_COMMIT_INTERVAL_MS", "50"))
+
+# Rough chars-per-token used to decide how far back a bounded read goes;
+# deliberately low so we read a little more than the memory window needs
+CHARS_PER_TOKEN = 3
+
+
+class ChatStore:
+    """Interface every chat history backend implements."""
+
+    def load(self, session_id: str, token_limit: Optional[int] = None) -> List[dict]:
+        """Most recent records, roughly enough to fill `token_limit` tokens (all if None)."""
+        raise NotImplementedError
+
+    def append(self, session_id: str, records: List[dict]):
+        raise NotImplementedError
+
+    def replace(self, session_id: str, records: List[dict]):
+        raise NotImplementedError
+
+    def flush(self):
+        """Make buffered writes visible to other processes."""
+        pass
+
+    def close(self):
+        pass
+
+
+# --- File backend -----------------------------------------------------------
+# One append-only log per session: <dir>/<session_id>.jsonl with one JSON
+# record per message. replace() appends a reset marker followed by the new
+# records; compaction later drops whatever sits before the last marker.
+# Appended records are all live, so a session that is only ever appended
+# to is never compacted and its log grows without limit; reads stay
+# bounded because they only go back as far as the memory window.
+
+RESET = {"type": "reset"}
+# Compact once a log holds more dead records than this and more dead than live ones
+COMPACT_MIN_DEAD = 64
+TAIL_BLOCK_SIZE = 8192
+
+
+def _dump(record: dict) -> str:
+    return json.dumps({"role": record["role"], "content": record["content"]}, ensure_ascii=False) + "\n"
+
+def _parse(line: bytes) -> Optional[dict]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        # torn write from a crash; the rest of the log is still usable
+        return None
+
+def _write_atomic(path: str, data: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FileChatStore(ChatStore):
+    def __init__(self, directory: str = STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def session_file(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def load(self, session_id: str, token_limit: Optional[int] = None) -> List[dict]:
+        path = self.session_file(session_id)
+        if not os.path.exists(path):
+            return []
+        return self._read_tail(path, token_limit)
+
+    def append(self, session_id: str, records: List[dict]):
+        if not records:
+            return
+        with self._lock:
+            with open(self.session_file(session_id), "a", encoding="utf-8") as f:
+                f.write("".join(_dump(r) for r in records))
+
+    def replace(self, session_id: str, records: List[dict]):
+        path = self.session_file(session_id)
+        with self._lock:
+            # replace is rare (migrations, explicit rewrites): count on the spot rather
+            # than keep per-session counts that would outlive the session
+            live, dead = self._scan_stats(path)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(RESET) + "\n" + "".join(_dump(r) for r in records))
+            live, dead = len(records), live + dead + 1
+            if dead >= COMPACT_MIN_DEAD and dead > live:
+                self._compact(session_id)
+
+    def compact(self, session_id: str):
+        with self._lock:
+            self._compact(session_id)
+
+    def _read_tail(self, path: str, token_limit: Optional[int]) -> List[dict]:
+        """Read records backwards from the end until the token budget or a reset marker."""
+        char_budget = token_limit * CHARS_PER_TOKEN if token_limit else None
+        records: List[dict] = []
+        chars = 0
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+
+            while position > 0:
+                step = min(TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                lines = (f.read(step) + remainder).split(b"\n")
+                # the first piece may be a partial line unless we reached the start
+                remainder = lines.pop(0) if position > 0 else b""
+
+                for line in reversed(lines):
+                    record = _parse(line) if line.strip() else None
+                    if record is None:
+                        continue
+                    if record.get("type") == "reset":
+                        return records[::-1]
+                    records.append(record)
+                    chars += len(record.get("content") or "")
+                    if char_budget is not None and chars >= char_budget:
+                        return records[::-1]
+
+        return records[::-1]
+
+    def _scan_stats(self, path: str) -> List[int]:
+        live = dead = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    record = _parse(line) if line.strip() else None
+                    if record is None:
+                        continue
+                    if record.get("type") == "reset":
+                        dead += live + 1
+                        live = 0
+                    else:
+                        live += 1
+        return [live, dead]
+
+    def _compact(self, session_id: str):
+        path = self.session_file(session_id)
+        if not os.path.exists(path):
+            return
+        records = self._read_tail(path, None)
+        _write_atomic(path, "".join(_dump(r) for r in records))
+
+
+# --- SQLite backend ---------------------------------------------------------
+# A single database in WAL mode, so readers never block the writer and several
+# worker processes can share it. Writes are group-committed: they go into an
+# open transaction that is committed once CHAT_STORE_COMMIT_BATCH writes have
+# piled up or CHAT_STORE_COMMIT_INTERVAL_MS has passed. A crash can lose at
+# most that window, never corrupt the database.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID
+"""
+# rows fetched per step of a bounded read
+READ_PAGE_SIZE = 64
+
+
+def connect_wal(path: str) -> sqlite3.Connection:
+    """Autocommit connection to a WAL database, shareable across threads."""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    # when several workers open a new database at once, the switch to WAL can
+    # fail with "database is locked" without waiting on busy_timeout; retry it
+    for attempt in range(50):
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            break
+        except sqlite3.OperationalError:
+            if attempt == 49:
+                conn.close()
+                raise
+            time.sleep(0.05)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class SqliteChatStore(ChatStore):
+    def __init__(
+        self,
+        path: str = CHAT_STORE_DB,
+        commit_batch: int = CHAT_STORE_COMMIT_BATCH,
+        commit_interval: float = CHAT_STORE_COMMIT_INTERVAL_MS / 1000,
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+
+        # one connection shared by all threads, serialized by our own lock;
+        # reads on it also see writes that are not committed yet
+        self._conn = connect_wal(path)
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+
+    def load(self, session_id: str, token_limit: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            if token_limit is None:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq",
+                    (session_id,),
+                ).fetchall()
+                return [{"role": role, "content": content} for role, content in rows]
+
+            # walk back from the newest message a page at a time until the budget is filled
+            char_budget = token_limit * CHARS_PER_TOKEN
+            records: List[dict] = []
+            chars = 0
+            before = None
+            while chars < char_budget:
+                if before is None:
+                    rows = self._conn.execute(
+                        "SELECT seq, role, content FROM messages WHERE session_id = ? "
+                        "ORDER BY seq DESC LIMIT ?",
+                        (session_id, READ_PAGE_SIZE),
+                    ).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq < ? "
+                        "ORDER BY seq DESC LIMIT ?",
+                        (session_id, before, READ_PAGE_SIZE),
+                    ).fetchall()
+                for seq, role, content in rows:
+                    records.append({"role": role, "content": content})
+                    chars += len(content)
+                    if chars >= char_budget:
+                        break
+                if len(rows) < READ_PAGE_SIZE:
+                    break
+                before = rows[-1][0]
+            return records[::-1]
+
+    def append(self, session_id: str, records: List[dict]):
+        if not records:
+            return
+        with self._lock:
+            self._begin()
+            (last,) = self._conn.execute(
+                "SELECT MAX(seq) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._insert(session_id, records, 0 if last is None else last + 1)
+            self._wrote()
+
+    def replace(self, session_id: str, records: List[dict]):
+        with self._lock:
+            self._begin()
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._insert(session_id, records, 0)
+            self._wrote()
+
+    def flush(self):
+        with self._lock:
+            if not self._closed:
+                self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._commit()
+            self._conn.close()
+            self._closed = True
+
+    def _insert(self, session_id: str, records: List[dict], start: int):
+        self._conn.executemany(
+            "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(session_id, start + i, r["role"], r["content"]) for i, r in enumerate(records)],
+        )
+
+    def _begin(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.commit_batch:
+            self._commit()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.commit_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _commit(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending = 0
+
+
+def create_store(backend: str = CHAT_STORE_BACKEND) -> ChatStore:
+    if backend == "file":
+        return FileChatStore()
+    if backend == "sqlite":
+        return SqliteChatStore()
+    raise ValueError(f"Unknown CHAT_STORE_BACKEND: {backend}")
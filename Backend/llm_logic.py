@@ -1,67 +1,412 @@
 import os
-from pyexpat import model
-from typing import Dict
+import time
+import asyncio
+import uuid
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import anyio
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from llama_index.core import VectorStoreIndex
-from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.llms import ChatMessage
-from llama_index.llms.openai import OpenAI
-from llama_index.core.chat_engine import SimpleChatEngine
+from llama_index.core.llms import ChatMessage, LLM, MessageRole
+
+from chat_history_handler import load_chat_history, append_chat_history, flush_chat_history
+from session_cache import SessionCache
+from session_ownership import ownership
+from session_memory import RollingSummaryMemory, MEMORY_SUMMARY_TOKENS
+from response_cache import response_cache, RESPONSE_CACHE_ENABLED
+from usage import TurnUsage, TOKENS_PER_MESSAGE, count_tokens, count_prompt_tokens, usage_ledger
+from agents import AgentConfig, AgentRegistry, DEFAULT_AGENT_ID
+from context_assembly import PrefixTracker
+import metrics
+
+logger = logging.getLogger("VoiceAgent")
+
+LLM_MODEL = "gpt-4o-mini"
+
+# LLM, built on first use: the OpenAI SDK alone takes about a second to import
+llm: Optional[LLM] = None
+_openai_client = None
+_llm_lock = threading.RLock()
+
+def openai_client():
+    # one connection pool for every agent's LLM; a new client costs ~40ms and new TLS connections
+    global _openai_client
+    with _llm_lock:
+        if _openai_client is None:
+            from openai import AsyncOpenAI
+
+            _openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai_client
+
+def new_llm(model: str, temperature: Optional[float] = None) -> LLM:
+    from llama_index.llms.openai import OpenAI
+
+    settings = {} if temperature is None else {"temperature": temperature}
+    return OpenAI(
+        model=model,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        streaming=True,
+        async_openai_client=openai_client(),
+        **settings,
+    )
+
+def get_llm() -> LLM:
+    global llm
+    with _llm_lock:
+        if llm is None:
+            llm = new_llm(LLM_MODEL)
+            logger.info(f"LLM initialized with model: {LLM_MODEL}")
+    return llm
+
+async def summarize_history(summary: str, messages: list) -> str:
+    # folds turns that no longer fit the memory window into the running summary
+    transcript = "\n".join(f"{m.role.value}: {m.content}" for m in messages)
+    prompt = (
+        f"Update the summary of a conversation between a user and an assistant. "
+        f"Keep names, facts, decisions and open questions; stay under {MEMORY_SUMMARY_TOKENS} tokens.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}\n\n"
+        f"Updated summary:"
+    )
+    response = await get_llm().acomplete(prompt)
+    return response.text
 
-from chat_history_handler import load_chat_history, save_chat_history
+class AgentTemplate:
+    """What every session of one agent shares, built once per agent configuration (see agents.py)."""
 
-# LLM
-llm = OpenAI(
-    model="gpt-4o-mini",
-    api_key=os.getenv("OPENAI_API_KEY"),
-    streaming=True,
+    def __init__(self, config: AgentConfig):
+        self.config = config
+        # agents on the default model share the default LLM (see llm)
+        self._llm = None
+        if config.model != LLM_MODEL or config.temperature is not None:
+            self._llm = new_llm(config.model, config.temperature)
+        else:
+            get_llm()
+        self.prefix_messages = (
+            [ChatMessage(role=MessageRole.SYSTEM, content=config.system_prompt)] if config.system_prompt else []
+        )
+        # taken out of the memory window every turn
+        self.prefix_tokens = sum(count_tokens(m.content) + TOKENS_PER_MESSAGE for m in self.prefix_messages)
+        if self.prefix_tokens >= config.memory_token_limit:
+            raise ValueError(f"Agent {config.agent_id}: system prompt does not fit memory_token_limit")
+
+    @property
+    def llm(self) -> LLM:
+        return self._llm if self._llm is not None else get_llm()
+
+agents = AgentRegistry(AgentTemplate)
+
+turns_replaced = metrics.counter(
+    "chat_turns_replaced_total", "Unanswered user turns replaced by the caller's continuation (interrupted requests)"
 )
 
-print("LLM initialized with model:", model)
+class ChatSession:
+    def __init__(self, memory: RollingSummaryMemory, template: AgentTemplate):
+        self.memory = memory
+        self.template = template
+        # the previous prompt, to estimate provider prompt cache hits
+        self.prefix = PrefixTracker()
+        # messages in memory that are already in the chat store
+        self.saved = len(memory.get_all())
+        # summary as last written to the session state store
+        self.saved_summary = memory.summary
+
+    def use(self, template: AgentTemplate):
+        # an agent reloaded since the last turn applies from this turn on
+        if template is not self.template:
+            self.template = template
+            self.memory.token_limit = template.config.memory_token_limit
 
-# In Memory Session Storage
-session_memory: Dict[str, ChatMemoryBuffer] = {}
-session_engines = {}
+    def pop_unsaved_user(self) -> bool:
+        # the newest message is a user turn not yet written to the store
+        history = self.memory.get_all()
+        if len(history) > self.saved and history[-1].role == MessageRole.USER:
+            self.memory.pop()
+            return True
+        return False
 
-def get_chat_engine(session_id: str):
-    if session_id not in session_memory:
-        # Load previous history 
-        history = load_chat_history(session_id)
-        # convert to the format that llamaindex expects
-        memory = ChatMemoryBuffer.from_defaults(
-            chat_history=history,
-            token_limit=4000
-            )
+    def drop_unanswered(self) -> bool:
+        # the caller's continuation replaces a user turn whose reply nobody heard
+        if self.pop_unsaved_user():
+            turns_replaced.inc()
+            return True
+        return False
 
-        index = VectorStoreIndex.from_documents([])
+    def unsaved_messages(self):
+        messages = self.memory.get_all()[self.saved:]
+        self.saved += len(messages)
+        return messages
 
-        chat_engine = SimpleChatEngine.from_defaults(
-            llm=llm,
-            memory=memory,
-            chat_mode="context"
+
+def build_session(session_id: str, template: Optional[AgentTemplate] = None) -> ChatSession:
+    template = template or agents.get(DEFAULT_AGENT_ID)
+    token_limit = template.config.memory_token_limit
+    # Load only as much recent history as the memory window can hold
+    history = load_chat_history(session_id, token_limit=token_limit)
+    # convert to the format that llamaindex expects
+    memory = RollingSummaryMemory.from_defaults(
+        chat_history=history,
+        token_limit=token_limit,
+        summarizer=summarize_history,
         )
+    # the summary of a session that was served by another worker (or before a restart)
+    lease = ownership.lease(session_id)
+    if lease is not None and lease.summary:
+        memory.restore_summary(lease.summary)
+    # the engine and LLM come from the agent's template, nothing is built per session
+    return ChatSession(memory, template)
+
+def _unsaved_summary(session: ChatSession) -> Optional[str]:
+    if session.memory.summary == session.saved_summary:
+        return None
+    session.saved_summary = session.memory.summary
+    return session.saved_summary
+
+def persist_session(session_id: str, session: ChatSession):
+    # blocking, see apersist_session on the event loop
+    if not ownership.verify(session_id):
+        # another worker owns the session now; its history is the one that counts
+        return
+    append_chat_history(session_id, session.unsaved_messages())
+    summary = _unsaved_summary(session)
+    if summary is not None:
+        ownership.save_summary(session_id, summary)
+
+async def apersist_session(session_id: str, session: ChatSession):
+    # the history write is only queued (see persistence.py); the summary goes to the
+    # shared session state store, which may wait on another worker's lock
+    if not await asyncio.to_thread(ownership.verify, session_id):
+        logger.warning(f"Session {session_id} was taken over by another worker, not saving this turn")
+        return
+    append_chat_history(session_id, session.unsaved_messages())
+    summary = _unsaved_summary(session)
+    if summary is not None:
+        await asyncio.to_thread(ownership.save_summary, session_id, summary)
+
+def drop_session(session_id: str, session: ChatSession):
+    # leaving this worker's cache: write everything, then let another worker have it
+    persist_session(session_id, session)
+    flush_chat_history(session_id)
+    ownership.release(session_id)
+
+async def open_session(session_id: str):
+    # make sure this worker owns the session before it is served from (or built into) the cache;
+    # checked against the store, since another worker may have taken it over by force
+    if not await asyncio.to_thread(ownership.verify, session_id):
+        # a cached copy is stale if the session was served elsewhere meanwhile; dropping it
+        # writes nothing, the lease is gone (see persist_session)
+        await asyncio.to_thread(sessions.discard, session_id)
+        await ownership.claim(session_id)
+
+# In Memory Session Storage, bounded: evicted sessions are saved and rebuilt from disk on next use.
+# With several workers each session is owned by one of them at a time, see session_ownership.py
+sessions = SessionCache(
+    build=build_session,
+    persist=drop_session,
+    max_size=int(os.getenv("SESSION_CACHE_MAX_SIZE", "1000")),
+    idle_ttl=float(os.getenv("SESSION_CACHE_IDLE_TTL", "1800")),
+)
+
+def use_response_cache(user_message: str) -> bool:
+    return RESPONSE_CACHE_ENABLED and response_cache.cacheable(user_message)
+
+cancelled_turns = metrics.counter("chat_cancelled_turns_total", "Replies aborted before they finished (client gone or /chat/cancel)")
+tokens_saved = metrics.counter("chat_cancelled_tokens_saved_total", "Estimated completion tokens not generated because a reply was aborted")
+
+ttft_seconds = metrics.histogram("chat_ttft_seconds", "Time from request to the first reply token", ["source"])
+tokens_per_second = metrics.histogram(
+    "chat_tokens_per_second", "Reply tokens per second after the first token", buckets=metrics.RATE_BUCKETS
+)
+
+# running average of completed reply lengths, to estimate what a cancel saved
+_reply_tokens_avg: Optional[float] = None
+
+
+class ActiveTurn:
+    """A reply being generated, so it can be cancelled from another request."""
+
+    def __init__(self, turn_id: Optional[str] = None):
+        self.turn_id = turn_id
+        self.producer: Optional[asyncio.Task] = None
+        self.cancelled = False
+        # what the caller actually heard, if it told us on cancel
+        self.heard: Optional[str] = None
+
+
+# keyed by (session_id, turn_id): a late cancel for an old turn must not stop the current one.
+# Turns without a turn_id get a key of their own, so concurrent ones never replace each other
+active_turns: Dict[Tuple[str, Optional[str]], ActiveTurn] = {}
+_END = object()
+
+
+def cancel_turn(session_id: str, turn_id: Optional[str] = None, heard: Optional[str] = None) -> bool:
+    # stops upstream generation; the open stream ends cleanly with what was sent so far.
+    # With a turn_id only that exact turn is cancelled; without one, every reply of the session
+    if turn_id:
+        turn = active_turns.get((session_id, turn_id))
+        turns = [turn] if turn is not None else []
+    else:
+        turns = [turn for (sid, _), turn in list(active_turns.items()) if sid == session_id]
+    for turn in turns:
+        turn.cancelled = True
+        turn.heard = heard
+        turn.producer.cancel()
+    return bool(turns)
+
+
+async def _llm_deltas(llm: LLM, messages):
+    stream = await llm.astream_chat(messages)
+    try:
+        async for chunk in stream:
+            if chunk.delta:
+                yield chunk.delta
+    finally:
+        # closes the upstream HTTP response, which is what stops the generation
+        await stream.aclose()
+
+async def _pump(deltas, queue: asyncio.Queue):
+    try:
+        async for delta in deltas:
+            queue.put_nowait(delta)
+    except asyncio.CancelledError:
+        queue.put_nowait(_END)
+        raise
+    except Exception as e:
+        queue.put_nowait(e)
+        return
+    queue.put_nowait(_END)
+
+def _record_cancel(delivered: int):
+    cancelled_turns.inc()
+    if _reply_tokens_avg is not None:
+        tokens_saved.inc(max(0.0, _reply_tokens_avg - delivered))
+
+def _record_length(tokens: int):
+    global _reply_tokens_avg
+    _reply_tokens_avg = tokens if _reply_tokens_avg is None else 0.9 * _reply_tokens_avg + 0.1 * tokens
 
-        session_memory[session_id] = memory
-        session_engines[session_id] = chat_engine
+async def astream_chat_response(
+    session_id: str,
+    user_message: str,
+    agent_id: str = DEFAULT_AGENT_ID,
+    record: bool = True,
+    turn_id: Optional[str] = None,
+    usage: Optional[TurnUsage] = None,
+    interrupted: bool = False,
+):
+    # async generator to stream chat response without pinning a threadpool thread.
+    # Drives the LLM stream directly: the chat engine's streaming wrapper copies
+    # tokens through a background writer and polls its queue, adding latency.
+    # With record=False (speculative replies) the turn is not added to the
+    # conversation until the caller commits it with record_turn().
+    # The LLM is read by a producer task: when the client disconnects (or
+    # cancel_turn is called) it is cancelled, the upstream stream is closed,
+    # and only the part of the reply that was delivered is recorded.
+    # Token counts are filled into `usage` (and the ledger) once the reply ends.
+    # interrupted=True: the caller's previous turn was cut off before any of its
+    # reply was heard and user_message repeats it (see VoiceManager/turn_aggregator.py),
+    # so that turn is replaced rather than kept twice.
+    await open_session(session_id)
+    template = agents.get(agent_id)
+    # unknown ids are served by the default agent; count them there, not under
+    # whatever the client sent (every new id would be a new ledger entry and series)
+    agent_id = template.config.agent_id
+    async with sessions.lease(session_id, template) as session:
+        session.use(template)
+        memory = session.memory
+        use_cache = use_response_cache(user_message)
+        cached = response_cache.get(agent_id, user_message) if use_cache else None
+        user = ChatMessage(role="user", content=user_message)
 
-    return session_engines[session_id]
+        if record:
+            if interrupted:
+                session.drop_unanswered()
+            await memory.aput(user)
+        started = time.perf_counter()
+        prompt = []
+        if cached:
+            deltas = response_cache.areplay(cached)
+        else:
+            history = await memory.aget(initial_token_count=template.prefix_tokens)
+            prompt = template.prefix_messages + (history if record else history + [user])
+            deltas = _llm_deltas(template.llm, prompt)
+        assistant_reply = []
 
-def stream_chat_response(session_id: str, user_message: str):
-    # generaor to stream chat response
-    chat_engine = get_chat_engine(session_id)
-    response = chat_engine.stream_chat(user_message)
-    assistant_reply = []
+        queue: asyncio.Queue = asyncio.Queue()
+        turn = ActiveTurn(turn_id)
+        turn.producer = asyncio.create_task(_pump(deltas, queue))
+        key = (session_id, turn_id or f"_{uuid.uuid4().hex}")
+        active_turns[key] = turn
+        finished = failed = False
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is _END:
+                    break
+                if isinstance(delta, Exception):
+                    failed = True
+                    raise delta
+                if not assistant_reply:
+                    first_token = time.perf_counter()
+                    ttft_seconds.labels("cache" if cached else "llm").observe(first_token - started)
+                assistant_reply.append(delta)
+                yield delta
+            finished = not turn.cancelled
+        finally:
+            # the client going away cancels this generator, and anyio cancels every
+            # further await too: shield the recording so the delivered part is kept
+            with anyio.CancelScope(shield=True):
+                # a reused turn_id may have been taken over by a later turn; leave that one registered
+                if active_turns.get(key) is turn:
+                    del active_turns[key]
+                if not turn.producer.done():
+                    # client went away mid-reply
+                    turn.producer.cancel()
+                    await asyncio.gather(turn.producer, return_exceptions=True)
 
-    # print("DEBUG: response object =", response)
+                reply = "".join(assistant_reply).strip()
+                if finished:
+                    _record_length(len(assistant_reply))
+                    if not cached and len(assistant_reply) > 1:
+                        tokens_per_second.observe((len(assistant_reply) - 1) / (time.perf_counter() - first_token))
+                elif not failed:
+                    _record_cancel(len(assistant_reply))
+                    if turn.heard is not None:
+                        reply = turn.heard.strip()
+                if not failed:
+                    # counted after the last token went out, never on the streaming path
+                    usage = usage or TurnUsage()
+                    usage.prompt_tokens = count_prompt_tokens(prompt) if prompt else 0
+                    if prompt:
+                        session.prefix.observe(prompt)
+                    usage.completion_tokens = count_tokens("".join(assistant_reply))
+                    usage_ledger.record(session_id, agent_id, usage.prompt_tokens, usage.completion_tokens, bool(cached))
+                if finished and use_cache and not cached:
+                    response_cache.put(agent_id, user_message, reply, time.perf_counter() - started)
+                if record and failed:
+                    # no reply: the next turn must not follow a user message left unanswered
+                    session.pop_unsaved_user()
+                if record and not failed:
+                    if reply:
+                        await memory.aput(ChatMessage(role="assistant", content=reply))
+                    if reply or finished:
+                        await apersist_session(session_id, session)
+                    # else cut off before anything was heard: the user message stays unsaved
+                    # until the next turn, which may replace it
 
-    for token in response.response_gen:
-        # print("TOKEN:", repr(token))
-        assistant_reply.append(token)
-        yield token
-    
-    full_response = "".join(assistant_reply)
-    memory = session_memory[session_id]
-    save_chat_history(session_id, memory.get())
\ No newline at end of file
+async def record_turn(
+    session_id: str, user_message: str, reply: str, agent_id: str = DEFAULT_AGENT_ID, interrupted: bool = False
+):
+    # adds a turn that was generated with record=False
+    await open_session(session_id)
+    async with sessions.lease(session_id, agents.get(agent_id)) as session:
+        if interrupted:
+            session.drop_unanswered()
+        await session.memory.aput(ChatMessage(role="user", content=user_message))
+        if reply.strip():
+            await session.memory.aput(ChatMessage(role="assistant", content=reply.strip()))
+        await apersist_session(session_id, session)
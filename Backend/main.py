@@ -1,36 +1,100 @@
 import os
-import json
+import sys
 import asyncio
+import importlib
+import dataclasses
 import logging
-import threading
-import queue
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # FastAPI Imports
-from fastapi import FastAPI, WebSocket, Request, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse
 from fastapi import HTTPException
+from pydantic import BaseModel
+from typing import Optional
 
-# Deepgram Imports
-from deepgram import DeepgramClient
-from deepgram.core.events import EventType
-from deepgram.extensions.types.sockets import ListenV1SocketClientResponse
-from deepgram.extensions.types.sockets import ListenV1MediaMessage
-from deepgram.extensions.types.sockets import ListenV1ControlMessage
+# shared modules (stream protocol) live in ../common
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from common import stream_protocol
 
-# LLM Logic
-from llm_logic import stream_chat_response
+import metrics
+
+# LLM logic (llm_logic) and speech to text (stt_session, stt_pool) pull in
+# llama_index and the OpenAI and Deepgram SDKs; they are imported by the
+# warmup below, after the server is listening
+from warmup import Warmup
+from session_ownership import ownership
+from admission import admission, Busy, VOICE, TEXT, SPECULATIVE
+from usage import TurnUsage, usage_ledger, warm_tokenizer
+from agents import DEFAULT_AGENT_ID
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("VoiceAgent")
 
 load_dotenv()
-DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 
-app = FastAPI()
+SESSION_SWEEP_INTERVAL = 60
+# tokens arriving within this window go to the voice worker as one event
+STREAM_FLUSH_WINDOW_MS = float(os.getenv("STREAM_FLUSH_WINDOW_MS", "20"))
+
+async def sweep_idle_sessions():
+    from llm_logic import sessions
+
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        await asyncio.to_thread(sessions.evict_idle)
+
+background = []
+
+async def start_background():
+    from llm_logic import sessions, agents
+    from stt_pool import stt_pool
+
+    await stt_pool.start()
+    background.append(asyncio.create_task(sweep_idle_sessions()))
+    # picks up edits to agents.json
+    background.append(asyncio.create_task(agents.watch()))
+    # renew session leases and hand sessions over to other workers on request
+    background.append(asyncio.create_task(ownership.run(sessions.discard)))
+
+def build_llm():
+    from llm_logic import get_llm
+    get_llm()
+
+def compile_agents():
+    from llm_logic import agents
+    agents.reload()
+
+warmup = Warmup()
+warmup.step("llm_logic", lambda: importlib.import_module("llm_logic"))
+warmup.step("llm_client", build_llm)
+warmup.step("agents", compile_agents)
+warmup.step("stt", lambda: importlib.import_module("stt_session"))
+warmup.step("tokenizer", warm_tokenizer)
+warmup.step("background", start_background)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warming = asyncio.create_task(warmup.run())
+    yield
+    warming.cancel()
+    for task in background:
+        task.cancel()
+    if "stt_pool" in sys.modules:
+        await sys.modules["stt_pool"].stt_pool.close()
+    if "llm_logic" in sys.modules:
+        from chat_history_handler import close_chat_store
+        # persist whatever is still in memory (and release it for the other workers)
+        sys.modules["llm_logic"].sessions.clear()
+        close_chat_store()
+    ownership.store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Middleware
 app.add_middleware(
@@ -46,117 +110,168 @@ def get(request: Request):
     with open("templates/index.html", "r", encoding="utf-8") as f:
         return HTMLResponse(content=f.read())
 
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+# readiness: 503 until the heavy imports and clients are loaded (see warmup.py)
+@app.get("/ready")
+def ready():
+    if not warmup.ready:
+        raise HTTPException(status_code=503, detail="Warming up" if warmup.error is None else "Warmup failed")
+    return {"status": "ready", "warmup": warmup.timings}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # speech to text
 @app.websocket("/api/listen")
 async def websocket_endpoint(websocket: WebSocket):
+    if websocket.query_params.get("mode") == "turn" and not websocket.query_params.get("session_id"):
+        # voice turn mode needs a chat session to answer in
+        await websocket.close(code=1008)
+        return
+
+    stt_session = await warmup.module("stt_session")
     await websocket.accept()
     logger.info("Client connected to WebSocket")
 
-    audio_queue = queue.Queue()
-    stop_event = threading.Event()
-    loop = asyncio.get_running_loop()
+    session = stt_session.SttSession(websocket)
+    await session.run()
+    logger.info("Session ended")
 
-    def run_deepgram():
+class AdmittedResponse(StreamingResponse):
+    # holds the generation slot (see admission.py) for as long as the reply streams
+    def __init__(self, content, priority_class: str, **kwargs):
+        super().__init__(content, **kwargs)
+        self.priority_class = priority_class
+
+    async def __call__(self, scope, receive, send):
         try:
-            logger.info("Waiting for audio from browser...")
-            try:
-                first_chunk = audio_queue.get(timeout=60)
-            except queue.Empty:
-                logger.info("No audio received. Stopping.")
-                return
-
-            client = DeepgramClient(api_key=DEEPGRAM_API_KEY)
-
-            def send_to_browser_sync(transcript, is_final):
-                asyncio.run_coroutine_threadsafe(
-                    websocket.send_text(json.dumps({
-                        "type": "transcript",
-                        "text": transcript,
-                        "is_final": is_final
-                    })), loop
-                )
-
-            def on_message(message, **kwargs):
-                if not hasattr(message, "channel"): return
-                # print("---\nMessage received: ---\n", message)
-                if message.channel and message.channel.alternatives:
-                    alt = message.channel.alternatives[0]
-                    # print("---\nAlt: ---\n", alt)
-                    if alt.transcript:
-                        logger.info(f"Heard: {alt.transcript}")
-                        send_to_browser_sync(alt.transcript, message.is_final)
-
-            logger.info("Audio received. Connecting to Deepgram...")
-            with client.listen.v1.connect(model="nova-3", smart_format=True) as connection:
-                
-                connection.on(EventType.OPEN, lambda _: logger.info("Deepgram OPEN"))
-                connection.on(EventType.MESSAGE, on_message)
-                connection.on(EventType.CLOSE, lambda _: logger.info("Deepgram CLOSED"))
-                connection.on(EventType.ERROR, lambda e: logger.error(f"Deepgram Error: {e}"))
-
-                # This prevents start_listening() from blocking the audio sending loop below.
-                listener_thread = threading.Thread(target=connection.start_listening)
-                listener_thread.start()
-
-                connection.send_media(ListenV1MediaMessage(first_chunk))
-
-                while not stop_event.is_set():
-                    try:
-                        # send audio data
-                        data = audio_queue.get(timeout=2.0)
-                        connection.send_media(ListenV1MediaMessage(data))
-                    
-                    except queue.Empty:
-                        # prevent timeout if silence is detected
-                        logger.info("Sending KeepAlive...")
-                        connection.send_control(ListenV1ControlMessage(type="KeepAlive"))
-                        continue
-                    
-                    except Exception as e:
-                        logger.error(f"Error sending media: {e}")
-                        break
-
-                # Cleanup when loop ends
-                listener_thread.join(timeout=1)
-
-        except Exception as e:
-            logger.error(f"Thread Error: {e}")
-
-    # Start the worker thread
-    dg_thread = threading.Thread(target=run_deepgram)
-    dg_thread.start()
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release(self.priority_class)
 
+async def admit(priority_class: str):
     try:
-        while True:
-            data = await websocket.receive_bytes()
-            audio_queue.put(data)
-
-    except WebSocketDisconnect:
-        logger.info("Client disconnected")
-    except Exception as e:
-        logger.error(f"WebSocket Error: {e}")
-    finally:
-        stop_event.set()
-        dg_thread.join(timeout=2)
-        logger.info("Session ended")
+        await admission.acquire(priority_class)
+    except Busy as e:
+        # fail fast; the caller can retry or fall back instead of queueing forever
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 @app.get("/chat/stream")
-def chat_stream(session_id: str, message: str):
-    return StreamingResponse(
-        stream_chat_response(session_id, message),
+async def chat_stream(session_id: str, message: str, agent_id: str = DEFAULT_AGENT_ID):
+    llm_logic = await warmup.module("llm_logic")
+    await admit(TEXT)
+    return AdmittedResponse(
+        llm_logic.astream_chat_response(session_id, message, agent_id),
+        TEXT,
         media_type="text/plain"
     )
 
+# turn_id lets /chat/cancel stop this reply only
 @app.post("/chat/stream/text")
-def chat_stream(session_id: str, user_input: str):
-    return StreamingResponse(
-        stream_chat_response(session_id, user_input),
+async def chat_stream(session_id: str, user_input: str, agent_id: str = DEFAULT_AGENT_ID, turn_id: Optional[str] = None):
+    llm_logic = await warmup.module("llm_logic")
+    await admit(TEXT)
+    return AdmittedResponse(
+        llm_logic.astream_chat_response(session_id, user_input, agent_id, turn_id=turn_id),
+        TEXT,
         media_type="text/plain"
     )
 
+class VoiceChatRequest(BaseModel):
+    session_id: str
+    user_input: str
+    agent_id: str = DEFAULT_AGENT_ID
+    # generated ahead of the end of the user's turn; only recorded once committed
+    speculative: bool = False
+    # lets /chat/cancel target this reply and not a later one
+    turn_id: Optional[str] = None
+    # the previous turn was cut off unheard and user_input includes it; replace that turn
+    interrupted: bool = False
+
+class CommitRequest(BaseModel):
+    session_id: str
+    user_input: str
+    reply: str
+    agent_id: str = DEFAULT_AGENT_ID
+    interrupted: bool = False
+
+class CancelRequest(BaseModel):
+    session_id: str
+    turn_id: Optional[str] = None
+    # the part of the reply the caller actually heard; recorded instead of what was sent
+    heard: Optional[str] = None
+
+speculative_requests = metrics.counter("chat_speculative_requests_total", "Voice replies generated speculatively")
+speculative_commits = metrics.counter("chat_speculative_commits_total", "Speculative voice replies that were used and recorded")
+
+# voice worker: NDJSON events (see common/stream_protocol.py), tokens batched per flush window
 @app.post("/chat/stream/voice")
-def chat_stream(session_id: str, user_input: str):
-    return StreamingResponse(
-        stream_chat_response(session_id, user_input),
-        media_type="text/plain"
-    )
\ No newline at end of file
+async def chat_stream_voice(request: VoiceChatRequest):
+    llm_logic = await warmup.module("llm_logic")
+    if request.speculative:
+        speculative_requests.inc()
+    # live calls go ahead of text chats; speculative replies only use spare capacity
+    priority_class = SPECULATIVE if request.speculative else VOICE
+    await admit(priority_class)
+    # token counts for the usage event, filled in when the reply ends
+    turn_usage = TurnUsage()
+    return AdmittedResponse(
+        stream_protocol.encode_stream(
+            llm_logic.astream_chat_response(
+                request.session_id, request.user_input, request.agent_id,
+                record=not request.speculative, turn_id=request.turn_id, usage=turn_usage,
+                interrupted=request.interrupted,
+            ),
+            window=STREAM_FLUSH_WINDOW_MS / 1000,
+            turn_usage=turn_usage,
+        ),
+        priority_class,
+        media_type=stream_protocol.MEDIA_TYPE
+    )
+
+@app.post("/chat/commit")
+async def chat_commit(request: CommitRequest):
+    llm_logic = await warmup.module("llm_logic")
+    speculative_commits.inc()
+    await llm_logic.record_turn(
+        request.session_id, request.user_input, request.reply, request.agent_id, request.interrupted
+    )
+    return {"status": "ok"}
+
+# barge-in: stop generating the session's current reply
+@app.post("/chat/cancel")
+async def chat_cancel(request: CancelRequest):
+    if not warmup.ready:
+        # nothing can be streaming yet
+        return {"cancelled": False}
+    llm_logic = await warmup.module("llm_logic")
+    return {"cancelled": llm_logic.cancel_turn(request.session_id, request.turn_id, request.heard)}
+
+# agent configurations in effect (agents.json, reloaded on change)
+@app.get("/agents")
+async def list_agents():
+    llm_logic = await warmup.module("llm_logic")
+    return {agent_id: dataclasses.asdict(config) for agent_id, config in llm_logic.agents.configs.items()}
+
+# token usage ledger (see usage.py)
+@app.get("/usage/sessions/{session_id}")
+def session_usage(session_id: str):
+    totals = usage_ledger.session(session_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="No usage recorded for this session")
+    return totals
+
+@app.get("/usage/agents")
+def agents_usage():
+    return usage_ledger.agents()
+
+@app.get("/usage/agents/{agent_id}")
+def agent_usage(agent_id: str):
+    totals = usage_ledger.agent(agent_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="No usage recorded for this agent")
+    return totals
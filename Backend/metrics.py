@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The registry is shared with the voice worker and lives in ../common
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from common.metrics import Counter, Gauge, Histogram, escape_label, DEFAULT_BUCKETS, RATE_BUCKETS, METRICS_ENABLED, CONTENT_TYPE, counter, gauge, histogram, render
+
+__all__ = [
+    "Counter", "Gauge", "Histogram", "escape_label", "DEFAULT_BUCKETS", "RATE_BUCKETS", "METRICS_ENABLED",
+    "CONTENT_TYPE", "counter", "gauge", "histogram", "render",
+]
@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import metrics
+
+logger = logging.getLogger("VoiceAgent")
+
+# Flush at least this often, or sooner once this many records are waiting
+PERSIST_FLUSH_INTERVAL_MS = float(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "200"))
+PERSIST_MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", "256"))
+
+queue_depth = metrics.gauge("persist_queue_depth", "Chat history records waiting to be written")
+queue_sessions = metrics.gauge("persist_queue_sessions", "Sessions with chat history waiting to be written")
+flush_seconds = metrics.histogram("persist_flush_seconds", "Time to write one batch of queued chat history")
+coalesced = metrics.counter("persist_coalesced_total", "Turns merged into a write already queued for the same session")
+write_errors = metrics.counter("persist_write_errors_total", "Failed chat history writes (retried on the next flush)")
+dropped = metrics.counter("persist_dropped_records_total", "Chat history records lost: still failing to write at shutdown")
+
+# after close there is no next flush: failed writes are retried this many times, then dropped
+PERSIST_CLOSE_RETRIES = int(os.getenv("PERSIST_CLOSE_RETRIES", "2"))
+
+
+class WriteBehindPersister:
+    """
+    Moves chat history writes off the response path.
+
+    `enqueue` only records the messages; a background thread hands them to
+    `write(session_id, records)` in batches, one write per session no matter
+    how many turns were queued for it. `flush_session` lets a reader wait
+    for a session's queued writes before loading it, and `close` drains
+    everything on shutdown.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str, List[dict]], None],
+        flush_interval: float = PERSIST_FLUSH_INTERVAL_MS / 1000,
+        max_pending: int = PERSIST_MAX_PENDING,
+    ):
+        self.write = write
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: Dict[str, List[dict]] = {}
+        self._pending_count = 0
+        self._inflight: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+        # held while a batch is being written, so a flush_session() caller
+        # knows nothing for its session is still half way to storage
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        queue_depth.set_function(lambda: self._pending_count)
+        queue_sessions.set_function(lambda: len(self._pending))
+
+        self._thread = threading.Thread(target=self._run, name="chat-persister", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, session_id: str, records: List[dict]):
+        if not records:
+            return
+        if self._closed:
+            # shutting down: nobody will flush after us, write it now
+            self.write(session_id, records)
+            return
+        with self._lock:
+            queued = self._pending.get(session_id)
+            if queued is None:
+                self._pending[session_id] = list(records)
+            else:
+                queued.extend(records)
+                coalesced.inc()
+            self._pending_count += len(records)
+            if self._pending_count >= self.max_pending:
+                self._wakeup.set()
+
+    def has_pending(self, session_id: str) -> bool:
+        return session_id in self._pending or session_id in self._inflight
+
+    def flush_session(self, session_id: str):
+        """Write whatever is queued for one session before returning."""
+        if not self.has_pending(session_id):
+            return
+        with self._flush_lock:
+            with self._lock:
+                records = self._pending.pop(session_id, None)
+                if records:
+                    self._pending_count -= len(records)
+            if records:
+                self._write({session_id: records})
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_count = 0
+                self._inflight = batch
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                self._inflight = {}
+
+    def close(self):
+        """Stop the background thread and write everything still queued."""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Chat history flush failed: {e!r}")
+
+    def _write(self, batch: Dict[str, List[dict]]):
+        started = time.perf_counter()
+        for session_id, records in batch.items():
+            try:
+                self.write(session_id, records)
+            except Exception as e:
+                write_errors.inc()
+                logger.error(f"Failed to write chat history for {session_id}: {e!r}")
+                self._requeue(session_id, records)
+        flush_seconds.observe(time.perf_counter() - started)
+
+    def _requeue(self, session_id: str, records: List[dict]):
+        if self._closed:
+            self._write_on_close(session_id, records)
+            return
+        with self._lock:
+            # older records go back in front of anything queued meanwhile
+            self._pending[session_id] = records + self._pending.get(session_id, [])
+            self._pending_count += len(records)
+
+    def _write_on_close(self, session_id: str, records: List[dict]):
+        for attempt in range(PERSIST_CLOSE_RETRIES):
+            time.sleep(0.1 * (attempt + 1))
+            try:
+                self.write(session_id, records)
+                return
+            except Exception as e:
+                write_errors.inc()
+                logger.error(f"Failed to write chat history for {session_id} at shutdown: {e!r}")
+        dropped.inc(len(records))
+        logger.error(f"Dropped {len(records)} chat history records for {session_id}: still failing at shutdown")
@@ -0,0 +1,189 @@
+import os
+import re
+import math
+import time
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import metrics
+
+# Opt-in: replies are only cached and replayed when this is set
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# TF-IDF cosine similarity needed to reuse a reply for a differently worded
+# question; 0 means exact (normalized) matches only
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+# Short inputs ("yes", "why?") depend on the conversation, never cache them
+RESPONSE_CACHE_MIN_WORDS = int(os.getenv("RESPONSE_CACHE_MIN_WORDS", "3"))
+# Replay pace for cached replies, per word, roughly what the LLM streams at
+RESPONSE_CACHE_REPLAY_DELAY_MS = float(os.getenv("RESPONSE_CACHE_REPLAY_DELAY_MS", "20"))
+
+lookups = metrics.counter("response_cache_lookups_total", "Response cache lookups", ["result"])
+latency_saved = metrics.counter("response_cache_latency_saved_seconds_total", "Generation time avoided by replaying cached replies")
+cache_entries = metrics.gauge("response_cache_entries", "Replies currently cached")
+hit_ratio = metrics.gauge("response_cache_hit_ratio", "Share of lookups answered from the cache")
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+class _Entry:
+    __slots__ = ("agent_id", "key", "reply", "generation_time", "expires", "terms")
+
+    def __init__(self, agent_id: str, key: str, reply: str, generation_time: float, expires: float):
+        self.agent_id = agent_id
+        self.key = key
+        self.reply = reply
+        self.generation_time = generation_time
+        self.expires = expires
+        self.terms = Counter(key.split())
+
+
+class ResponseCache:
+    """
+    Replies to repeated questions, per agent.
+
+    Lookups match on the normalized user input, and optionally on TF-IDF
+    cosine similarity against the other questions cached for the same agent.
+    Entries expire after `ttl` seconds and the least recently used ones go
+    once there are more than `max_size`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_MAX_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        min_words: int = RESPONSE_CACHE_MIN_WORDS,
+        replay_delay: float = RESPONSE_CACHE_REPLAY_DELAY_MS / 1000,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.min_words = min_words
+        self.replay_delay = replay_delay
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        # agent_id -> term -> number of cached questions containing it
+        self._doc_freq: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._lookups = 0
+        cache_entries.set_function(lambda: len(self._entries))
+        hit_ratio.set_function(lambda: self._hits / self._lookups if self._lookups else 0.0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, user_message: str) -> bool:
+        return len(normalize(user_message).split()) >= self.min_words
+
+    def get(self, agent_id: str, user_message: str) -> Optional[_Entry]:
+        key = normalize(user_message)
+        now = time.monotonic()
+        with self._lock:
+            self._lookups += 1
+            entry = self._entries.get((agent_id, key))
+            if entry is None and self.similarity > 0:
+                entry = self._most_similar(agent_id, key, now)
+            if entry is not None and entry.expires <= now:
+                self._remove(entry)
+                entry = None
+            if entry is None:
+                lookups.labels("miss").inc()
+                return None
+            self._entries.move_to_end((entry.agent_id, entry.key))
+            self._hits += 1
+        lookups.labels("hit").inc()
+        return entry
+
+    def put(self, agent_id: str, user_message: str, reply: str, generation_time: float):
+        key = normalize(user_message)
+        if not reply or len(key.split()) < self.min_words:
+            return
+        entry = _Entry(agent_id, key, reply, generation_time, time.monotonic() + self.ttl)
+        with self._lock:
+            old = self._entries.get((agent_id, key))
+            if old is not None:
+                self._remove(old)
+            self._entries[(agent_id, key)] = entry
+            self._doc_freq.setdefault(agent_id, Counter()).update(entry.terms.keys())
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries.values())))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._doc_freq.clear()
+
+    def chunks(self, reply: str) -> List[str]:
+        # word-sized pieces, like the deltas the LLM streams
+        return re.findall(r"\S+\s*|\s+", reply)
+
+    def replay(self, entry: _Entry) -> Iterator[str]:
+        started = time.perf_counter()
+        for i, chunk in enumerate(self.chunks(entry.reply)):
+            if i:
+                time.sleep(self.replay_delay)
+            yield chunk
+        latency_saved.inc(max(0.0, entry.generation_time - (time.perf_counter() - started)))
+
+    async def areplay(self, entry: _Entry):
+        started = time.perf_counter()
+        for i, chunk in enumerate(self.chunks(entry.reply)):
+            if i:
+                await asyncio.sleep(self.replay_delay)
+            yield chunk
+        latency_saved.inc(max(0.0, entry.generation_time - (time.perf_counter() - started)))
+
+    def _remove(self, entry: _Entry):
+        self._entries.pop((entry.agent_id, entry.key), None)
+        doc_freq = self._doc_freq.get(entry.agent_id)
+        if doc_freq is None:
+            return
+        for term in entry.terms:
+            doc_freq[term] -= 1
+            if doc_freq[term] <= 0:
+                del doc_freq[term]
+
+    def _most_similar(self, agent_id: str, key: str, now: float) -> Optional[_Entry]:
+        doc_freq = self._doc_freq.get(agent_id)
+        if not doc_freq:
+            return None
+        docs = sum(1 for a, _ in self._entries if a == agent_id)
+
+        def weights(terms: Counter) -> Dict[str, float]:
+            # smoothed idf, so terms every cached question shares still count a little
+            return {t: n * (math.log((1 + docs) / (1 + doc_freq.get(t, 0))) + 1) for t, n in terms.items()}
+
+        def norm(vector: Dict[str, float]) -> float:
+            return math.sqrt(sum(w * w for w in vector.values()))
+
+        query = weights(Counter(key.split()))
+        query_norm = norm(query)
+        if not query_norm:
+            return None
+
+        best, best_score = None, self.similarity
+        for entry in self._entries.values():
+            if entry.agent_id != agent_id or entry.expires <= now:
+                continue
+            vector = weights(entry.terms)
+            dot = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            if not dot:
+                continue
+            score = dot / (query_norm * norm(vector))
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,176 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import metrics
+
+logger = logging.getLogger("VoiceAgent")
+
+T = TypeVar("T")
+
+cache_hits = metrics.counter("session_cache_hits_total", "Session lookups served from memory")
+cache_misses = metrics.counter("session_cache_misses_total", "Session lookups that rebuilt state from the chat store")
+cache_evictions = metrics.counter("session_cache_evictions_total", "Sessions persisted and dropped from memory", ["reason"])
+cache_size = metrics.gauge("session_cache_size", "Sessions currently held in memory")
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("value", "last_used", "leases")
+
+    def __init__(self, value: T):
+        self.value = value
+        self.last_used = time.monotonic()
+        self.leases = 0
+
+
+class SessionCache(Generic[T]):
+    """
+    LRU cache of per-session state with an idle TTL.
+
+    `build(session_id, *build_args)` creates state on a miss (rehydrating from
+    storage; the extra arguments come from lease),
+    `persist(session_id, value)` runs before an entry is dropped. Entries that
+    are leased (a reply is streaming) are never evicted.
+
+    The lock only guards the map. Building and persisting do disk I/O, so
+    they run outside it (on a thread when called from the event loop), with
+    the key marked busy meanwhile: other leases of that session wait for it,
+    every other session goes on.
+    """
+
+    def __init__(
+        self,
+        build: Callable[..., T],
+        persist: Callable[[str, T], None],
+        max_size: int = 1000,
+        idle_ttl: float = 1800.0,
+    ):
+        self.build = build
+        self.persist = persist
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, _Entry[T]]" = OrderedDict()
+        # sessions being built or persisted; resolved when that is over
+        self._busy: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        cache_size.set_function(lambda: len(self._entries))
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def lease(self, session_id: str, *build_args):
+        entry = await self._acquire(session_id, build_args)
+        try:
+            yield entry.value
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    def peek(self, session_id: str) -> Optional[T]:
+        entry = self._entries.get(session_id)
+        return entry.value if entry else None
+
+    def evict_idle(self):
+        # blocking: persists on the calling thread
+        with self._lock:
+            victims = self._evict(time.monotonic())
+        self._persist(victims)
+
+    def discard(self, session_id: str) -> bool:
+        """Persist and drop one session, unless a reply is streaming from it or it is loading (False). Blocking."""
+        with self._lock:
+            if session_id in self._busy:
+                return False
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return True
+            if entry.leases:
+                return False
+            victims = [self._pop(session_id, "handoff")]
+        self._persist(victims)
+        return True
+
+    def clear(self):
+        """Persist and drop everything, e.g. on shutdown."""
+        with self._lock:
+            victims = [self._pop(session_id, "shutdown") for session_id in list(self._entries)]
+        self._persist(victims)
+
+    async def _acquire(self, session_id: str, build_args: tuple) -> _Entry[T]:
+        while True:
+            with self._lock:
+                busy = self._busy.get(session_id)
+                if busy is None:
+                    entry = self._entries.get(session_id)
+                    if entry is not None:
+                        cache_hits.inc()
+                        entry.leases += 1
+                        entry.last_used = time.monotonic()
+                        self._entries.move_to_end(session_id)
+                        victims = self._evict(entry.last_used)
+                    else:
+                        # this lease builds the session; others wait for it
+                        building = self._busy[session_id] = Future()
+                    break
+            await asyncio.wrap_future(busy)
+
+        if entry is None:
+            cache_misses.inc()
+            try:
+                value = await asyncio.to_thread(self.build, session_id, *build_args)
+            except BaseException:
+                with self._lock:
+                    del self._busy[session_id]
+                building.set_result(None)
+                raise
+            entry = _Entry(value)
+            entry.leases = 1
+            with self._lock:
+                del self._busy[session_id]
+                self._entries[session_id] = entry
+                victims = self._evict(time.monotonic())
+            building.set_result(None)
+        if victims:
+            await asyncio.to_thread(self._persist, victims)
+        return entry
+
+    def _evict(self, now: float) -> List[Tuple[str, T, Future]]:
+        # under the lock: entries are kept in last-use order, so idle ones sit at the front
+        victims = []
+        for session_id, entry in list(self._entries.items()):
+            over_size = len(self._entries) > self.max_size
+            idle = now - entry.last_used > self.idle_ttl
+            if not over_size and not idle:
+                break
+            if entry.leases:
+                continue
+            victims.append(self._pop(session_id, "idle" if idle else "lru"))
+        return victims
+
+    def _pop(self, session_id: str, reason: str) -> Tuple[str, T, Future]:
+        # under the lock: the session stays busy until it is persisted, so it is not rebuilt from stale storage
+        entry = self._entries.pop(session_id)
+        done = self._busy[session_id] = Future()
+        cache_evictions.labels(reason).inc()
+        return session_id, entry.value, done
+
+    def _persist(self, victims: List[Tuple[str, T, Future]]):
+        for session_id, value, done in victims:
+            try:
+                self.persist(session_id, value)
+            except Exception as e:
+                logger.error(f"Failed to persist session {session_id} on eviction: {e}")
+            finally:
+                with self._lock:
+                    del self._busy[session_id]
+                done.set_result(None)
@@ -0,0 +1,194 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory import ChatMemoryBuffer
+
+from context_assembly import CONTEXT_TRUNCATE_BLOCK, window_start
+
+logger = logging.getLogger("VoiceAgent")
+
+# Upper bound we ask the summarizer to stay under
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "256"))
+
+# (previous summary, newly evicted messages) -> updated summary
+Summarizer = Callable[[str, List[ChatMessage]], Awaitable[str]]
+
+
+class RollingSummaryMemory(ChatMemoryBuffer):
+    """
+    ChatMemoryBuffer that counts tokens once per message.
+
+    ChatMemoryBuffer re-tokenizes the whole window every time it drops a
+    message, so fitting the history costs O(n^2) tokenizer calls per turn.
+    Here each message is tokenized when first seen and the window is found
+    by walking the cached counts from the end.
+
+    Messages that fall out of the window are not lost: they are folded
+    into a running summary by `summarizer` in the background, and the
+    summary is sent in front of the window as a system message. Until the
+    summary catches up, the evicted messages are simply left out.
+
+    The window keeps its start from turn to turn and is cut in blocks when
+    it fills up (see context_assembly.py), so consecutive prompts share
+    their beginning.
+    """
+
+    summarizer: Optional[Summarizer] = Field(default=None, exclude=True)
+
+    _token_counts: List[int] = PrivateAttr(default_factory=list)
+    _summary: str = PrivateAttr(default="")
+    _summary_tokens: int = PrivateAttr(default=0)
+    # messages before this index are covered by the summary
+    _summarized: int = PrivateAttr(default=0)
+    _summarizing: bool = PrivateAttr(default=False)
+    # first message of the window sent last turn
+    _start: int = PrivateAttr(default=0)
+    # bumped whenever the history is replaced, so a late summary is dropped
+    _generation: int = PrivateAttr(default=0)
+    _task: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RollingSummaryMemory"
+
+    @classmethod
+    def from_defaults(cls, *args, summarizer: Optional[Summarizer] = None, **kwargs) -> "RollingSummaryMemory":
+        memory = super().from_defaults(*args, **kwargs)
+        memory.summarizer = summarizer
+        return memory
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def restore_summary(self, summary: str):
+        """Start from a summary saved elsewhere (another worker, a previous process)."""
+        with self._lock:
+            self._summary = summary
+            self._summary_tokens = self._count(self._summary_message(summary)) if summary else 0
+
+    def set(self, messages: List[ChatMessage]) -> None:
+        super().set(messages)
+        self._forget()
+
+    async def aset(self, messages: List[ChatMessage]) -> None:
+        await super().aset(messages)
+        self._forget()
+
+    def reset(self) -> None:
+        super().reset()
+        self._forget()
+
+    def pop(self) -> Optional[ChatMessage]:
+        """Remove the newest message, keeping the summary and the window start."""
+        with self._lock:
+            message = self.chat_store.delete_last_message(self.chat_store_key)
+            if message is None:
+                return None
+            remaining = len(self.get_all())
+            del self._token_counts[remaining:]
+            self._start = min(self._start, remaining)
+        return message
+
+    def get(self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs) -> List[ChatMessage]:
+        if initial_token_count > self.token_limit:
+            raise ValueError("Initial token count exceeds token limit")
+
+        history = self.get_all()
+        counts = self._counts(history)
+        if not history:
+            return []
+
+        summary = self._summary
+        budget = self.token_limit - initial_token_count - (self._summary_tokens if summary else 0)
+
+        start = self._start
+        if summary:
+            # never repeat what the summary already covers
+            start = max(start, self._summarized)
+        block = int(self.token_limit * CONTEXT_TRUNCATE_BLOCK)
+        moved = window_start(counts, start, budget, block)
+        if moved != start:
+            start = moved
+            # the window must not open with an assistant or tool message
+            while start < len(history) - 1 and history[start].role in (MessageRole.ASSISTANT, MessageRole.TOOL):
+                start += 1
+        self._start = start
+
+        if sum(counts[start:]) > budget:
+            # a single message longer than the limit: send it and let the LLM complain
+            return history[-1:]
+
+        if start > self._summarized:
+            self._schedule_summary(history, start)
+
+        window = history[start:]
+        if summary:
+            window = [self._summary_message(summary)] + window
+        return window
+
+    async def aget(self, input: Optional[str] = None, initial_token_count: int = 0, **kwargs) -> List[ChatMessage]:
+        # cheap now, no need for a thread hop
+        return self.get(input=input, initial_token_count=initial_token_count, **kwargs)
+
+    def _forget(self):
+        with self._lock:
+            self._token_counts = []
+            self._summary = ""
+            self._summary_tokens = 0
+            self._summarized = 0
+            self._start = 0
+            self._generation += 1
+
+    def _count(self, message: ChatMessage) -> int:
+        return len(self.tokenizer_fn(str(message.content)))
+
+    def _counts(self, history: List[ChatMessage]) -> List[int]:
+        counts = self._token_counts
+        if len(counts) > len(history):
+            # history was replaced behind our back
+            counts.clear()
+        for message in history[len(counts):]:
+            counts.append(self._count(message))
+        return counts
+
+    def _summary_message(self, summary: str) -> ChatMessage:
+        return ChatMessage(role=MessageRole.SYSTEM, content=f"Summary of the earlier conversation: {summary}")
+
+    def _schedule_summary(self, history: List[ChatMessage], end: int):
+        if self.summarizer is None:
+            return
+        with self._lock:
+            if self._summarizing:
+                return
+            self._summarizing = True
+
+        evicted = history[self._summarized:end]
+        job = self._summarize(self._summary, evicted, end, self._generation)
+        try:
+            self._task = asyncio.get_running_loop().create_task(job)
+        except RuntimeError:
+            # called from a thread without an event loop
+            threading.Thread(target=asyncio.run, args=(job,), daemon=True).start()
+
+    async def _summarize(self, previous: str, evicted: List[ChatMessage], end: int, generation: int):
+        try:
+            summary = (await self.summarizer(previous, evicted)).strip()
+        except Exception as e:
+            logger.error(f"Memory summarization failed: {e!r}")
+            summary = None
+        with self._lock:
+            self._summarizing = False
+            if summary is not None and generation == self._generation:
+                self._summary = summary
+                self._summary_tokens = self._count(self._summary_message(summary))
+                self._summarized = end
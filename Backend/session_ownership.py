@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+from session_state import Lease, SessionStateStore, SESSION_LEASE_TTL, WORKER_ID, create_state_store
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+# how long a worker waits for the previous owner to hand a session over
+# before taking it anyway (the previous owner is then assumed dead)
+SESSION_HANDOFF_TIMEOUT = float(os.getenv("SESSION_HANDOFF_TIMEOUT", "3"))
+# how often handoff requests are checked
+SESSION_HANDOFF_POLL = float(os.getenv("SESSION_HANDOFF_POLL", "0.5"))
+
+claims = metrics.counter("session_claims_total", "Sessions taken over by this worker", ["how"])
+handoffs = metrics.counter("session_handoffs_total", "Sessions handed over to another worker")
+lost = metrics.counter("session_leases_lost_total", "Sessions found to be owned by another worker on write")
+owned = metrics.gauge("session_leases_held", "Sessions this worker holds a lease on")
+
+
+class SessionOwnership:
+    """
+    Which sessions this worker may serve, backed by a shared SessionStateStore.
+
+    A worker claims a session before building it and releases it when the
+    session leaves its cache. If another worker holds the session, the
+    claim asks it to hand over and waits (it flushes its history, then
+    releases) for up to `handoff_timeout` seconds; after that the lease is
+    taken by force.
+    """
+
+    def __init__(
+        self,
+        store: SessionStateStore,
+        worker_id: str = WORKER_ID,
+        ttl: float = SESSION_LEASE_TTL,
+        handoff_timeout: float = SESSION_HANDOFF_TIMEOUT,
+    ):
+        self.store = store
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.handoff_timeout = handoff_timeout
+        self._leases: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        owned.set_function(lambda: len(self._leases))
+
+    def holds(self, session_id: str) -> bool:
+        # this worker's own record; see verify for what the shared store says
+        return session_id in self._leases
+
+    def verify(self, session_id: str) -> bool:
+        """Whether we still own the session according to the store; forgets a lost lease. Blocking."""
+        lease = self._leases.get(session_id)
+        if lease is None:
+            return False
+        if self.store.current(lease):
+            return True
+        # taken over by force while we still had it cached
+        lost.inc()
+        with self._lock:
+            self._leases.pop(session_id, None)
+        return False
+
+    def lease(self, session_id: str) -> Optional[Lease]:
+        return self._leases.get(session_id)
+
+    async def claim(self, session_id: str) -> Lease:
+        lease = self._leases.get(session_id)
+        if lease is not None:
+            return lease
+        # the store may wait on a lock held by another worker, keep that off the loop
+        lease = await asyncio.to_thread(self.store.acquire, session_id, self.worker_id, self.ttl)
+        how = "free"
+        if lease is None:
+            await asyncio.to_thread(self.store.request_handoff, session_id)
+            deadline = time.monotonic() + self.handoff_timeout
+            while lease is None and time.monotonic() < deadline:
+                await asyncio.sleep(SESSION_HANDOFF_POLL / 5)
+                lease = await asyncio.to_thread(self.store.acquire, session_id, self.worker_id, self.ttl)
+            how = "handoff"
+            if lease is None:
+                logger.warning(f"Session {session_id} was not handed over in time, taking it")
+                lease = await asyncio.to_thread(self.store.acquire, session_id, self.worker_id, self.ttl, True)
+                how = "forced"
+        claims.labels(how).inc()
+        with self._lock:
+            self._leases[session_id] = lease
+        return lease
+
+    def save_summary(self, session_id: str, summary: str) -> bool:
+        # blocking: a write to the shared store, run it on a thread from async code
+        lease = self._leases.get(session_id)
+        if lease is None:
+            return False
+        if self.store.save(lease, summary):
+            lease.summary = summary
+            return True
+        # another worker took the session over
+        lost.inc()
+        with self._lock:
+            self._leases.pop(session_id, None)
+        return False
+
+    def release(self, session_id: str):
+        with self._lock:
+            lease = self._leases.pop(session_id, None)
+        if lease is not None:
+            self.store.release(lease)
+
+    async def run(self, discard: Callable[[str], bool]):
+        """
+        Keep our leases alive and answer handoff requests, until cancelled.
+
+        `discard(session_id)` must persist and drop the session (which
+        releases it) and return False while a reply is still streaming.
+        """
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(SESSION_HANDOFF_POLL)
+            try:
+                if time.monotonic() - renewed > self.ttl / 3:
+                    await asyncio.to_thread(self.store.renew, self.worker_id, self.ttl)
+                    renewed = time.monotonic()
+                for session_id in await asyncio.to_thread(self.store.handoffs, self.worker_id):
+                    if await asyncio.to_thread(discard, session_id):
+                        await asyncio.to_thread(self.release, session_id)
+                        handoffs.inc()
+            except Exception as e:
+                logger.error(f"Session lease maintenance failed: {e!r}")
+
+
+ownership = SessionOwnership(create_state_store())
@@ -0,0 +1,423 @@
+"""
+Session-affinity front for several backend workers.
+
+Every request that names a session (a `session_id` query parameter, JSON
+body field, or /usage/sessions/<id> path) goes to the worker that owns
+that session on a consistent-hash ring; anything else is spread round
+robin. Responses are streamed through, and a client that disconnects
+closes the upstream request, so cancellation still reaches the worker.
+
+Each worker keeps its own metrics and usage ledger. GET /metrics,
+/usage/agents and /usage/agents/<id> are asked of every worker and merged
+(metrics get a `worker` label, usage totals are summed); if a worker does
+not answer the request fails with 502 rather than returning part of the
+numbers. /usage/sessions/<id> goes to the session's worker, which only
+knows the turns it served since the session was last moved.
+
+When workers are added or removed only the sessions on the changed part
+of the ring move. The new owner claims them through the shared session
+state store and the previous owner hands them over (session_ownership.py),
+so SESSION_STATE_BACKEND must be shared (sqlite) in this mode.
+
+    cd Backend
+    SESSION_STATE_BACKEND=sqlite python session_router.py --workers 4
+
+starts 4 uvicorn workers on ROUTER_WORKER_BASE_PORT.. and the router on
+ROUTER_PORT. With --upstream the router fronts workers started elsewhere.
+PUT /router/workers with a JSON list of worker URLs rebalances; it needs
+`Authorization: Bearer $ROUTER_ADMIN_TOKEN` and is refused while that is
+unset. The router's own metrics are at /router/metrics.
+"""
+import os
+import sys
+import hmac
+import json
+import bisect
+import hashlib
+import asyncio
+import logging
+import argparse
+import itertools
+import subprocess
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+ROUTER_PORT = int(os.getenv("ROUTER_PORT", "8000"))
+ROUTER_WORKER_BASE_PORT = int(os.getenv("ROUTER_WORKER_BASE_PORT", "8100"))
+# points per worker on the ring; more points spread sessions more evenly
+ROUTER_VNODES = int(os.getenv("ROUTER_VNODES", "64"))
+ROUTER_MAX_CONNECTIONS = int(os.getenv("ROUTER_MAX_CONNECTIONS", "500"))
+# required to change the worker list; without it PUT /router/workers is refused
+ROUTER_ADMIN_TOKEN = os.getenv("ROUTER_ADMIN_TOKEN", "")
+
+routed = metrics.counter("router_requests_total", "Requests forwarded to a worker", ["worker", "affinity"])
+upstream_errors = metrics.counter("router_upstream_errors_total", "Requests that failed to reach their worker", ["worker"])
+
+# answered by every worker and merged, see merge_metrics and merge_usage
+FAN_OUT_PATHS = ("/metrics", "/usage/agents")
+FAN_OUT_TIMEOUT = 10.0
+
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade", "host", "content-length"}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of session ids onto workers."""
+
+    def __init__(self, nodes: List[str] = (), vnodes: int = ROUTER_VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        self.set_nodes(nodes)
+
+    def set_nodes(self, nodes: List[str]):
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(self.vnodes))
+        # swap in one go, lookups never see a half-built ring
+        self._points, self._owners, self.nodes = [p for p, _ in ring], [n for _, n in ring], list(nodes)
+
+    def node(self, key: str) -> str:
+        points, owners = self._points, self._owners
+        if not points:
+            raise LookupError("No workers")
+        i = bisect.bisect(points, _hash(key)) % len(points)
+        return owners[i]
+
+
+def parse_workers(body: bytes) -> List[str]:
+    # a non-empty JSON list of http(s) base URLs, anything else is a ValueError
+    workers = json.loads(body)
+    if not isinstance(workers, list) or not workers:
+        raise ValueError("expected a non-empty list of worker URLs")
+    for worker in workers:
+        if not isinstance(worker, str):
+            raise ValueError(f"not a URL: {worker!r}")
+        parts = urlsplit(worker)
+        if parts.scheme not in ("http", "https") or not parts.hostname or parts.query or parts.fragment:
+            raise ValueError(f"not an http(s) base URL: {worker!r}")
+    return [worker.rstrip("/") for worker in workers]
+
+
+def session_of(path: str, query_string: bytes, body: bytes) -> Optional[str]:
+    query = parse_qs(query_string.decode("latin-1"))
+    if "session_id" in query:
+        return query["session_id"][0]
+    if path.startswith("/usage/sessions/"):
+        return path[len("/usage/sessions/"):]
+    if body[:1] == b"{":
+        try:
+            session_id = json.loads(body).get("session_id")
+        except ValueError:
+            return None
+        return str(session_id) if session_id is not None else None
+    return None
+
+
+def fans_out(method: str, path: str) -> bool:
+    return method == "GET" and (path in FAN_OUT_PATHS or path.startswith("/usage/agents/"))
+
+
+def _with_label(sample: str, name: str, value: str) -> str:
+    # `metric{a="b"} 1` or `metric 1` -> the same sample with one more label first
+    label = f'{name}="{metrics.escape_label(value)}"'
+    brace, space = sample.find("{"), sample.find(" ")
+    if brace != -1 and brace < space:
+        return f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+    return f"{sample[:space]}{{{label}}}{sample[space:]}"
+
+
+def merge_metrics(pages: Dict[str, str]) -> str:
+    """Concatenate the workers' exposition pages, each sample labelled with its worker."""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for worker, page in pages.items():
+        family = None
+        for line in page.splitlines():
+            if line.startswith("# "):
+                family = line.split(" ", 3)[2]
+                if family not in headers:
+                    headers[family], samples[family] = [], []
+                if len(headers[family]) < 2 and line not in headers[family]:
+                    headers[family].append(line)
+            elif line and family is not None:
+                samples[family].append(_with_label(line, "worker", worker))
+    lines = []
+    for family in headers:
+        lines += headers[family] + samples[family]
+    return "\n".join(lines) + "\n"
+
+
+def merge_usage(totals: List[Dict[str, int]]) -> Dict[str, int]:
+    merged: Dict[str, int] = {}
+    for t in totals:
+        for key, value in t.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+class SessionRouter:
+    """ASGI app forwarding HTTP and websocket traffic to the session's worker."""
+
+    def __init__(self, workers: List[str], vnodes: int = ROUTER_VNODES, admin_token: str = ROUTER_ADMIN_TOKEN):
+        self.admin_token = admin_token
+        self.ring = HashRing(workers, vnodes)
+        self._round_robin = itertools.cycle(workers)
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=5.0, read=None, write=10.0, pool=10.0),
+            limits=httpx.Limits(max_connections=ROUTER_MAX_CONNECTIONS, max_keepalive_connections=ROUTER_MAX_CONNECTIONS),
+        )
+
+    def set_workers(self, workers: List[str]):
+        self.ring.set_nodes(workers)
+        self._round_robin = itertools.cycle(workers)
+
+    def pick(self, session_id: Optional[str]) -> str:
+        if session_id is None:
+            return next(self._round_robin)
+        return self.ring.node(session_id)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.http.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        if scope["path"].startswith("/router/"):
+            await self._admin(scope, receive, send)
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        if fans_out(scope["method"], scope["path"]):
+            await self._fan_out(scope, send)
+            return
+
+        session_id = session_of(scope["path"], scope["query_string"], body)
+        worker = self.pick(session_id)
+        routed.labels(worker, "session" if session_id else "none").inc()
+        url = worker + scope["path"] + (f"?{scope['query_string'].decode('latin-1')}" if scope["query_string"] else "")
+        headers = [(k, v) for k, v in scope["headers"] if k.decode("latin-1").lower() not in HOP_HEADERS]
+
+        request = self.http.build_request(scope["method"], url, headers=headers, content=body)
+        try:
+            response = await self.http.send(request, stream=True)
+        except httpx.HTTPError as e:
+            upstream_errors.labels(worker).inc()
+            logger.error(f"Worker {worker} unreachable: {e!r}")
+            await send({"type": "http.response.start", "status": 502, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Bad gateway"})
+            return
+
+        async def forward():
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (k, v) for k, v in response.headers.raw if k.decode("latin-1").lower() not in HOP_HEADERS
+                ],
+            })
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        forwarding = asyncio.create_task(forward())
+        # client gone: closing the upstream response cancels the reply on the worker
+        disconnected = asyncio.create_task(self._wait_disconnect(receive))
+        try:
+            await asyncio.wait({forwarding, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (forwarding, disconnected):
+                task.cancel()
+            await asyncio.gather(forwarding, disconnected, return_exceptions=True)
+            await response.aclose()
+        if not forwarding.cancelled() and forwarding.exception():
+            upstream_errors.labels(worker).inc()
+            logger.error(f"Proxying to {worker} failed: {forwarding.exception()!r}")
+
+    async def _fan_out(self, scope, send):
+        # per-worker numbers: ask every worker, merge, and fail if any is missing
+        path = scope["path"]
+        workers = list(self.ring.nodes)
+        responses = await asyncio.gather(
+            *(self.http.get(worker + path, timeout=FAN_OUT_TIMEOUT) for worker in workers), return_exceptions=True
+        )
+        found = {}
+        for worker, response in zip(workers, responses):
+            routed.labels(worker, "all").inc()
+            if isinstance(response, Exception) or response.status_code not in (200, 404):
+                upstream_errors.labels(worker).inc()
+                logger.error(f"Worker {worker} did not answer {path}: {response!r}")
+                await send({"type": "http.response.start", "status": 502, "headers": [(b"content-type", b"text/plain")]})
+                await send({"type": "http.response.body", "body": b"Bad gateway"})
+                return
+            if response.status_code == 200:
+                found[worker] = response
+
+        status, content_type = 200, b"application/json"
+        if path == "/metrics":
+            payload = merge_metrics({w: r.text for w, r in found.items()}).encode("utf-8")
+            content_type = metrics.CONTENT_TYPE.encode()
+        elif path == "/usage/agents":
+            by_agent: Dict[str, List[Dict[str, int]]] = {}
+            for response in found.values():
+                for agent_id, totals in response.json().items():
+                    by_agent.setdefault(agent_id, []).append(totals)
+            payload = json.dumps({agent_id: merge_usage(t) for agent_id, t in by_agent.items()}).encode("utf-8")
+        elif found:
+            payload = json.dumps(merge_usage([r.json() for r in found.values()])).encode("utf-8")
+        else:
+            status, payload = 404, b'{"detail": "No usage recorded for this agent"}'
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _admin(self, scope, receive, send):
+        # the router's own endpoints: its metrics and the worker list (PUT to rebalance)
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        status, content_type = 200, b"application/json"
+        if scope["path"] == "/router/metrics":
+            payload, content_type = metrics.render().encode("utf-8"), metrics.CONTENT_TYPE.encode()
+        elif scope["path"] == "/router/workers":
+            if scope["method"] == "PUT":
+                if not self._authorized(scope):
+                    status, payload = 403, b'{"detail": "Forbidden"}'
+                else:
+                    try:
+                        self.set_workers(parse_workers(body))
+                        logger.info(f"Routing to {self.ring.nodes}")
+                    except ValueError as e:
+                        status = 400
+                        payload = json.dumps({"detail": f"Invalid worker list: {e}"}).encode("utf-8")
+            if status == 200:
+                payload = json.dumps(self.ring.nodes).encode("utf-8")
+        else:
+            status, payload = 404, b'{"detail": "Not Found"}'
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": payload})
+
+    def _authorized(self, scope) -> bool:
+        if not self.admin_token:
+            return False
+        authorization = dict(scope["headers"]).get(b"authorization", b"")
+        return hmac.compare_digest(authorization, f"Bearer {self.admin_token}".encode("utf-8"))
+
+    async def _wait_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _websocket(self, scope, receive, send):
+        import websockets
+
+        session_id = session_of(scope["path"], scope["query_string"], b"")
+        worker = self.pick(session_id)
+        routed.labels(worker, "session" if session_id else "none").inc()
+        url = "ws" + worker[len("http"):] + scope["path"]
+        if scope["query_string"]:
+            url += "?" + scope["query_string"].decode("latin-1")
+
+        if (await receive())["type"] != "websocket.connect":
+            return
+        try:
+            upstream = await websockets.connect(url, max_size=None)
+        except Exception as e:
+            upstream_errors.labels(worker).inc()
+            logger.error(f"Worker {worker} unreachable: {e!r}")
+            await send({"type": "websocket.close", "code": 1011})
+            return
+        await send({"type": "websocket.accept"})
+
+        async def client_to_worker():
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message["bytes"] if message.get("bytes") is not None else message["text"])
+
+        async def worker_to_client():
+            async for data in upstream:
+                key = "bytes" if isinstance(data, bytes) else "text"
+                await send({"type": "websocket.send", key: data})
+            await send({"type": "websocket.close", "code": upstream.close_code or 1000})
+
+        tasks = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+
+
+def spawn_workers(count: int, base_port: int, env: Optional[Dict[str, str]] = None, app: str = "main:app") -> List[subprocess.Popen]:
+    env = dict(os.environ, **(env or {}))
+    processes = []
+    for i in range(count):
+        port = base_port + i
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            env=dict(env, WORKER_ID=f"worker-{port}"),
+        ))
+    return processes
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Session-affinity router for several backend workers")
+    parser.add_argument("--workers", type=int, default=0, help="start this many local workers")
+    parser.add_argument("--upstream", nargs="*", default=[], help="worker base URLs started elsewhere")
+    parser.add_argument("--port", type=int, default=ROUTER_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # one line per proxied request otherwise
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if args.workers and os.getenv("SESSION_STATE_BACKEND", "local") == "local":
+        logger.warning("SESSION_STATE_BACKEND=local is not shared between workers; use sqlite")
+
+    processes = spawn_workers(args.workers, ROUTER_WORKER_BASE_PORT)
+    workers = args.upstream + [f"http://127.0.0.1:{ROUTER_WORKER_BASE_PORT + i}" for i in range(args.workers)]
+    try:
+        uvicorn.run(SessionRouter(workers), host="0.0.0.0", port=args.port, log_level="warning")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
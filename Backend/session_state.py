@@ -0,0 +1,239 @@
+import os
+import time
+import socket
+import threading
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from history_store import connect_wal
+
+# Session state shared by every backend worker, so a session can move
+# between workers (see session_router.py). Per session it holds the
+# rolling summary and an ownership lease:
+#
+#   owner        worker currently serving the session, None if free
+#   expires      wall-clock end of the lease; a dead worker's lease runs out
+#   version      bumped on every change of owner; a worker that lost the
+#                session can no longer write its state
+#   handoff      another worker asked for the session
+#
+# The chat history itself stays in the chat store (history_store.py).
+
+SESSION_STATE_BACKEND = os.getenv("SESSION_STATE_BACKEND", "local")
+SESSION_STATE_DB = os.getenv(
+    "SESSION_STATE_DB", os.path.join(os.getenv("CHAT_STORE_DIR", "chat_store"), "session_state.db")
+)
+SESSION_LEASE_TTL = float(os.getenv("SESSION_LEASE_TTL", "60"))
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}:{os.getpid()}")
+
+
+class Lease:
+    __slots__ = ("session_id", "owner", "version", "summary")
+
+    def __init__(self, session_id: str, owner: str, version: int, summary: str):
+        self.session_id = session_id
+        self.owner = owner
+        self.version = version
+        self.summary = summary
+
+
+class SessionStateStore:
+    """Interface every session state backend implements."""
+
+    def acquire(self, session_id: str, owner: str, ttl: float = SESSION_LEASE_TTL, force: bool = False) -> Optional[Lease]:
+        """Take the session if it is free, already ours, expired or `force`d; None if someone else holds it."""
+        raise NotImplementedError
+
+    def save(self, lease: Lease, summary: str) -> bool:
+        """Store the summary; False if the lease was lost meanwhile."""
+        raise NotImplementedError
+
+    def current(self, lease: Lease) -> bool:
+        """Whether `lease` is still the session's lease, i.e. nobody took the session over."""
+        raise NotImplementedError
+
+    def release(self, lease: Lease):
+        raise NotImplementedError
+
+    def renew(self, owner: str, ttl: float = SESSION_LEASE_TTL) -> int:
+        """Extend every lease `owner` holds. Returns how many."""
+        raise NotImplementedError
+
+    def request_handoff(self, session_id: str):
+        raise NotImplementedError
+
+    def handoffs(self, owner: str) -> List[str]:
+        """Sessions held by `owner` that another worker asked for."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# --- In-process backend -----------------------------------------------------
+# For a single worker and for tests: the same semantics, nothing shared.
+
+class LocalSessionStateStore(SessionStateStore):
+    def __init__(self):
+        self._rows: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, session_id, owner, ttl=SESSION_LEASE_TTL, force=False):
+        now = time.time()
+        with self._lock:
+            row = self._rows.setdefault(
+                session_id, {"owner": None, "expires": 0.0, "version": 0, "summary": "", "handoff": False}
+            )
+            if row["owner"] not in (None, owner) and row["expires"] > now and not force:
+                return None
+            if row["owner"] != owner:
+                row["version"] += 1
+                row["handoff"] = False
+            row["owner"] = owner
+            row["expires"] = now + ttl
+            return Lease(session_id, owner, row["version"], row["summary"])
+
+    def save(self, lease, summary):
+        with self._lock:
+            row = self._rows.get(lease.session_id)
+            if row is None or row["owner"] != lease.owner or row["version"] != lease.version:
+                return False
+            row["summary"] = summary
+            return True
+
+    def current(self, lease):
+        with self._lock:
+            row = self._rows.get(lease.session_id)
+            return row is not None and row["owner"] == lease.owner and row["version"] == lease.version
+
+    def release(self, lease):
+        with self._lock:
+            row = self._rows.get(lease.session_id)
+            if row and row["owner"] == lease.owner and row["version"] == lease.version:
+                row["owner"] = None
+                row["handoff"] = False
+
+    def renew(self, owner, ttl=SESSION_LEASE_TTL):
+        expires = time.time() + ttl
+        renewed = 0
+        with self._lock:
+            for row in self._rows.values():
+                if row["owner"] == owner:
+                    row["expires"] = expires
+                    renewed += 1
+        return renewed
+
+    def request_handoff(self, session_id):
+        with self._lock:
+            row = self._rows.get(session_id)
+            if row and row["owner"]:
+                row["handoff"] = True
+
+    def handoffs(self, owner):
+        with self._lock:
+            return [sid for sid, row in self._rows.items() if row["owner"] == owner and row["handoff"]]
+
+
+# --- SQLite backend ---------------------------------------------------------
+# One small table in WAL mode, shared by the uvicorn workers of a node. Every
+# operation is a single autocommitted statement, so workers never hold the
+# write lock for long. Across nodes, implement SessionStateStore on a
+# networked store with the same compare-and-set semantics.
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    session_id TEXT PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    summary TEXT NOT NULL DEFAULT '',
+    handoff INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID
+"""
+
+
+class SqliteSessionStateStore(SessionStateStore):
+    def __init__(self, path: str = SESSION_STATE_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = connect_wal(path)
+        self._conn.execute(STATE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def acquire(self, session_id, owner, ttl=SESSION_LEASE_TTL, force=False):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO session_state (session_id) VALUES (?)", (session_id,))
+            # compare-and-set: only one worker can win a contested session
+            row = self._conn.execute(
+                "UPDATE session_state SET "
+                "  version = version + (owner IS NOT ?), "
+                "  handoff = CASE WHEN owner IS ? THEN handoff ELSE 0 END, "
+                "  owner = ?, expires = ? "
+                "WHERE session_id = ? AND (owner IS NULL OR owner = ? OR expires <= ? OR ?) "
+                "RETURNING version, summary",
+                (owner, owner, owner, now + ttl, session_id, owner, now, force),
+            ).fetchone()
+        if row is None:
+            return None
+        return Lease(session_id, owner, row[0], row[1])
+
+    def save(self, lease, summary):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE session_state SET summary = ? WHERE session_id = ? AND owner = ? AND version = ?",
+                (summary, lease.session_id, lease.owner, lease.version),
+            )
+        return cursor.rowcount == 1
+
+    def current(self, lease):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM session_state WHERE session_id = ? AND owner = ? AND version = ?",
+                (lease.session_id, lease.owner, lease.version),
+            ).fetchone()
+        return row is not None
+
+    def release(self, lease):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE session_state SET owner = NULL, handoff = 0 "
+                "WHERE session_id = ? AND owner = ? AND version = ?",
+                (lease.session_id, lease.owner, lease.version),
+            )
+
+    def renew(self, owner, ttl=SESSION_LEASE_TTL):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE session_state SET expires = ? WHERE owner = ?", (time.time() + ttl, owner)
+            )
+        return cursor.rowcount
+
+    def request_handoff(self, session_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE session_state SET handoff = 1 WHERE session_id = ? AND owner IS NOT NULL", (session_id,)
+            )
+
+    def handoffs(self, owner):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM session_state WHERE owner = ? AND handoff = 1", (owner,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_state_store(backend: str = SESSION_STATE_BACKEND) -> SessionStateStore:
+    if backend == "local":
+        return LocalSessionStateStore()
+    if backend == "sqlite":
+        return SqliteSessionStateStore()
+    raise ValueError(f"Unknown SESSION_STATE_BACKEND: {backend}")
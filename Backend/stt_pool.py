@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import List, Optional
+from dotenv import load_dotenv
+
+# Deepgram Imports
+from deepgram import AsyncDeepgramClient
+from deepgram.environment import DeepgramClientEnvironment
+from deepgram.extensions.types.sockets import ListenV1ControlMessage
+
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
+# Override the listen websocket host, e.g. to point at benchmarks/fake_deepgram.py
+DEEPGRAM_WS_URL = os.getenv("DEEPGRAM_WS_URL")
+
+DEEPGRAM_OPTIONS = {"model": "nova-3", "smart_format": True}
+
+# Number of idle upstream connections kept open ahead of demand (0 disables the pool)
+POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "2"))
+# Idle connections are recycled after this many seconds
+POOL_MAX_IDLE = float(os.getenv("STT_POOL_MAX_IDLE", "300"))
+KEEPALIVE_INTERVAL = 2.0
+REFILL_BACKOFF = 5.0
+
+pool_hits = metrics.counter("stt_pool_hits_total", "Sessions served from a pre-warmed Deepgram connection")
+pool_misses = metrics.counter("stt_pool_misses_total", "Sessions that had to open a Deepgram connection on demand")
+pool_discarded = metrics.counter("stt_pool_discarded_total", "Idle Deepgram connections dropped as dead or expired")
+pool_idle = metrics.gauge("stt_pool_idle_connections", "Pre-warmed Deepgram connections waiting for a session")
+connect_seconds = metrics.histogram("stt_connect_seconds", "Time to open a Deepgram listen connection")
+
+_client: Optional[AsyncDeepgramClient] = None
+
+
+def get_deepgram_client() -> AsyncDeepgramClient:
+    # One client per process: building it loads the CA bundle and sets up transports
+    global _client
+    if _client is None:
+        if DEEPGRAM_WS_URL:
+            environment = DeepgramClientEnvironment(
+                base=DeepgramClientEnvironment.PRODUCTION.base,
+                production=DEEPGRAM_WS_URL,
+                agent=DeepgramClientEnvironment.PRODUCTION.agent,
+            )
+            _client = AsyncDeepgramClient(api_key=DEEPGRAM_API_KEY, environment=environment)
+        else:
+            _client = AsyncDeepgramClient(api_key=DEEPGRAM_API_KEY)
+    return _client
+
+
+class UpstreamConnection:
+    """An open Deepgram listen connection together with the stack that closes it."""
+
+    def __init__(self, connection, stack: AsyncExitStack):
+        self.connection = connection
+        self._stack = stack
+        self.opened_at = time.monotonic()
+        # the SDK exposes no connection state: a send or read that failed, the
+        # server ending the stream, or close() marks the connection dead
+        self.closed = False
+
+    @property
+    def is_open(self) -> bool:
+        return not self.closed
+
+    async def messages(self):
+        # Decode frames ourselves: the SDK validates every result into nested
+        # pydantic models, which costs about a millisecond per interim transcript.
+        # This reads the SDK's websocket directly (pinned deepgram-sdk version)
+        try:
+            async for raw in self.connection._websocket:
+                if isinstance(raw, str):
+                    yield json.loads(raw)
+        finally:
+            self.closed = True
+
+    async def keepalive(self):
+        try:
+            await self.connection.send_control(ListenV1ControlMessage(type="KeepAlive"))
+        except Exception:
+            self.closed = True
+            raise
+
+    async def close(self):
+        self.closed = True
+        try:
+            await self._stack.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing Deepgram connection: {e}")
+
+
+async def open_connection() -> UpstreamConnection:
+    start = time.perf_counter()
+    stack = AsyncExitStack()
+    try:
+        connection = await stack.enter_async_context(
+            get_deepgram_client().listen.v1.connect(**DEEPGRAM_OPTIONS)
+        )
+    except BaseException:
+        await stack.aclose()
+        raise
+    connect_seconds.observe(time.perf_counter() - start)
+    return UpstreamConnection(connection, stack)
+
+
+class SttConnectionPool:
+    """
+    Keeps a few Deepgram listen connections open and alive so a new browser
+    session does not pay client construction and the TLS/websocket handshake.
+    Connections are single use: a session closes its connection when done and
+    the background task opens a replacement.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_idle: float = POOL_MAX_IDLE):
+        self.size = size
+        self.max_idle = max_idle
+        self._idle: List[UpstreamConnection] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        pool_idle.set_function(lambda: len(self._idle))
+
+    async def start(self):
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+            logger.info(f"Deepgram connection pool started (size={self.size})")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(conn.close() for conn in idle))
+
+    async def acquire(self) -> UpstreamConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            self._wakeup.set()
+            if conn.is_open:
+                pool_hits.inc()
+                return conn
+            pool_discarded.inc()
+            await conn.close()
+
+        pool_misses.inc()
+        self._wakeup.set()
+        return await open_connection()
+
+    async def _maintain(self):
+        while True:
+            # cleared before the work, so a wakeup from acquire() meanwhile is not lost
+            self._wakeup.clear()
+            try:
+                failed = await self._refill()
+                await self._keepalive()
+                if failed:
+                    await asyncio.sleep(REFILL_BACKOFF)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Deepgram pool error: {e}")
+                await asyncio.sleep(REFILL_BACKOFF)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self) -> int:
+        missing = self.size - len(self._idle)
+        if missing <= 0:
+            return 0
+        failed = 0
+        opened = await asyncio.gather(*(open_connection() for _ in range(missing)), return_exceptions=True)
+        for conn in opened:
+            if isinstance(conn, BaseException):
+                logger.error(f"Deepgram pool connect failed: {conn}")
+                failed += 1
+                continue
+            if self._task is None:
+                await conn.close()
+            else:
+                self._idle.append(conn)
+        return failed
+
+    async def _keepalive(self):
+        now = time.monotonic()
+        for conn in list(self._idle):
+            expired = now - conn.opened_at > self.max_idle
+            if not expired and conn.is_open:
+                try:
+                    await conn.keepalive()
+                    continue
+                except Exception:
+                    pass
+            if conn in self._idle:
+                self._idle.remove(conn)
+                pool_discarded.inc()
+                await conn.close()
+
+
+stt_pool = SttConnectionPool()
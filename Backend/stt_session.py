@@ -0,0 +1,215 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+from dotenv import load_dotenv
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+# Deepgram Imports
+from deepgram.extensions.types.sockets import ListenV1MediaMessage
+from deepgram.extensions.types.sockets import ListenV1ControlMessage
+
+from stt_pool import SttConnectionPool, UpstreamConnection, stt_pool
+from transcript_delivery import TranscriptDelivery
+from voice_turns import VoiceTurnLoop
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+# Audio buffering between the browser and Deepgram.
+# "block" applies backpressure to the browser socket (safe for webm/opus containers),
+# "drop_oldest" discards stale chunks instead (only safe for raw PCM streams).
+AUDIO_QUEUE_SIZE = int(os.getenv("STT_AUDIO_QUEUE_SIZE", "32"))
+AUDIO_QUEUE_POLICY = os.getenv("STT_AUDIO_QUEUE_POLICY", "block")
+BACKPRESSURE_TIMEOUT = float(os.getenv("STT_BACKPRESSURE_TIMEOUT", "5.0"))
+
+FIRST_AUDIO_TIMEOUT = 60.0
+KEEPALIVE_INTERVAL = 2.0
+DRAIN_TIMEOUT = 2.0
+
+
+final_latency = metrics.histogram(
+    "stt_final_latency_seconds", "Time from the end of an utterance's audio to its final transcript"
+)
+
+
+class UpstreamStalled(Exception):
+    pass
+
+
+class SttSession:
+    """
+    Bridges one browser websocket to one Deepgram listen connection.
+
+    The endpoint task reads audio from the browser into a bounded queue, an
+    upstream task drains the queue into Deepgram and a listener task forwards
+    transcripts back to the browser. No threads are involved.
+
+    With ?mode=turn&session_id=... final utterances are also answered by the
+    LLM on the same socket (see VoiceTurnLoop).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        pool: SttConnectionPool = stt_pool,
+        queue_size: int = AUDIO_QUEUE_SIZE,
+        policy: str = AUDIO_QUEUE_POLICY,
+    ):
+        self.websocket = websocket
+        self.pool = pool
+        self.delivery = TranscriptDelivery.from_query(websocket.send_text, websocket.query_params)
+        self.turns: Optional[VoiceTurnLoop] = None
+        if websocket.query_params.get("mode") == "turn":
+            self.turns = VoiceTurnLoop(websocket.query_params["session_id"], self.delivery.send_event)
+        self.policy = policy
+        self.audio_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped_chunks = 0
+        # when the first audio chunk went upstream; Deepgram result times are relative to it
+        self.audio_started: Optional[float] = None
+
+    async def run(self):
+        upstream = asyncio.create_task(self._run_upstream())
+
+        try:
+            while not upstream.done():
+                data = await self.websocket.receive_bytes()
+                await self._enqueue(data, upstream)
+
+        except WebSocketDisconnect:
+            logger.info("Client disconnected")
+        except UpstreamStalled:
+            logger.warning("Deepgram is not keeping up with audio. Closing session.")
+        except Exception as e:
+            logger.error(f"WebSocket Error: {e}")
+        finally:
+            await self._close(upstream)
+
+        if self.dropped_chunks:
+            logger.info(f"Dropped {self.dropped_chunks} audio chunks")
+
+    async def _enqueue(self, data: bytes, upstream: asyncio.Task):
+        if self.policy == "drop_oldest":
+            if self.audio_queue.full():
+                self.audio_queue.get_nowait()
+                self.dropped_chunks += 1
+            self.audio_queue.put_nowait(data)
+            return
+
+        if self.audio_queue.full():
+            # Wait for the upstream task to catch up, but never forever
+            put = asyncio.ensure_future(self.audio_queue.put(data))
+            done, _ = await asyncio.wait(
+                {put, upstream},
+                timeout=BACKPRESSURE_TIMEOUT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if put not in done:
+                put.cancel()
+                if not done:
+                    raise UpstreamStalled()
+            return
+
+        self.audio_queue.put_nowait(data)
+
+    async def _close(self, upstream: asyncio.Task):
+        if not upstream.done():
+            # Signal end of audio, making room for the sentinel if needed
+            if self.audio_queue.full():
+                self.audio_queue.get_nowait()
+                self.dropped_chunks += 1
+            self.audio_queue.put_nowait(None)
+
+            try:
+                await asyncio.wait_for(upstream, timeout=DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                logger.error(f"Upstream Error: {e}")
+
+        if not upstream.done():
+            upstream.cancel()
+
+    async def _run_upstream(self):
+        # Take a pre-warmed connection right away so the first audio chunk
+        # goes straight to Deepgram instead of waiting for a handshake
+        try:
+            upstream = await self.pool.acquire()
+        except Exception as e:
+            logger.error(f"Deepgram Error: {e}")
+            return
+
+        logger.info("Deepgram OPEN")
+        listener = asyncio.create_task(self._forward_transcripts(upstream))
+        try:
+            await self._forward_audio(upstream.connection)
+
+            # Give Deepgram a moment to flush the last results
+            await asyncio.wait_for(asyncio.shield(listener), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            logger.error(f"Deepgram Error: {e}")
+        finally:
+            listener.cancel()
+            await upstream.close()
+            if self.turns:
+                await self.turns.close()
+            await self.delivery.close()
+            logger.info("Deepgram CLOSED")
+
+    async def _forward_audio(self, connection):
+        logger.info("Waiting for audio from browser...")
+        started = time.monotonic()
+        received_audio = False
+
+        while True:
+            try:
+                data = await asyncio.wait_for(self.audio_queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                if not received_audio and time.monotonic() - started > FIRST_AUDIO_TIMEOUT:
+                    logger.info("No audio received. Stopping.")
+                    data = None
+                else:
+                    # prevent timeout if silence is detected
+                    logger.debug("Sending KeepAlive...")
+                    await connection.send_control(ListenV1ControlMessage(type="KeepAlive"))
+                    continue
+
+            if data is None:
+                await connection.send_control(ListenV1ControlMessage(type="CloseStream"))
+                return
+
+            if not received_audio:
+                self.audio_started = time.monotonic()
+            received_audio = True
+            await connection.send_media(ListenV1MediaMessage(data))
+
+    async def _forward_transcripts(self, upstream: UpstreamConnection):
+        try:
+            async for message in upstream.messages():
+                if message.get("type") != "Results":
+                    continue
+                alternatives = message.get("channel", {}).get("alternatives")
+                if not alternatives:
+                    continue
+                transcript = alternatives[0].get("transcript")
+                is_final = bool(message.get("is_final"))
+                if is_final and transcript and self.audio_started is not None:
+                    # audio is streamed in real time, so its end is this far into the stream
+                    audio_end = message.get("start", 0) + message.get("duration", 0)
+                    final_latency.observe(max(0.0, time.monotonic() - self.audio_started - audio_end))
+                if transcript:
+                    await self.delivery.push(transcript, is_final)
+                if self.turns:
+                    await self.turns.on_transcript(transcript, is_final, bool(message.get("speech_final")))
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            # browser went away before we could deliver everything
+            pass
+        except Exception as e:
+            logger.error(f"Listener Error: {e!r}")
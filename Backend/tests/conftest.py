@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+# keep the chat store and session state out of the working tree
+os.environ.setdefault("CHAT_STORE_DIR", tempfile.mkdtemp(prefix="chat_store_test_"))
+
+
+@pytest.fixture
+def backend():
+    # the app with the LLM replaced by benchmarks/fake_llm.py and the warmup skipped
+    import main
+    import llm_logic
+    from benchmarks.fake_llm import FakeStreamingLLM
+
+    llm_logic.llm = FakeStreamingLLM(tokens=40, ttft=0.01, token_delay=0.01)
+    main.warmup._done.set()
+    return main, llm_logic
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from admission import SPECULATIVE, TEXT, VOICE, AdmissionController, Busy, PriorityClass
+
+
+def controller(max_concurrent: int, reserved: int = 0, deadline: float = 1.0) -> AdmissionController:
+    return AdmissionController(max_concurrent, classes=[
+        PriorityClass(VOICE, 0, max_queue=8, deadline=deadline),
+        PriorityClass(SPECULATIVE, 1, max_queue=0, deadline=0.0, reserved=reserved),
+        PriorityClass(TEXT, 2, max_queue=8, deadline=deadline, reserved=reserved),
+    ], enabled=True)
+
+
+def test_freed_slot_goes_to_the_most_important_waiter():
+    async def scenario():
+        admission = controller(1)
+        order = []
+
+        async def reply(class_name):
+            async with admission.slot(class_name):
+                order.append(class_name)
+                await asyncio.sleep(0.01)
+
+        await admission.acquire(TEXT)
+        waiting = [asyncio.create_task(reply(TEXT)), asyncio.create_task(reply(VOICE))]
+        await asyncio.sleep(0.01)
+        admission.release(TEXT)
+        await asyncio.gather(*waiting)
+        return order, admission.active
+
+    assert asyncio.run(scenario()) == ([VOICE, TEXT], 0)
+
+
+def test_reserved_slots_are_kept_for_voice():
+    async def scenario():
+        admission = controller(3, reserved=1, deadline=0.05)
+        await admission.acquire(TEXT)
+        await admission.acquire(TEXT)
+        with pytest.raises(Busy) as busy:
+            await admission.acquire(TEXT)
+        assert busy.value.reason == "deadline"
+        # the reserved slot is still there for a call
+        await admission.acquire(VOICE)
+        assert admission.active == 3
+
+    asyncio.run(scenario())
+
+
+def test_speculative_replies_never_queue():
+    async def scenario():
+        admission = controller(1)
+        await admission.acquire(VOICE)
+        with pytest.raises(Busy) as busy:
+            await admission.acquire(SPECULATIVE)
+        assert busy.value.reason == "queue_full"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def scenario():
+        admission = controller(1)
+        await admission.acquire(VOICE)
+        waiter = asyncio.create_task(admission.acquire(TEXT))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release(VOICE)
+        assert admission.active == 0
+        assert not admission.classes[TEXT].waiting
+
+    asyncio.run(scenario())
+
+
+def test_disabled_controller_admits_everything():
+    async def scenario():
+        admission = AdmissionController(0, enabled=False)
+        async with admission.slot(TEXT):
+            async with admission.slot(SPECULATIVE):
+                pass
+
+    asyncio.run(scenario())
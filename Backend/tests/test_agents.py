@@ -0,0 +1,93 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+from agents import DEFAULT_AGENT_ID, AgentRegistry
+
+
+def write_agents(path, data: dict, mtime: float):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    # file systems with coarse timestamps would otherwise hide quick edits
+    os.utime(path, (mtime, mtime))
+
+
+def registry(path):
+    compiled = []
+
+    def compile(config):
+        compiled.append(config.agent_id)
+        return config
+
+    return AgentRegistry(compile, str(path)), compiled
+
+
+def test_reload_compiles_only_changed_agents(tmp_path):
+    path = tmp_path / "agents.json"
+    write_agents(path, {"sales": {"system_prompt": "Sell."}, "support": {"system_prompt": "Help."}}, 1000)
+    agents, compiled = registry(path)
+
+    assert agents.get("sales").system_prompt == "Sell."
+    assert sorted(compiled) == ["default", "sales", "support"]
+    support = agents.get("support")
+    # unchanged file: nothing to do
+    assert not agents.reload()
+
+    write_agents(path, {"sales": {"system_prompt": "Sell more."}, "support": {"system_prompt": "Help."}}, 2000)
+    compiled.clear()
+    assert agents.reload()
+    assert compiled == ["sales"]
+    assert agents.get("sales").system_prompt == "Sell more."
+    assert agents.get("support") is support
+
+
+def test_broken_file_keeps_the_previous_agents(tmp_path):
+    path = tmp_path / "agents.json"
+    write_agents(path, {"sales": {"system_prompt": "Sell."}}, 1000)
+    agents, _ = registry(path)
+    agents.reload()
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    os.utime(path, (2000, 2000))
+    assert not agents.reload()
+    assert agents.get("sales").system_prompt == "Sell."
+
+    write_agents(path, {"sales": {"prompt": "typo"}}, 3000)
+    assert not agents.reload()
+    assert agents.get("sales").system_prompt == "Sell."
+
+
+def test_unknown_ids_and_a_missing_file_get_the_default(tmp_path):
+    agents, _ = registry(tmp_path / "missing.json")
+    assert agents.get("nobody").agent_id == DEFAULT_AGENT_ID
+    assert set(agents.configs) == {DEFAULT_AGENT_ID}
+
+    path = tmp_path / "agents.json"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[]")
+    with pytest.raises(Exception):
+        # nothing loaded before: there is nothing to fall back on
+        AgentRegistry(lambda config: config, str(path)).reload()
+
+
+def test_watch_picks_up_edits(tmp_path):
+    path = tmp_path / "agents.json"
+    write_agents(path, {"sales": {"system_prompt": "Sell."}}, 1000)
+    agents, _ = registry(path)
+    agents.reload()
+
+    async def scenario():
+        watcher = asyncio.create_task(agents.watch(interval=0.01))
+        write_agents(path, {"sales": {"system_prompt": "Sell more."}}, 2000)
+        for _ in range(100):
+            if agents.get("sales").system_prompt == "Sell more.":
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert agents.get("sales").system_prompt == "Sell more."
@@ -0,0 +1,86 @@
+import asyncio
+import urllib.parse
+
+
+def http_scope(path: str, **query) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urllib.parse.urlencode(query).encode(),
+        "headers": [],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+
+async def stream_then_disconnect(app, scope: dict, after_chunks: int) -> list:
+    # the client reads a few chunks of the reply and then drops the connection
+    chunks = []
+    requested = False
+    gone = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"].decode())
+            if len(chunks) == after_chunks:
+                gone.set()
+
+    await app(scope, receive, send)
+    return chunks
+
+
+def test_disconnect_mid_stream_records_the_partial_reply(backend):
+    main, llm_logic = backend
+    session_id = "disconnect_mid_stream"
+    cancelled_before = llm_logic.cancelled_turns.value
+
+    chunks = asyncio.run(
+        stream_then_disconnect(main.app, http_scope("/chat/stream/text", session_id=session_id, user_input="hello"), 3)
+    )
+
+    assert 3 <= len(chunks) < 40
+    history = llm_logic.sessions.peek(session_id).memory.get_all()
+    assert [m.role.value for m in history] == ["user", "assistant"]
+    assert history[1].content == "".join(chunks).strip()
+    assert llm_logic.cancelled_turns.value == cancelled_before + 1
+    usage = llm_logic.usage_ledger.session(session_id)
+    assert usage is not None and usage["turns"] == 1 and usage["completion_tokens"] > 0
+
+
+def test_cancel_without_turn_id_stops_every_reply_of_the_session(backend):
+    _, llm_logic = backend
+    session_id = "two_unnamed_turns"
+
+    async def consume(message: str, started: asyncio.Event) -> list:
+        deltas = []
+        async for delta in llm_logic.astream_chat_response(session_id, message):
+            deltas.append(delta)
+            started.set()
+        return deltas
+
+    async def run():
+        first_started, second_started = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(consume("a", first_started))
+        await first_started.wait()
+        second = asyncio.create_task(consume("b", second_started))
+        await second_started.wait()
+        assert llm_logic.cancel_turn(session_id)
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(run())
+    assert len(first) < 40 and len(second) < 40
+    assert not any(sid == session_id for sid, _ in llm_logic.active_turns)
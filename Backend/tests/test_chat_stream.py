@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_llm import FakeStreamingLLM
+
+
+class FailingLLM(FakeStreamingLLM):
+    async def astream_chat(self, messages, **kwargs):
+        async def gen():
+            raise RuntimeError("provider down")
+            yield
+        return gen()
+
+
+def test_failed_reply_leaves_no_unanswered_user_message(backend, monkeypatch):
+    _, llm_logic = backend
+    session_id = "failed_reply"
+    monkeypatch.setattr(llm_logic, "llm", FailingLLM())
+
+    async def consume():
+        async for _ in llm_logic.astream_chat_response(session_id, "hello"):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(consume())
+    assert llm_logic.sessions.peek(session_id).memory.get_all() == []
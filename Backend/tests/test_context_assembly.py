@@ -0,0 +1,58 @@
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from context_assembly import (
+    PROMPT_CACHE_INCREMENT,
+    PROMPT_CACHE_MIN_TOKENS,
+    PrefixTracker,
+    cacheable_tokens,
+    window_start,
+)
+from session_memory import RollingSummaryMemory
+
+
+def test_window_start_holds_until_full_then_moves_a_block():
+    counts = [10] * 10
+    assert window_start(counts, 0, budget=100, block=30) == 0
+    # one message over: drop a whole block, not just the one message
+    assert window_start(counts + [10], 0, budget=100, block=30) == 3
+    assert window_start(counts + [10], 3, budget=100, block=30) == 3
+    # the last message stays even when it alone is over the budget
+    assert window_start([10, 500], 0, budget=100, block=30) == 1
+
+
+def test_cacheable_tokens_follow_the_provider_rules():
+    assert cacheable_tokens(PROMPT_CACHE_MIN_TOKENS - 1) == 0
+    assert cacheable_tokens(PROMPT_CACHE_MIN_TOKENS) == PROMPT_CACHE_MIN_TOKENS
+    assert cacheable_tokens(PROMPT_CACHE_MIN_TOKENS + PROMPT_CACHE_INCREMENT - 1) == PROMPT_CACHE_MIN_TOKENS
+
+
+def test_prefix_tracker_counts_the_shared_start_of_consecutive_prompts():
+    system = ChatMessage(role=MessageRole.SYSTEM, content="You are a travel agent. " * 300)
+    first = [system, ChatMessage(role=MessageRole.USER, content="Book a flight.")]
+    second = first + [
+        ChatMessage(role=MessageRole.ASSISTANT, content="Where to?"),
+        ChatMessage(role=MessageRole.USER, content="Paris."),
+    ]
+    tracker = PrefixTracker()
+
+    assert tracker.observe(first)[0] == 0
+    cached, total = tracker.observe(second)
+    assert PROMPT_CACHE_MIN_TOKENS <= cached < total
+    assert cached % PROMPT_CACHE_INCREMENT == 0
+    # a different system prompt shares nothing
+    other = [ChatMessage(role=MessageRole.SYSTEM, content="You are a chef.")] + second[1:]
+    assert tracker.observe(other)[0] == 0
+
+
+def test_consecutive_prompts_keep_their_start_between_block_cuts():
+    memory = RollingSummaryMemory.from_defaults(token_limit=200, tokenizer_fn=str.split)
+    starts = []
+    for i in range(60):
+        memory.put(ChatMessage(role=MessageRole.USER, content=f"question {i} " + "word " * 8))
+        memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=f"answer {i} " + "word " * 8))
+        starts.append(memory.get()[0].content)
+
+    # cutting a message or two a turn would move the start on every turn once the
+    # window is full (about 50 times); cutting 50-token blocks moves it at most 24
+    moves = sum(1 for a, b in zip(starts, starts[1:]) if a != b)
+    assert 0 < moves <= 60 * 2 * 10 // 50
@@ -0,0 +1,69 @@
+import json
+import os
+
+from history_store import CHARS_PER_TOKEN, COMPACT_MIN_DEAD, FileChatStore
+
+
+def message(i: int) -> dict:
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i:04d}"}
+
+
+def test_tail_read_stops_at_the_token_budget(tmp_path):
+    store = FileChatStore(str(tmp_path))
+    # well past one tail block, so the read has to stitch lines across blocks
+    records = [message(i) for i in range(1000)]
+    store.append("s", records)
+
+    assert store.load("s") == records
+    # 12 characters a message: a budget of 10 messages' worth reads 10 back
+    assert store.load("s", token_limit=12 * 10 // CHARS_PER_TOKEN) == records[-10:]
+    assert store.load("missing") == []
+
+
+def test_tail_read_skips_torn_lines_and_stops_at_reset(tmp_path):
+    store = FileChatStore(str(tmp_path))
+    store.append("s", [message(0), message(1)])
+    store.replace("s", [message(2)])
+    with open(store.session_file("s"), "a", encoding="utf-8") as f:
+        f.write('{"role": "user", "cont\n')
+    store.append("s", [message(3)])
+
+    assert store.load("s") == [message(2), message(3)]
+
+
+def test_replace_compacts_once_dead_records_pile_up(tmp_path):
+    store = FileChatStore(str(tmp_path))
+    path = store.session_file("s")
+    replaces = COMPACT_MIN_DEAD // 2
+    for i in range(replaces):
+        store.replace("s", [message(i), message(i + 1)])
+
+    # each replace appends a reset marker and two records; compaction dropped the dead ones
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    last = replaces - 1
+    assert len(lines) < 3 * replaces
+    assert [json.loads(line) for line in lines[-2:]] == [message(last), message(last + 1)]
+    assert store.load("s") == [message(last), message(last + 1)]
+
+    store.compact("s")
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [message(last), message(last + 1)]
+
+
+def test_legacy_json_session_is_migrated_on_first_load():
+    import chat_history_handler
+
+    session_id = "legacy_migration"
+    legacy = chat_history_handler.legacy_session_file(session_id)
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump({"messages": [message(0), message(1)]}, f)
+
+    history = chat_history_handler.load_chat_history(session_id)
+
+    assert [(m.role.value, m.content) for m in history] == [("user", "message 0000"), ("assistant", "message 0001")]
+    assert not os.path.exists(legacy)
+    assert os.path.exists(legacy + ".migrated")
+    # a second load reads the store, there is nothing left to migrate
+    assert not chat_history_handler.migrate_session(session_id)
+    assert len(chat_history_handler.load_chat_history(session_id)) == 2
@@ -0,0 +1,63 @@
+import persistence
+from persistence import WriteBehindPersister
+
+
+def record(i: int) -> dict:
+    return {"role": "user", "content": f"message {i}"}
+
+
+def test_turns_for_one_session_are_written_together():
+    writes = []
+    persister = WriteBehindPersister(lambda session_id, records: writes.append((session_id, records)), flush_interval=60)
+    try:
+        persister.enqueue("a", [record(0)])
+        persister.enqueue("b", [record(1)])
+        persister.enqueue("a", [record(2)])
+        assert writes == []
+
+        persister.flush_session("b")
+        assert writes == [("b", [record(1)])]
+        persister.flush()
+        assert writes[1:] == [("a", [record(0), record(2)])]
+    finally:
+        persister.close()
+
+
+def test_failed_write_is_retried_ahead_of_newer_records():
+    writes = []
+    failures = [RuntimeError("disk full")]
+
+    def write(session_id, records):
+        if failures:
+            raise failures.pop()
+        writes.append((session_id, records))
+
+    persister = WriteBehindPersister(write, flush_interval=60)
+    try:
+        persister.enqueue("a", [record(0)])
+        persister.flush()
+        assert writes == [] and persister.has_pending("a")
+
+        persister.enqueue("a", [record(1)])
+        persister.flush()
+        assert writes == [("a", [record(0), record(1)])]
+        assert not persister.has_pending("a")
+    finally:
+        persister.close()
+
+
+def test_records_still_failing_at_shutdown_are_dropped():
+    attempts = []
+
+    def write(session_id, records):
+        attempts.append(session_id)
+        raise RuntimeError("disk full")
+
+    persister = WriteBehindPersister(write, flush_interval=60)
+    dropped_before = persistence.dropped.value
+    persister.enqueue("a", [record(0), record(1)])
+    persister.close()
+
+    # the first write and then a bounded number of retries
+    assert len(attempts) == 1 + persistence.PERSIST_CLOSE_RETRIES
+    assert persistence.dropped.value == dropped_before + 2
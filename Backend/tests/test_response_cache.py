@@ -0,0 +1,80 @@
+import time
+import asyncio
+
+from benchmarks.fake_llm import FakeStreamingLLM
+from response_cache import ResponseCache
+
+
+class UnreachableLLM(FakeStreamingLLM):
+    async def astream_chat(self, messages, **kwargs):
+        raise AssertionError("the LLM was asked despite a cached reply")
+
+
+def test_lookup_matches_normalized_input_per_agent():
+    cache = ResponseCache(min_words=3)
+    cache.put("default", "What are your opening hours?", "Nine to five.", 1.0)
+    cache.put("default", "hi", "Hello!", 1.0)
+
+    assert cache.get("default", "what are your OPENING hours").reply == "Nine to five."
+    assert cache.get("support", "What are your opening hours?") is None
+    # too short to cache, it depends on the conversation
+    assert cache.get("default", "hi") is None
+
+
+def test_similar_question_reuses_the_reply():
+    cache = ResponseCache(similarity=0.7)
+    cache.put("default", "what are your opening hours on sunday", "Closed on Sundays.", 1.0)
+    cache.put("default", "how do I reset my password", "Use the reset link.", 1.0)
+
+    assert cache.get("default", "what are the opening hours on sunday").reply == "Closed on Sundays."
+    assert cache.get("default", "how much does delivery cost") is None
+
+
+def test_entries_expire_and_least_recently_used_go_first():
+    cache = ResponseCache(max_size=2, ttl=0.05)
+    cache.put("default", "first question asked here", "one", 1.0)
+    cache.put("default", "second question asked here", "two", 1.0)
+    cache.get("default", "first question asked here")
+    cache.put("default", "third question asked here", "three", 1.0)
+
+    assert cache.get("default", "second question asked here") is None
+    assert cache.get("default", "first question asked here").reply == "one"
+    time.sleep(0.1)
+    assert cache.get("default", "first question asked here") is None
+    assert len(cache) == 1
+
+
+def test_replay_streams_the_reply_back_word_by_word():
+    cache = ResponseCache(replay_delay=0)
+    reply = "Nine to five,  Monday to Friday.\n"
+    cache.put("default", "what are your opening hours", reply, 1.0)
+    entry = cache.get("default", "what are your opening hours")
+
+    async def areplay():
+        return [chunk async for chunk in cache.areplay(entry)]
+
+    chunks = asyncio.run(areplay())
+    assert len(chunks) == 6
+    assert "".join(chunks) == reply
+    assert list(cache.replay(entry)) == chunks
+
+
+def test_repeated_question_is_answered_without_the_llm(backend, monkeypatch):
+    _, llm_logic = backend
+    monkeypatch.setattr(llm_logic, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_logic.response_cache, "replay_delay", 0)
+    question = "what are your opening hours"
+
+    async def ask(session_id):
+        return "".join([delta async for delta in llm_logic.astream_chat_response(session_id, question)])
+
+    try:
+        first = asyncio.run(ask("cache_first"))
+        monkeypatch.setattr(llm_logic, "llm", UnreachableLLM())
+        second = asyncio.run(ask("cache_second"))
+    finally:
+        llm_logic.response_cache.clear()
+
+    assert second.strip() == first.strip()
+    history = llm_logic.sessions.peek("cache_second").memory.get_all()
+    assert [m.content for m in history] == [question, first.strip()]
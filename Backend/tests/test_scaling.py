@@ -0,0 +1,17 @@
+from benchmarks import scaling_bench
+
+
+def test_throughput_scales_with_worker_count():
+    # I/O bound: each worker's fake provider serves one generation at a time and the
+    # wait for it dwarfs the CPU a turn costs, so more workers means more replies at
+    # once whatever the cores
+    args = scaling_bench.parse_args([
+        "--sessions", "48", "--turns", "1", "--tokens", "2", "--ttft-ms", "300",
+        "--token-delay-ms", "10", "--cpu-ms", "0", "--llm-capacity", "1",
+    ])
+    rates = {workers: scaling_bench.measure(workers, args, state_backend="local")[0] for workers in (1, 2, 4)}
+    # sessions do not hash evenly onto the workers and the slowest worker sets the
+    # pace, so well short of the ideal doubling
+    assert rates[2] > 1.25 * rates[1], rates
+    assert rates[4] > rates[2], rates
+    assert rates[4] > 1.6 * rates[1], rates
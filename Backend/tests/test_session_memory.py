@@ -0,0 +1,75 @@
+import asyncio
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from session_memory import RollingSummaryMemory
+
+
+def turn(i: int) -> list:
+    return [
+        ChatMessage(role=MessageRole.USER, content=f"question {i} " + "word " * 8),
+        ChatMessage(role=MessageRole.ASSISTANT, content=f"answer {i} " + "word " * 8),
+    ]
+
+
+def counting_tokenizer(calls: list):
+    def tokenize(text: str) -> list:
+        calls.append(text)
+        return text.split()
+    return tokenize
+
+
+def test_each_message_is_tokenized_once():
+    calls = []
+    memory = RollingSummaryMemory.from_defaults(token_limit=1000, tokenizer_fn=counting_tokenizer(calls))
+    for i in range(20):
+        for message in turn(i):
+            memory.put(message)
+        memory.get()
+
+    assert len(memory.get()) == 40
+    assert len(calls) == 40
+
+
+def test_evicted_messages_are_folded_into_the_summary():
+    summarized = []
+
+    async def summarizer(previous, evicted):
+        summarized.append(len(evicted))
+        return f"{previous} +{len(evicted)}".strip()
+
+    async def scenario():
+        memory = RollingSummaryMemory.from_defaults(
+            token_limit=100, tokenizer_fn=str.split, summarizer=summarizer,
+        )
+        for i in range(20):
+            for message in turn(i):
+                memory.put(message)
+            window = memory.get()
+            await asyncio.sleep(0)
+        return memory, window
+
+    memory, window = asyncio.run(scenario())
+
+    # the window fits the limit, opens with the summary and never with an assistant message
+    assert sum(len(str(m.content).split()) for m in window) <= 100
+    assert window[0].role == MessageRole.SYSTEM
+    assert memory.summary in window[0].content
+    assert window[1].role == MessageRole.USER
+    assert window[-1].content.startswith("answer 19")
+    assert summarized and sum(summarized) <= 40
+
+
+def test_pop_keeps_the_cached_counts_in_step():
+    calls = []
+    memory = RollingSummaryMemory.from_defaults(token_limit=1000, tokenizer_fn=counting_tokenizer(calls))
+    for message in turn(0) + turn(1):
+        memory.put(message)
+    memory.get()
+
+    assert memory.pop().content.startswith("answer 1")
+    memory.put(ChatMessage(role=MessageRole.ASSISTANT, content="a shorter answer"))
+
+    assert [m.content for m in memory.get()][-1] == "a shorter answer"
+    assert calls[-1] == "a shorter answer"
+    assert len(calls) == 5
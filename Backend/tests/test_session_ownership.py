@@ -0,0 +1,63 @@
+import asyncio
+
+from session_ownership import SessionOwnership
+from session_router import HashRing
+from session_state import LocalSessionStateStore
+
+A, B = "http://127.0.0.1:8100", "http://127.0.0.1:8101"
+
+
+def moved_session(ring: HashRing) -> str:
+    # a session the one-worker ring gave to A that the two-worker ring gives to B
+    return next(f"session_{i}" for i in range(1000) if ring.node(f"session_{i}") == B)
+
+
+def test_session_moves_to_the_new_worker_on_rebalance():
+    async def run():
+        store = LocalSessionStateStore()
+        old, new = SessionOwnership(store, A, handoff_timeout=5), SessionOwnership(store, B, handoff_timeout=5)
+        ring = HashRing([A])
+        ring.set_nodes([A, B])
+        session_id = moved_session(ring)
+
+        await old.claim(session_id)
+        assert old.save_summary(session_id, "likes trains")
+        discarded = []
+
+        def discard(sid: str) -> bool:
+            discarded.append(sid)
+            return True
+
+        maintenance = asyncio.create_task(old.run(discard))
+        try:
+            lease = await new.claim(session_id)
+        finally:
+            maintenance.cancel()
+            await asyncio.gather(maintenance, return_exceptions=True)
+
+        # handed over, not taken by force: the summary came along and the old owner let go
+        assert discarded == [session_id]
+        assert lease.summary == "likes trains"
+        assert not old.holds(session_id) and new.holds(session_id)
+        assert not old.save_summary(session_id, "stale")
+        assert new.save_summary(session_id, "likes planes")
+
+    asyncio.run(run())
+
+
+def test_forced_takeover_rejects_the_old_owners_writes():
+    async def run():
+        store = LocalSessionStateStore()
+        old, new = SessionOwnership(store, A), SessionOwnership(store, B, handoff_timeout=0.2)
+        await old.claim("busy_session")
+        # the old owner never answers the handoff request
+        lease = await new.claim("busy_session")
+        assert lease.owner == B
+        # the old owner still has the session cached, but the store says it is lost
+        assert old.holds("busy_session")
+        assert not old.verify("busy_session")
+        assert not old.holds("busy_session")
+        assert not old.save_summary("busy_session", "stale")
+        assert new.verify("busy_session")
+
+    asyncio.run(run())
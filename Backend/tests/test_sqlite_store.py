@@ -0,0 +1,65 @@
+import time
+import sqlite3
+
+from history_store import SqliteChatStore
+
+
+def message(i: int) -> dict:
+    return {"role": "user", "content": f"message {i}"}
+
+
+def committed(path: str, session_id: str) -> int:
+    # what another process would see
+    with sqlite3.connect(path) as conn:
+        (count,) = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+    return count
+
+
+def test_writes_are_committed_in_groups(tmp_path):
+    path = str(tmp_path / "chat.db")
+    store = SqliteChatStore(path, commit_batch=3, commit_interval=60)
+    try:
+        store.append("s", [message(0)])
+        store.append("s", [message(1)])
+        # not committed yet, but the store reads its own writes
+        assert committed(path, "s") == 0
+        assert store.load("s") == [message(0), message(1)]
+
+        store.append("s", [message(2)])
+        assert committed(path, "s") == 3
+
+        store.append("s", [message(3)])
+        store.flush()
+        assert committed(path, "s") == 4
+    finally:
+        store.close()
+
+
+def test_commit_interval_bounds_the_delay(tmp_path):
+    path = str(tmp_path / "chat.db")
+    store = SqliteChatStore(path, commit_batch=1000, commit_interval=0.05)
+    try:
+        store.append("s", [message(0)])
+        deadline = time.monotonic() + 2
+        while committed(path, "s") == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert committed(path, "s") == 1
+    finally:
+        store.close()
+
+
+def test_close_commits_and_replace_renumbers(tmp_path):
+    path = str(tmp_path / "chat.db")
+    store = SqliteChatStore(path, commit_batch=1000, commit_interval=60)
+    store.append("s", [message(i) for i in range(5)])
+    store.replace("s", [message(7)])
+    store.append("s", [message(8)])
+    store.close()
+
+    reopened = SqliteChatStore(path)
+    try:
+        assert reopened.load("s") == [message(7), message(8)]
+        # a bounded read walks back from the newest message
+        assert reopened.load("s", token_limit=1) == [message(8)]
+    finally:
+        reopened.close()
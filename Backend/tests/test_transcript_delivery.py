@@ -0,0 +1,78 @@
+import json
+import asyncio
+
+from transcript_delivery import MAX_INTERIM_WINDOW_MS, TranscriptDelivery
+
+
+def frames(sent: list) -> list:
+    return [(frame["text"], frame["is_final"]) for frame in map(json.loads, sent)]
+
+
+def test_interims_within_a_window_collapse_into_the_latest():
+    sent = []
+
+    async def send_text(text):
+        sent.append(text)
+
+    async def scenario():
+        delivery = TranscriptDelivery(send_text, interim_window=0.05)
+        for transcript in ("how", "how are", "how are you"):
+            await delivery.push(transcript, is_final=False)
+        # the first goes out at once, the rest wait for the window to close
+        assert frames(sent) == [("how", False)]
+        await asyncio.sleep(0.1)
+        await delivery.close()
+
+    asyncio.run(scenario())
+
+    assert frames(sent) == [("how", False), ("how are you", False)]
+
+
+def test_final_drops_the_pending_interim():
+    sent = []
+
+    async def send_text(text):
+        sent.append(text)
+
+    async def scenario():
+        delivery = TranscriptDelivery(send_text, interim_window=0.05)
+        await delivery.push("how", is_final=False)
+        await delivery.push("how are", is_final=False)
+        await delivery.push("how are you", is_final=True)
+        await asyncio.sleep(0.1)
+        await delivery.close()
+
+    asyncio.run(scenario())
+
+    assert frames(sent) == [("how", False), ("how are you", True)]
+
+
+def test_window_settings():
+    sent = []
+
+    async def send_text(text):
+        sent.append(text)
+
+    async def scenario(window):
+        sent.clear()
+        delivery = TranscriptDelivery(send_text, interim_window=window)
+        for transcript in ("a", "a b", "a b c"):
+            await delivery.push(transcript, is_final=False)
+        await delivery.close()
+        return frames(sent)
+
+    # <= 0 forwards every interim, None drops them
+    assert asyncio.run(scenario(0)) == [("a", False), ("a b", False), ("a b c", False)]
+    assert asyncio.run(scenario(None)) == []
+
+
+def test_window_from_query_is_clamped():
+    async def send_text(text):
+        pass
+
+    assert TranscriptDelivery.from_query(send_text, {"interim_window_ms": "off"}).interim_window is None
+    assert TranscriptDelivery.from_query(send_text, {"interim_window_ms": "-5"}).interim_window == 0
+    assert TranscriptDelivery.from_query(send_text, {"interim_window_ms": "1e9"}).interim_window == MAX_INTERIM_WINDOW_MS / 1000
+    default = TranscriptDelivery(send_text).interim_window
+    assert TranscriptDelivery.from_query(send_text, {"interim_window_ms": "nan"}).interim_window == default
+    assert TranscriptDelivery.from_query(send_text, {"interim_window_ms": "soon"}).interim_window == default
@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+
+from warmup import Warmup
+
+
+def get(app, path: str) -> httpx.Response:
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+            return await client.get(path)
+    return asyncio.run(request())
+
+
+def test_ready_only_once_every_step_ran(monkeypatch):
+    import main
+
+    release = asyncio.Event()
+    ran = []
+
+    async def slow_step():
+        await release.wait()
+
+    warmup = Warmup()
+    warmup.step("blocking", lambda: ran.append("blocking"))
+    warmup.step("slow", slow_step)
+    monkeypatch.setattr(main, "warmup", warmup)
+
+    async def scenario():
+        warming = asyncio.create_task(warmup.run())
+        await asyncio.sleep(0.05)
+        # the blocking step ran in a thread, the slow one is still going
+        assert ran == ["blocking"] and not warmup.ready
+        release.set()
+        await warming
+
+    assert get(main.app, "/health").status_code == 200
+    response = get(main.app, "/ready")
+    assert (response.status_code, response.json()["detail"]) == (503, "Warming up")
+
+    asyncio.run(scenario())
+    response = get(main.app, "/ready")
+    assert response.status_code == 200
+    assert set(response.json()["warmup"]) == {"blocking", "slow"}
+
+
+def test_failed_step_keeps_the_worker_unready(monkeypatch):
+    import main
+
+    def broken():
+        raise ImportError("no module named openai")
+
+    warmup = Warmup()
+    warmup.step("broken", broken)
+    warmup.step("never", lambda: pytest.fail("ran after a failed step"))
+    monkeypatch.setattr(main, "warmup", warmup)
+
+    asyncio.run(warmup.run())
+
+    response = get(main.app, "/ready")
+    assert (response.status_code, response.json()["detail"]) == (503, "Warmup failed")
+    # requests waiting on the warmup fail instead of hanging
+    with pytest.raises(RuntimeError):
+        asyncio.run(warmup.module("json"))
@@ -0,0 +1,134 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import metrics
+
+logger = logging.getLogger("VoiceAgent")
+
+# Interim results arriving within this window are collapsed into the latest one
+INTERIM_WINDOW_MS = float(os.getenv("TRANSCRIPT_INTERIM_WINDOW_MS", "150"))
+# upper bound for a window asked for by the browser (?interim_window_ms=)
+MAX_INTERIM_WINDOW_MS = float(os.getenv("TRANSCRIPT_MAX_INTERIM_WINDOW_MS", "2000"))
+
+frames_sent = metrics.counter("transcript_frames_sent_total", "Transcript frames sent to browsers", ["kind"])
+interims_coalesced = metrics.counter("transcript_interims_coalesced_total", "Interim transcripts replaced before being sent")
+
+
+class TranscriptDelivery:
+    """
+    Delivers transcripts to one browser.
+
+    Finals are sent immediately and in order. Interims are latest-wins: the
+    first one in a window goes out right away, later ones only replace a
+    pending value and a single timer flushes whatever is newest when the
+    window closes. A final drops any pending interim, since it supersedes it.
+
+    interim_window <= 0 forwards every interim, interim_window is None drops
+    interims altogether.
+    """
+
+    def __init__(self, send_text: Callable[[str], Awaitable[None]], interim_window: Optional[float] = INTERIM_WINDOW_MS / 1000):
+        self._send_text = send_text
+        self.interim_window = interim_window
+        self._lock = asyncio.Lock()
+        self._pending: Optional[str] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_interim_sent = 0.0
+        # bumped on every final so a late interim flush never overtakes it
+        self._generation = 0
+
+    @classmethod
+    def from_query(cls, send_text, query_params) -> "TranscriptDelivery":
+        value = query_params.get("interim_window_ms")
+        if value is None:
+            return cls(send_text)
+        if value in ("off", "none"):
+            return cls(send_text, interim_window=None)
+        try:
+            window_ms = float(value)
+        except ValueError:
+            window_ms = math.nan
+        if math.isnan(window_ms):
+            logger.warning(f"Ignoring invalid interim_window_ms={value!r}")
+            return cls(send_text)
+        return cls(send_text, interim_window=min(max(window_ms, 0.0), MAX_INTERIM_WINDOW_MS) / 1000)
+
+    async def push(self, transcript: str, is_final: bool):
+        if is_final:
+            logger.info(f"Heard: {transcript}")
+            await self._send_final(transcript)
+            return
+
+        logger.debug(f"Heard (interim): {transcript}")
+        if self.interim_window is None:
+            return
+
+        now = time.monotonic()
+        if self._pending is None and now - self._last_interim_sent >= self.interim_window:
+            self._last_interim_sent = now
+            await self._send(transcript, False)
+            return
+
+        if self._pending is not None:
+            interims_coalesced.inc()
+        self._pending = transcript
+        if self._timer is None:
+            delay = max(0.0, self._last_interim_sent + self.interim_window - now)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    async def close(self):
+        self._cancel_pending()
+        if self._flush_task:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+    def _cancel_pending(self):
+        if self._pending is not None:
+            interims_coalesced.inc()
+        self._pending = None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _send_final(self, transcript: str):
+        self._generation += 1
+        self._cancel_pending()
+        await self._send(transcript, True)
+
+    def _on_timer(self):
+        self._timer = None
+        transcript, self._pending = self._pending, None
+        if transcript is not None:
+            self._last_interim_sent = time.monotonic()
+            self._flush_task = asyncio.create_task(self._flush(transcript, self._generation))
+
+    async def _flush(self, transcript: str, generation: int):
+        async with self._lock:
+            if generation != self._generation:
+                return
+            try:
+                await self._write(transcript, False)
+            except Exception as e:
+                logger.debug(f"Interim delivery failed: {e}")
+
+    async def send_event(self, event: dict):
+        # other messages share the socket, so they go through the same lock
+        async with self._lock:
+            await self._send_text(json.dumps(event))
+
+    async def _send(self, transcript: str, is_final: bool):
+        async with self._lock:
+            await self._write(transcript, is_final)
+
+    async def _write(self, transcript: str, is_final: bool):
+        await self._send_text(json.dumps({
+            "type": "transcript",
+            "text": transcript,
+            "is_final": is_final
+        }))
+        frames_sent.labels("final" if is_final else "interim").inc()
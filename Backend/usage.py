@@ -0,0 +1,135 @@
+import os
+import logging
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+logger = logging.getLogger("VoiceAgent")
+
+# model whose tokenizer is used to count usage (the one llm_logic talks to)
+USAGE_TOKENIZER_MODEL = os.getenv("USAGE_TOKENIZER_MODEL", "gpt-4o-mini")
+# sessions kept in the ledger; the least recently active are dropped first
+USAGE_LEDGER_MAX_SESSIONS = int(os.getenv("USAGE_LEDGER_MAX_SESSIONS", "100000"))
+# fold queued records into the totals once this many pile up unread
+FOLD_BATCH = 1024
+
+# chat format overhead, as counted by OpenAI: a few tokens around every
+# message and the assistant reply primer
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+tokens_total = metrics.counter("chat_tokens_total", "Tokens billed by the LLM", ["agent_id", "kind"])
+
+
+@lru_cache(maxsize=None)
+def _encoder() -> Callable[[str], List[int]]:
+    import tiktoken
+
+    try:
+        encoding = tiktoken.encoding_for_model(USAGE_TOKENIZER_MODEL)
+        return lambda text: encoding.encode(text, disallowed_special=())
+    except Exception as e:
+        # the model's BPE file is fetched on first use; llama_index ships cl100k
+        from llama_index.core.utils import get_tokenizer
+
+        logger.warning(f"Tokenizer for {USAGE_TOKENIZER_MODEL} unavailable ({e!r}), counting with cl100k_base")
+        return get_tokenizer()
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    # history messages are re-sent every turn, so most lookups hit the cache
+    return len(_encoder()(text))
+
+
+def warm_tokenizer():
+    # loading the BPE ranks can take a while (or a download); do it before the first reply
+    _encoder()
+
+
+def count_prompt_tokens(messages) -> int:
+    return sum(count_tokens(str(m.content or "")) + TOKENS_PER_MESSAGE for m in messages) + TOKENS_PER_REPLY
+
+
+class TurnUsage:
+    """Token counts of one reply, filled in by astream_chat_response when it ends."""
+
+    def __init__(self):
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+
+class UsageLedger:
+    """
+    Token usage per session and per agent.
+
+    `record` only appends to a queue, so finishing a reply never waits on
+    aggregation; the totals are folded in when they are read. Cached
+    replies cost no LLM call and are counted as turns only. `agent_id`
+    must be a configured agent (the one that served the turn), never the
+    id a client sent: agents and metric series are kept without bound.
+    """
+
+    def __init__(self, max_sessions: int = USAGE_LEDGER_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._pending = deque()
+        self._sessions: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._agents: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id: str, agent_id: str, prompt_tokens: int, completion_tokens: int, cached: bool = False):
+        if cached:
+            prompt_tokens = completion_tokens = 0
+        else:
+            tokens_total.labels(agent_id, "prompt").inc(prompt_tokens)
+            tokens_total.labels(agent_id, "completion").inc(completion_tokens)
+        self._pending.append((session_id, agent_id, prompt_tokens, completion_tokens, cached))
+        if len(self._pending) >= FOLD_BATCH and self._lock.acquire(blocking=False):
+            try:
+                self._fold()
+            finally:
+                self._lock.release()
+
+    def session(self, session_id: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            self._fold()
+            totals = self._sessions.get(session_id)
+            return dict(totals) if totals else None
+
+    def agent(self, agent_id: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            self._fold()
+            totals = self._agents.get(agent_id)
+            return dict(totals) if totals else None
+
+    def agents(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            self._fold()
+            return {agent_id: dict(totals) for agent_id, totals in self._agents.items()}
+
+    def _fold(self):
+        while self._pending:
+            session_id, agent_id, prompt_tokens, completion_tokens, cached = self._pending.popleft()
+            totals = self._sessions.pop(session_id, None) or _empty()
+            self._sessions[session_id] = totals
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            for t in (totals, self._agents.setdefault(agent_id, _empty())):
+                t["turns"] += 1
+                t["cached_turns"] += cached
+                t["prompt_tokens"] += prompt_tokens
+                t["completion_tokens"] += completion_tokens
+                t["total_tokens"] += prompt_tokens + completion_tokens
+
+
+def _empty() -> Dict[str, int]:
+    return {"turns": 0, "cached_turns": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+usage_ledger = UsageLedger()
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Awaitable, Callable, List, Optional
+
+from llm_logic import astream_chat_response
+from admission import admission, Busy, VOICE
+
+logger = logging.getLogger("VoiceAgent")
+
+
+class VoiceTurnLoop:
+    """
+    Turns final transcripts into LLM replies on the same websocket.
+
+    Final transcript segments are collected until Deepgram marks the end of
+    speech, then the whole utterance goes to astream_chat_response and the
+    reply streams back as reply_start / reply_delta / reply_done messages.
+    If the caller starts a new utterance while a reply is still streaming,
+    that reply is cancelled.
+    """
+
+    def __init__(self, session_id: str, send_event: Callable[[dict], Awaitable[None]]):
+        self.session_id = session_id
+        self._send_event = send_event
+        self._segments: List[str] = []
+        self._turn_id = 0
+        self._reply: Optional[asyncio.Task] = None
+
+    async def on_transcript(self, transcript: str, is_final: bool, speech_final: bool):
+        if not is_final:
+            return
+        if transcript:
+            # the caller is talking over the reply
+            await self._cancel_reply()
+            self._segments.append(transcript)
+        if speech_final and self._segments:
+            user_input = " ".join(self._segments)
+            self._segments = []
+            await self._start_turn(user_input)
+
+    async def close(self):
+        await self._cancel_reply()
+
+    async def _start_turn(self, user_input: str):
+        await self._cancel_reply()
+        self._turn_id += 1
+        self._reply = asyncio.create_task(self._run_turn(self._turn_id, user_input))
+
+    async def _cancel_reply(self):
+        if self._reply and not self._reply.done():
+            self._reply.cancel()
+            await asyncio.gather(self._reply, return_exceptions=True)
+        self._reply = None
+
+    async def _run_turn(self, turn_id: int, user_input: str):
+        logger.info(f"Voice turn {turn_id}: {user_input}")
+        await self._send_event({"type": "reply_start", "turn_id": turn_id, "text": user_input})
+        try:
+            # aclosing: on barge-in the reply's cleanup (persistence, usage) runs now, not at GC
+            async with admission.slot(VOICE), aclosing(astream_chat_response(self.session_id, user_input)) as reply:
+                async for token in reply:
+                    await self._send_event({"type": "reply_delta", "turn_id": turn_id, "text": token})
+        except Busy as e:
+            logger.warning(f"Voice turn {turn_id} shed: {e}")
+            await self._send_event({"type": "reply_error", "turn_id": turn_id, "error": "busy"})
+            return
+        except asyncio.CancelledError:
+            logger.info(f"Voice turn {turn_id} interrupted")
+            raise
+        except Exception:
+            logger.exception(f"Voice turn {turn_id} failed")
+            # the exception text stays in the log, the browser gets a generic code
+            await self._send_event({"type": "reply_error", "turn_id": turn_id, "error": "internal"})
+            return
+        await self._send_event({"type": "reply_done", "turn_id": turn_id})
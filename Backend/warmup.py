@@ -0,0 +1,69 @@
+import time
+import asyncio
+import logging
+import importlib
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger("VoiceAgent")
+
+step_seconds = metrics.gauge("startup_warmup_seconds", "Time each startup warmup step took", ["step"])
+ready_gauge = metrics.gauge("startup_ready", "1 once the worker has finished warming up")
+
+
+class Warmup:
+    """
+    Startup work that must not hold up binding the port.
+
+    Heavy imports (llama_index, the OpenAI and Deepgram SDKs), client
+    construction and the tokenizer tables are loaded by `run()` in the
+    background once the server is up. Plain functions run in a thread,
+    coroutine functions on the loop, in the order they were added.
+    Requests that need them await `wait()` (or `module()`); the /ready
+    probe reports `ready`.
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable]] = []
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[Exception] = None
+        self._done = asyncio.Event()
+
+    def step(self, name: str, fn: Callable):
+        self.steps.append((name, fn))
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    async def run(self):
+        for name, fn in self.steps:
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await fn()
+                else:
+                    await asyncio.to_thread(fn)
+            except Exception as e:
+                # stays not ready; requests waiting on it fail instead of hanging
+                logger.exception(f"Warmup step {name} failed")
+                self.error = e
+                self._done.set()
+                return
+            self.timings[name] = round(time.perf_counter() - started, 3)
+            step_seconds.labels(name).set(self.timings[name])
+        logger.info(f"Warm after {sum(self.timings.values()):.2f}s ({', '.join(f'{n} {s:.2f}s' for n, s in self.timings.items())})")
+        ready_gauge.set(1)
+        self._done.set()
+
+    async def wait(self):
+        await self._done.wait()
+        if self.error is not None:
+            raise RuntimeError("Worker failed to warm up") from self.error
+
+    async def module(self, name: str) -> ModuleType:
+        # a module loaded by the warmup; after wait() this is a sys.modules lookup
+        await self.wait()
+        return importlib.import_module(name)
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+from common import metrics
+
+logger = logging.getLogger("custom_llm_1")
+
+VOICE_BACKEND_URL = os.getenv("VOICE_BACKEND_URL", "http://localhost:8000")
+VOICE_BACKEND_MAX_CONNECTIONS = int(os.getenv("VOICE_BACKEND_MAX_CONNECTIONS", "50"))
+# connections opened ahead of the first turn
+VOICE_BACKEND_WARM_CONNECTIONS = int(os.getenv("VOICE_BACKEND_WARM_CONNECTIONS", "2"))
+# ping the backend this often while a call is up so an idle keep-alive
+# connection is not closed under us (uvicorn drops them after 5s by default)
+VOICE_BACKEND_KEEPALIVE_INTERVAL = float(os.getenv("VOICE_BACKEND_KEEPALIVE_INTERVAL", "4"))
+# a barge-in waits this long for the backend to acknowledge the cancel
+VOICE_BACKEND_CANCEL_TIMEOUT = float(os.getenv("VOICE_BACKEND_CANCEL_TIMEOUT", "0.5"))
+
+requests_total = metrics.counter("backend_requests_total", "Requests sent to the chat backend")
+connections_opened = metrics.counter("backend_connections_opened_total", "TCP connections opened to the chat backend")
+requests_in_flight = metrics.gauge("backend_requests_in_flight", "Chat backend requests currently streaming")
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcore reports every new connection; requests without one reused the pool
+    if event_name == "connection.connect_tcp.complete":
+        connections_opened.inc()
+
+
+class BackendClient:
+    """
+    One pooled keep-alive HTTP client to the chat backend per worker process.
+
+    Every turn of every call in the process goes through the same
+    connection pool instead of opening a fresh connection.
+    """
+
+    def __init__(
+        self,
+        base_url: str = VOICE_BACKEND_URL,
+        max_connections: int = VOICE_BACKEND_MAX_CONNECTIONS,
+    ):
+        self.base_url = base_url
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(connect=15.0, read=5.0, write=5.0, pool=5.0),
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=120,
+            ),
+        )
+        self._keep_warm: Optional[asyncio.Task] = None
+
+    async def ping(self):
+        response = await self.http.get("/health", extensions={"trace": _trace})
+        response.raise_for_status()
+
+    async def warm(self, connections: int = VOICE_BACKEND_WARM_CONNECTIONS):
+        """Open `connections` keep-alive connections before they are needed."""
+        results = await asyncio.gather(*(self.ping() for _ in range(connections)), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning(f"Backend warmup failed ({self.base_url}): {failed[0]!r}")
+
+    def start_keep_warm(self):
+        """Start the keepalive pings once for the whole process; later calls are no-ops."""
+        if self._keep_warm is None or self._keep_warm.done():
+            self._keep_warm = asyncio.create_task(self.keep_warm())
+
+    async def keep_warm(self, interval: float = VOICE_BACKEND_KEEPALIVE_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.ping()
+            except httpx.HTTPError as e:
+                logger.warning(f"Backend keepalive failed: {e!r}")
+
+    @asynccontextmanager
+    async def stream_voice_chat(self, payload: dict):
+        requests_total.inc()
+        requests_in_flight.inc()
+        try:
+            async with self.http.stream(
+                "POST", "/chat/stream/voice", json=payload, extensions={"trace": _trace}
+            ) as response:
+                yield response
+        finally:
+            requests_in_flight.dec()
+
+    async def commit(self, session_id: str, user_input: str, reply: str, agent_id: str, interrupted: bool = False):
+        """Record a turn that was answered by a speculative request; `interrupted` replaces an unanswered user message."""
+        response = await self.http.post(
+            "/chat/commit",
+            json={
+                "session_id": session_id,
+                "user_input": user_input,
+                "reply": reply,
+                "agent_id": agent_id,
+                "interrupted": interrupted,
+            },
+            extensions={"trace": _trace},
+        )
+        response.raise_for_status()
+
+    async def cancel(self, session_id: str, turn_id: str, heard: Optional[str] = None):
+        """Stop generating the reply `turn_id`; the backend records `heard` for it."""
+        try:
+            response = await self.http.post(
+                "/chat/cancel",
+                json={"session_id": session_id, "turn_id": turn_id, "heard": heard},
+                timeout=VOICE_BACKEND_CANCEL_TIMEOUT,
+                extensions={"trace": _trace},
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # closing the stream still stops the backend, it just records the full reply
+            logger.warning(f"Backend cancel failed: {e!r}")
+
+    async def aclose(self):
+        if self._keep_warm is not None:
+            self._keep_warm.cancel()
+        await self.http.aclose()
+
+
+_client: Optional[BackendClient] = None
+
+
+def get_backend_client() -> BackendClient:
+    global _client
+    if _client is None:
+        _client = BackendClient()
+    return _client
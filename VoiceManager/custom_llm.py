@@ -1,12 +1,12 @@
 from __future__ import annotations
 import uuid
-import json
+import time
+import asyncio
 import os
 from dataclasses import dataclass
 from typing import Any
 import logging
 import httpx
-import aiohttp
 
 import openai
 from livekit.agents import APIConnectionError, APIStatusError, APITimeoutError, llm
@@ -21,7 +21,6 @@ from livekit.agents.types import (
 )
 from livekit.agents.utils import is_given
 from openai.types.chat import (
-    ChatCompletionChunk,
     ChatCompletionToolChoiceOptionParam,
     completion_create_params,
 )
@@ -31,6 +30,14 @@ from openai.types.chat.chat_completion_chunk import Choice
 
 from livekit.plugins.openai.utils import to_chat_ctx
 
+from speech_segmenter import SpeechSegmenter
+from backend_client import BackendClient, get_backend_client
+from speculation import Speculator
+from turn_aggregator import TurnAggregator
+from turn_metrics import backend_ttft
+
+from common import stream_protocol
+
 # from .utils import AsyncAzureADTokenProvider, to_chat_ctx, to_fnc_ctx
 
 lk_oai_debug = int(os.getenv("LK_OPENAI_DEBUG", 0))
@@ -58,8 +65,9 @@ class CustomLLM(llm.LLM):
         model: str  = "gpt-4o",
         session_id: str,
         agent_id: str,
-        api_key: NotGivenOr[str] = NOT_GIVEN,
-        base_url: NotGivenOr[str] = NOT_GIVEN,
+        backend: BackendClient | None = None,
+        speculator: Speculator | None = None,
+        aggregator: TurnAggregator | None = None,
         client: openai.AsyncClient | None = None,
         user: NotGivenOr[str] = NOT_GIVEN,
         temperature: NotGivenOr[float] = NOT_GIVEN,
@@ -68,13 +76,13 @@ class CustomLLM(llm.LLM):
         store: NotGivenOr[bool] = NOT_GIVEN,
         metadata: NotGivenOr[dict[str, str]] = NOT_GIVEN,
         max_completion_tokens: NotGivenOr[int] = NOT_GIVEN,
-        timeout: httpx.Timeout | None = None,
     ) -> None:
         """
-        Create a new instance of OpenAI LLM.
+        Create a new LLM that answers through the chat backend.
 
-        ``api_key`` must be set to your OpenAI API key, either using the argument or by setting the
-        ``OPENAI_API_KEY`` environmental variable.
+        ``backend`` defaults to the worker process's shared pooled client, see backend_client.py.
+        With a ``speculator`` the reply may already have been requested before the turn ended.
+        ``aggregator`` merges a turn the caller split over several pauses, see turn_aggregator.py.
         """
         super().__init__()
         self.session_id = session_id
@@ -89,22 +97,10 @@ class CustomLLM(llm.LLM):
             metadata=metadata,
             max_completion_tokens=max_completion_tokens,
         )
-        self._client = client or openai.AsyncClient(
-            api_key=api_key if is_given(api_key) else None,
-            base_url=base_url if is_given(base_url) else None,
-            max_retries=0,
-            http_client=httpx.AsyncClient(
-                timeout=timeout
-                if timeout
-                else httpx.Timeout(connect=15.0, read=5.0, write=5.0, pool=5.0),
-                follow_redirects=True,
-                limits=httpx.Limits(
-                    max_connections=50,
-                    max_keepalive_connections=50,
-                    keepalive_expiry=120,
-                ),
-            ),
-        )
+        self._backend = backend or get_backend_client()
+        self._speculator = speculator
+        self._aggregator = aggregator or TurnAggregator()
+        self._client = client
 
     def chat(
         self,
@@ -171,7 +167,7 @@ class CustomLLMStream(llm.LLMStream):
         llm: CustomLLM,
         *,
         model: str ,
-        client: openai.AsyncClient,
+        client: openai.AsyncClient | None,
         chat_ctx: llm.ChatContext,
         tools: list[FunctionTool],
         conn_options: APIConnectOptions,
@@ -216,12 +212,12 @@ class CustomLLMStream(llm.LLMStream):
                     if msg["role"] == "user"
                 ]
 
-            # user_input = "\n".join(user_input_parts).strip()
-            user_input = next(
-                msg["content"]
-                for msg in reversed(chat_ctx)
-                if msg["role"] == "user"
-            )
+            # every fragment since the last reply the caller heard, in one request;
+            # waits a moment first if the caller sounds mid-sentence
+            aggregator = self._llm._aggregator
+            user_input, interrupted = await aggregator.prepare(user_input_parts)
+            if not user_input:
+                return
 
             print(f"User Input: {user_input}")
 
@@ -236,70 +232,130 @@ class CustomLLMStream(llm.LLMStream):
             payload = {
                 "user_input": user_input,
                 "session_id": session_id,
-                "agent_id": agent_id
+                "agent_id": agent_id,
+                "turn_id": uuid.uuid4().hex,
+                "interrupted": interrupted,
             }
-            headers = {
-                "Content-Type": "application/json"
-            }
-
             full_response = ""
-            total_tokens = 0
+            # what has gone to TTS; on barge-in this is all the caller can have heard
+            spoken = ""
+            sent_at = time.perf_counter()
+            # exact counts come from the backend's usage event (its tokenizer, full prompt)
+            completion_tokens = prompt_tokens = None
+            # a reply is only complete once the stream says so; a dropped connection just ends the body
+            ended = False
+            # hand TTS whole clauses/sentences instead of token fragments
+            segmenter = SpeechSegmenter()
+
+            def send_speech(pieces):
+                nonlocal spoken
+                for piece in pieces:
+                    spoken += piece + " "
+                    self._event_ch.send_nowait(
+                        llm.ChatChunk(
+                            id=session_id,
+                            delta=llm.ChoiceDelta(role="assistant", content=piece + " "),
+                        )
+                    )
+
+            def handle(events):
+                nonlocal full_response, completion_tokens, prompt_tokens, ended
+                for event in events:
+                    if event["type"] == stream_protocol.DELTA:
+                        if not full_response:
+                            backend_ttft.observe(time.perf_counter() - sent_at)
+                        full_response += event["text"]
+                        send_speech(segmenter.push(event["text"]))
+                    elif event["type"] == stream_protocol.USAGE:
+                        completion_tokens = event.get("completion_tokens", completion_tokens)
+                        prompt_tokens = event.get("prompt_tokens", prompt_tokens)
+                    elif event["type"] == stream_protocol.DONE:
+                        ended = True
+                    elif event["type"] == stream_protocol.ERROR:
+                        raise APIStatusError(
+                            event.get("message", "stream error"),
+                            status_code=500,
+                            request_id=session_id,
+                            body=event,
+                        )
 
-            async with aiohttp.ClientSession() as session:
+            # a reply may already be on its way, started before endpointing (see speculation.py)
+            speculator = self._llm._speculator
+            speculation = speculator.take(user_input) if speculator else None
+
+            aggregator.sent(user_input)
+
+            if speculation:
+                logger.info(f"Using speculative reply for: {user_input}")
+                try:
+                    async for event in speculation.replay():
+                        handle([event])
+                except asyncio.CancelledError:
+                    if spoken:
+                        # barge-in: keep the turn, with only the part that was spoken
+                        await speculator.commit(speculation, spoken, interrupted)
+                        aggregator.answered()
+                    else:
+                        # nothing heard: the next request carries this input again
+                        aggregator.cut_off(recorded=False)
+                    raise
+                finally:
+                    if not speculation.done:
+                        await speculation.cancel()
+            else:
                 logger.info(f"Sending payload to LLM: {payload}")
-                async with session.post(
-                        "http://localhost:8000/chat/stream/voice",
-                        json=payload,
-                        headers=headers,
-                ) as response:
-                    if response.status != 200:
+                async with self._llm._backend.stream_voice_chat(payload) as response:
+                    if response.status_code != 200:
                         raise APIStatusError(
-                            f"API returned status code {response.status}",
-                            status_code=response.status,
+                            f"API returned status code {response.status_code}",
+                            status_code=response.status_code,
                             request_id=session_id,
-                            body=await response.text()
+                            body=(await response.aread()).decode("utf-8", "replace")
                         )
 
                     logger.info(f"LLM response = _______________ {str(response)}")
-                    async for line in response.content:
-                        # logger.info("start iterating response content")
-                        if line:
-                            try:
-                                decoded_line = line.decode('utf-8').strip()
-                                # logger.info(f"decoded_line = _______________ {decoded_line}")
-                                if decoded_line.startswith('data: '):
-                                    data = json.loads(decoded_line[6:])
-                                    if 'content' in data:
-                                        content = data['content']
-                                        full_response += content
-                                        total_tokens += len(content.split())
-                                        chunk = llm.ChatChunk(
-                                            id=session_id,
-                                            delta=llm.ChoiceDelta(
-                                                role="assistant",
-                                                content=content,
-                                            ),
-                                        )
-                                        # logger.info(f"chunk = _______________ {chunk}")
-                                        self._event_ch.send_nowait(chunk)
-
-                            except json.JSONDecodeError:
-                                logger.info(f"chunk = _______________ {chunk}")
-                            except Exception as e:
-                                print(f"Error processing stream chunk: {e}")
-                                logger.info(f"chunk = _______________ {chunk}")
+                    decoder = stream_protocol.StreamDecoder()
+                    try:
+                        async for data in response.aiter_raw():
+                            handle(decoder.feed(data))
+                        handle(decoder.close())
+                    except asyncio.CancelledError:
+                        # barge-in: stop generation before the connection drops, so the
+                        # backend records what was spoken rather than everything it sent
+                        await self._llm._backend.cancel(session_id, payload["turn_id"], spoken)
+                        if spoken:
+                            aggregator.answered()
+                        else:
+                            # the backend holds the unanswered user message until the next request replaces it
+                            aggregator.cut_off(recorded=True)
+                        raise
+
+            if not ended:
+                # truncated: don't flush the rest to TTS or count the turn as answered
+                raise APIConnectionError("Backend stream ended without a done event", retryable=False)
+
+            if completion_tokens is None:
+                completion_tokens = len(full_response.split())
+            if prompt_tokens is None:
+                prompt_tokens = len(user_input.split())
+            send_speech(segmenter.flush())
 
             # Send final chunk with usage information
             final_chunk = ChatChunk(
                 id=session_id,
                 usage=CompletionUsage(
-                    completion_tokens=total_tokens,
-                    prompt_tokens = len(user_input.split()),
-                    total_tokens=total_tokens + len(user_input.split())
+                    completion_tokens=completion_tokens,
+                    prompt_tokens=prompt_tokens,
+                    total_tokens=completion_tokens + prompt_tokens
                 )
             )
-            logger.info(f"chunk = _______________ {chunk}")
+            logger.info(f"chunk = _______________ {final_chunk}")
             self._event_ch.send_nowait(final_chunk)
+
+            if speculation:
+                # the backend only records speculative replies once we use them
+                await speculator.commit(speculation, full_response, interrupted)
+            aggregator.answered()
             
         except httpx.TimeoutException:
             raise APITimeoutError(retryable=False) from None
@@ -0,0 +1,193 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from backend_client import BackendClient
+from turn_aggregator import TurnAggregator
+from common import metrics, stream_protocol
+
+logger = logging.getLogger("custom_llm_1")
+
+# opt-in: speculative replies that miss are paid for; tune with the hit and wasted-token counters below
+VOICE_SPECULATION_ENABLED = os.getenv("VOICE_SPECULATION_ENABLED", "false").lower() in ("1", "true", "yes")
+# how long an interim transcript must stay unchanged before we start on it
+VOICE_SPECULATION_STABLE_MS = float(os.getenv("VOICE_SPECULATION_STABLE_MS", "300"))
+# rough chars per token, for replies cancelled before their usage event
+CHARS_PER_TOKEN = 4
+
+started_total = metrics.counter("speculation_started_total", "Replies requested before the user turn ended")
+hits_total = metrics.counter("speculation_hits_total", "Turns answered by a speculative reply")
+misses_total = metrics.counter("speculation_misses_total", "Turns whose final transcript differed from the speculation")
+wasted_tokens = metrics.counter("speculation_wasted_tokens_total", "Estimated completion tokens of discarded speculative replies")
+# hit ratio: speculation_hits_total / (speculation_hits_total + speculation_misses_total)
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+class Speculation:
+    """One speculative backend request, buffering its events until the turn decides."""
+
+    def __init__(self, backend: BackendClient, payload: dict):
+        self.text = payload["user_input"]
+        self.events: List[Dict] = []
+        self.done = False
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run(backend, payload))
+
+    async def _run(self, backend: BackendClient, payload: dict):
+        try:
+            async with backend.stream_voice_chat(payload) as response:
+                if response.status_code != 200:
+                    self._add([{"type": stream_protocol.ERROR, "message": f"status code {response.status_code}"}])
+                    return
+                decoder = stream_protocol.StreamDecoder()
+                async for data in response.aiter_raw():
+                    self._add(decoder.feed(data))
+                self._add(decoder.close())
+                if not any(event["type"] in (stream_protocol.DONE, stream_protocol.ERROR) for event in self.events):
+                    # the connection dropped mid-reply; never replay it as a complete one
+                    self._add([{"type": stream_protocol.ERROR, "code": "truncated", "message": "stream ended without a done event"}])
+        except Exception as e:
+            self._add([{"type": stream_protocol.ERROR, "message": repr(e)}])
+        finally:
+            self.done = True
+            self._changed.set()
+
+    def _add(self, events: List[Dict]):
+        if events:
+            self.events.extend(events)
+            self._changed.set()
+
+    async def replay(self):
+        """Events received so far, then the rest as they arrive."""
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.done:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def failed(self) -> bool:
+        # e.g. turned away by the backend's admission control
+        return any(event["type"] == stream_protocol.ERROR for event in self.events)
+
+    def tokens(self) -> int:
+        for event in self.events:
+            if event["type"] == stream_protocol.USAGE and "completion_tokens" in event:
+                return event["completion_tokens"]
+        text = "".join(e["text"] for e in self.events if e["type"] == stream_protocol.DELTA)
+        return len(text) // CHARS_PER_TOKEN
+
+    async def cancel(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class Speculator:
+    """
+    Starts the backend request before endpointing has closed the user turn.
+
+    Fed with the session's transcripts: once the text of the current turn
+    has not changed for `stable_window` seconds (or a final transcript
+    arrives) a speculative request is sent for it. When the LLM is asked
+    for the turn, `take` hands over the speculation if its text matches the
+    final user input; otherwise it is cancelled and the caller starts over.
+    Speculative replies are only recorded by the backend once committed.
+
+    With an `aggregator` the turn text starts with the fragments already
+    sent for an unanswered turn, since the next request repeats them (see
+    turn_aggregator.py); it must be the one the CustomLLM uses.
+    """
+
+    def __init__(
+        self,
+        backend: BackendClient,
+        session_id: str,
+        agent_id: str,
+        stable_window: float = VOICE_SPECULATION_STABLE_MS / 1000,
+        aggregator: Optional[TurnAggregator] = None,
+    ):
+        self.backend = backend
+        self.aggregator = aggregator
+        self.session_id = session_id
+        self.agent_id = agent_id
+        self.stable_window = stable_window
+        self._finals: List[str] = []
+        self._interim = ""
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._current: Optional[Speculation] = None
+        self._cancelling = set()
+
+    def turn_text(self) -> str:
+        # what the next request will send: the unanswered fragments, then the new speech
+        pending = self.aggregator.pending if self.aggregator else ""
+        return " ".join(t for t in [pending] + self._finals + [self._interim] if t).strip()
+
+    def on_transcript(self, transcript: str, is_final: bool):
+        if is_final:
+            self._finals.append(transcript)
+            self._interim = ""
+        else:
+            self._interim = transcript
+        if self._timer:
+            self._timer.cancel()
+        text = self.turn_text()
+        if text:
+            delay = 0 if is_final else self.stable_window
+            self._timer = asyncio.get_running_loop().call_later(delay, self._speculate, text)
+
+    def take(self, user_input: str) -> Optional[Speculation]:
+        """The speculation for this turn if it matches `user_input`, else None."""
+        if self._timer:
+            self._timer.cancel()
+        self._finals, self._interim = [], ""
+        speculation, self._current = self._current, None
+        if speculation is None:
+            return None
+        if speculation.failed():
+            self._discard(speculation)
+            return None
+        if normalize(speculation.text) == normalize(user_input):
+            hits_total.inc()
+            # record the turn as the final transcript has it
+            speculation.text = user_input
+            return speculation
+        misses_total.inc()
+        logger.info(f"Speculation missed: {speculation.text!r} vs {user_input!r}")
+        self._discard(speculation)
+        return None
+
+    async def commit(self, speculation: Speculation, reply: str, interrupted: bool = False):
+        try:
+            await self.backend.commit(self.session_id, speculation.text, reply, self.agent_id, interrupted)
+        except Exception as e:
+            # the caller already heard the reply; only the history misses it
+            logger.error(f"Failed to commit speculative reply: {e!r}")
+
+    def _speculate(self, text: str):
+        if self._current and normalize(self._current.text) == normalize(text):
+            return
+        if self._current:
+            self._discard(self._current)
+        started_total.inc()
+        self._current = Speculation(self.backend, {
+            "user_input": text,
+            "session_id": self.session_id,
+            "agent_id": self.agent_id,
+            "speculative": True,
+        })
+
+    def _discard(self, speculation: Speculation):
+        wasted_tokens.inc(speculation.tokens())
+        task = asyncio.create_task(speculation.cancel())
+        self._cancelling.add(task)
+        task.add_done_callback(self._cancelling.discard)
@@ -0,0 +1,122 @@
+import re
+from typing import List
+
+# Words that end in a period without ending the sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "inc", "ltd", "co",
+    "corp", "dept", "approx", "no", "fig", "e.g", "i.e", "a.m", "p.m", "u.s", "jan",
+    "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+SENTENCE_END = ".!?…"
+CLAUSE_END = ",;:"
+CLOSERS = "\"')]”’"
+# longest word we look back at when checking for an abbreviation
+MAX_WORD = 12
+
+_FENCE = re.compile(r"```[^\n]*")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|`|~~)")
+_LINE_PREFIX = re.compile(r"^\s*(#{1,6}\s+|>\s*|[-*+]\s+)", re.MULTILINE)
+
+
+def strip_markdown(text: str) -> str:
+    text = _FENCE.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _LINE_PREFIX.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    return " ".join(text.split())
+
+
+class SpeechSegmenter:
+    """
+    Cuts a streamed LLM reply into speakable pieces for TTS.
+
+    The first piece goes out at the first clause break (a comma, colon or
+    semicolon) once it is at least `first_clause_chars` long, so speech can
+    start early; after that, pieces are whole sentences or lines. Periods
+    after abbreviations, initials, decimals and list numbers don't end a
+    sentence, and markdown is stripped from every piece. Text with no break
+    at all is cut at a space once it reaches `max_chars`.
+
+    Each character is looked at once, plus a bounded look-back for
+    abbreviations, so the work per token does not grow with the reply.
+    """
+
+    def __init__(self, first_clause_chars: int = 20, max_chars: int = 250):
+        self.first_clause_chars = first_clause_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+        # everything before this index has been checked for a boundary
+        self._scanned = 0
+        self._emitted = False
+
+    def push(self, text: str) -> List[str]:
+        """Add streamed text; returns the pieces that are now complete."""
+        self._buffer += text
+        pieces = []
+        while True:
+            end = self._find_boundary()
+            if end is None:
+                break
+            self._cut(end, pieces)
+
+        if len(self._buffer) >= self.max_chars:
+            space = self._buffer.rfind(" ", 0, self.max_chars)
+            self._cut(space + 1 if space > 0 else self.max_chars, pieces)
+        return pieces
+
+    def flush(self) -> List[str]:
+        """End of the reply: whatever is left is the last piece."""
+        pieces = []
+        self._cut(len(self._buffer), pieces)
+        return pieces
+
+    def _cut(self, end: int, pieces: List[str]):
+        piece = strip_markdown(self._buffer[:end])
+        self._buffer = self._buffer[end:]
+        self._scanned = 0
+        if piece:
+            pieces.append(piece)
+            self._emitted = True
+
+    def _find_boundary(self):
+        buffer = self._buffer
+        i = self._scanned
+        while i < len(buffer):
+            char = buffer[i]
+
+            if char == "\n":
+                if buffer[:i].strip():
+                    return i + 1
+            elif char in SENTENCE_END or (char in CLAUSE_END and not self._emitted):
+                # skip closing quotes/brackets; the boundary is confirmed by the whitespace after
+                j = i + 1
+                while j < len(buffer) and buffer[j] in CLOSERS:
+                    j += 1
+                if j == len(buffer):
+                    # can't tell yet, wait for more text
+                    self._scanned = i
+                    return None
+                if buffer[j].isspace():
+                    if char in CLAUSE_END:
+                        if i + 1 >= self.first_clause_chars:
+                            return j
+                    elif char != "." or not self._period_in_word(i):
+                        return j
+            i += 1
+
+        self._scanned = i
+        return None
+
+    def _period_in_word(self, i: int) -> bool:
+        """True if the period at `i` belongs to an abbreviation, initial or list number."""
+        start = i
+        while start > 0 and i - start < MAX_WORD and not self._buffer[start - 1].isspace():
+            start -= 1
+        word = self._buffer[start:i].lstrip("(\"'").lower()
+        if not word:
+            return False
+        if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            return True
+        # "1." at the start of a line is a list marker
+        return word.isdigit() and len(word) <= 2 and (start == 0 or self._buffer[start - 1] == "\n")
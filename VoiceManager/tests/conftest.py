@@ -0,0 +1,6 @@
+import os
+import sys
+
+VOICE_MANAGER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(VOICE_MANAGER_DIR))
+sys.path.insert(0, VOICE_MANAGER_DIR)
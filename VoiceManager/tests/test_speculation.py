@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from common import stream_protocol
+from speculation import Speculator
+from turn_aggregator import TurnAggregator
+
+
+class FakeResponse:
+    status_code = 200
+
+    async def aiter_raw(self):
+        yield stream_protocol.delta("Sure.") + stream_protocol.done()
+
+
+class FakeBackend:
+    def __init__(self):
+        self.requests = []
+
+    @asynccontextmanager
+    async def stream_voice_chat(self, payload: dict):
+        self.requests.append(payload["user_input"])
+        yield FakeResponse()
+
+
+def test_speculation_matches_a_turn_merged_from_fragments():
+    async def run():
+        backend = FakeBackend()
+        aggregator = TurnAggregator(window=0)
+        speculator = Speculator(backend, "session", "default", stable_window=0, aggregator=aggregator)
+
+        speculator.on_transcript("I want to book", is_final=True)
+        await asyncio.sleep(0.01)
+        user_input, _ = await aggregator.prepare(["I want to book"])
+        assert speculator.take(user_input) is not None
+        aggregator.sent(user_input)
+        # the caller went on before any of the reply was spoken
+        aggregator.cut_off(recorded=False)
+
+        speculator.on_transcript("a flight to Paris", is_final=True)
+        await asyncio.sleep(0.01)
+        user_input, _ = await aggregator.prepare(["I want to book", "a flight to Paris"])
+        speculation = speculator.take(user_input)
+        assert speculation is not None
+        assert speculation.text == "I want to book a flight to Paris"
+        assert backend.requests[-1] == "I want to book a flight to Paris"
+
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+from speech_segmenter import SpeechSegmenter, strip_markdown
+
+
+def segment(chunks, **kwargs) -> list:
+    segmenter = SpeechSegmenter(**kwargs)
+    pieces = []
+    for chunk in chunks:
+        pieces.extend(segmenter.push(chunk))
+    return pieces + segmenter.flush()
+
+
+def tokens(text: str) -> list:
+    # streamed a few characters at a time, the way LLM deltas arrive
+    return [text[i:i + 3] for i in range(0, len(text), 3)]
+
+
+def test_first_piece_is_an_early_clause_then_whole_sentences():
+    text = "Sure, I can help with that booking, no problem. Which day suits you? Friday works!"
+    assert segment(tokens(text)) == [
+        "Sure, I can help with that booking,",
+        "no problem.",
+        "Which day suits you?",
+        "Friday works!",
+    ]
+
+
+def test_short_clause_waits_for_the_sentence():
+    assert segment(tokens("Yes, of course. Anything else?")) == ["Yes, of course.", "Anything else?"]
+
+
+def test_abbreviations_initials_and_decimals_do_not_end_a_sentence():
+    text = "Dr. Smith arrives at 10.30 a.m. with J. R. Tolkien. See you then."
+    assert segment(tokens(text)) == [
+        "Dr. Smith arrives at 10.30 a.m. with J. R. Tolkien.",
+        "See you then.",
+    ]
+
+
+def test_lines_are_pieces_and_markdown_is_stripped():
+    text = "Here are the options:\n1. **Economy** class\n- [Business](https://example.com) class\n"
+    # "1." is a list number, not a sentence end, and is read out
+    assert segment(tokens(text), first_clause_chars=100) == [
+        "Here are the options:",
+        "1. Economy class",
+        "Business class",
+    ]
+    assert strip_markdown("## Title\n> `quoted` ~~text~~") == "Title quoted text"
+
+
+def test_text_without_breaks_is_cut_at_a_space():
+    pieces = segment(tokens("word " * 30), max_chars=40)
+    assert all(len(piece) <= 40 for piece in pieces)
+    assert " ".join(pieces).split() == ["word"] * 30
+
+
+def test_sentence_end_before_a_closing_quote():
+    assert segment(tokens('He said "stop." Then he left.')) == ['He said "stop."', "Then he left."]
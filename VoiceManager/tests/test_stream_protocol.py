@@ -0,0 +1,68 @@
+import json
+import asyncio
+
+import pytest
+
+from common import stream_protocol
+from common.stream_protocol import ProtocolError, StreamDecoder
+
+
+async def tokens(words, delay: float = 0.0, fail: bool = False):
+    for word in words:
+        if delay:
+            await asyncio.sleep(delay)
+        yield word
+    if fail:
+        raise asyncio.TimeoutError()
+
+
+def encoded(stream) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in stream])
+    return asyncio.run(collect())
+
+
+def test_events_round_trip_through_the_decoder_in_any_split():
+    body = encoded(stream_protocol.encode_stream(tokens(["Hé", "llo", " there"]), window=0.05))
+
+    for size in (1, 2, 7, len(body)):
+        decoder = StreamDecoder()
+        events = []
+        for i in range(0, len(body), size):
+            events.extend(decoder.feed(body[i:i + size]))
+        events.extend(decoder.close())
+
+        assert all(event["v"] == stream_protocol.VERSION for event in events)
+        assert "".join(e["text"] for e in events if e["type"] == stream_protocol.DELTA) == "Héllo there"
+        assert events[-2] == {"v": 1, "type": "usage", "completion_tokens": 3}
+        assert events[-1]["type"] == stream_protocol.DONE
+
+
+def test_first_token_goes_alone_and_the_rest_are_batched():
+    body = encoded(stream_protocol.encode_stream(tokens(["a", "b", "c", "d"]), window=0.05))
+    deltas = [e["text"] for e in StreamDecoder().feed(body) if e["type"] == stream_protocol.DELTA]
+    assert deltas == ["a", "bcd"]
+
+
+def test_failed_reply_ends_with_a_generic_error_event():
+    body = encoded(stream_protocol.encode_stream(tokens(["a"], fail=True)))
+    events = StreamDecoder().feed(body)
+
+    assert events[-1] == {"v": 1, "type": "error", "code": "timeout", "message": "reply timed out"}
+    assert not any(e["type"] == stream_protocol.DONE for e in events)
+
+
+def test_unknown_fields_are_kept_and_newer_versions_rejected():
+    decoder = StreamDecoder()
+    event = {"v": 1, "type": "emotion", "label": "happy"}
+    assert decoder.feed(json.dumps(event).encode() + b"\n") == [event]
+    # a final event without a trailing newline is still decoded
+    assert decoder.feed(b'{"type": "done"}') == []
+    assert decoder.close() == [{"type": "done"}]
+
+    with pytest.raises(ProtocolError):
+        StreamDecoder().feed(b'{"v": 2, "type": "delta", "text": "hi"}\n')
+    with pytest.raises(ProtocolError):
+        StreamDecoder().feed(b"not json\n")
+    with pytest.raises(ProtocolError):
+        StreamDecoder().feed(b'["delta"]\n')
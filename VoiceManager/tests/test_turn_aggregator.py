@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import turn_aggregator
+from turn_aggregator import TurnAggregator, sounds_unfinished
+
+
+def test_sounds_unfinished():
+    assert sounds_unfinished("I want to book a flight to")
+    assert sounds_unfinished("well, um")
+    assert sounds_unfinished("I was thinking,")
+    assert sounds_unfinished("so...")
+    assert not sounds_unfinished("I want to book a flight.")
+    assert not sounds_unfinished("Book a flight to Paris")
+    assert not sounds_unfinished("")
+
+
+def test_finished_text_is_requested_at_once_and_fragments_are_joined():
+    aggregator = TurnAggregator(window=10)
+
+    async def prepare():
+        return await asyncio.wait_for(aggregator.prepare([" I want to book ", "", "a flight to Paris."]), 1)
+
+    assert asyncio.run(prepare()) == ("I want to book a flight to Paris.", False)
+
+
+def test_caller_going_on_cancels_the_request_during_the_wait():
+    saved_before = turn_aggregator.calls_saved.value
+
+    async def scenario():
+        aggregator = TurnAggregator(window=0.5)
+        request = asyncio.create_task(aggregator.prepare(["I want to book a flight to"]))
+        await asyncio.sleep(0.05)
+        # more speech came in before the window closed
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        return await aggregator.prepare(["I want to book a flight to", "Paris."])
+
+    assert asyncio.run(scenario()) == ("I want to book a flight to Paris.", False)
+    assert turn_aggregator.calls_saved.value == saved_before + 1
+
+
+def test_request_cut_off_after_recording_flags_the_next_as_interrupted():
+    async def scenario():
+        aggregator = TurnAggregator(window=0)
+        text, interrupted = await aggregator.prepare(["Book a flight"])
+        aggregator.sent(text)
+        assert not interrupted and aggregator.pending == "Book a flight"
+
+        aggregator.cut_off(recorded=True)
+        # a later cut-off that was not recorded does not clear the flag
+        aggregator.cut_off(recorded=False)
+        text, interrupted = await aggregator.prepare(["Book a flight", "to Paris"])
+        aggregator.sent(text)
+        assert interrupted and aggregator.pending == "Book a flight to Paris"
+
+        aggregator.answered()
+        assert aggregator.pending == ""
+        return await aggregator.prepare(["Thanks."])
+
+    assert asyncio.run(scenario()) == ("Thanks.", False)
@@ -0,0 +1,105 @@
+import os
+import re
+import asyncio
+import logging
+from typing import List, Tuple
+
+from common import metrics
+
+logger = logging.getLogger("custom_llm_1")
+
+# how long to wait for more speech after a turn that sounds unfinished (0 disables)
+VOICE_TURN_MERGE_MS = float(os.getenv("VOICE_TURN_MERGE_MS", "500"))
+
+# words a finished sentence rarely ends on
+DANGLING_WORDS = {
+    "a", "an", "the", "and", "or", "but", "so", "because", "if", "when", "then", "that", "to", "of", "for",
+    "with", "in", "on", "at", "from", "about", "my", "your", "is", "are", "was", "i", "um", "uh", "like",
+}
+_LAST_WORD = re.compile(r"([a-z']+)\W*$")
+
+llm_calls = metrics.counter("voice_turn_llm_calls_total", "Backend requests sent for user turns")
+calls_saved = metrics.counter(
+    "voice_turn_llm_calls_saved_total", "Replies to a partial turn never requested, because the caller went on talking"
+)
+fragments_merged = metrics.counter("voice_turn_fragments_merged_total", "User fragments sent as part of a later request")
+calls_per_turn = metrics.histogram(
+    "voice_turn_llm_calls", "Backend requests per answered user turn", buckets=(1, 2, 3, 4, 6, 8)
+)
+turns_answered = metrics.counter("voice_turns_answered_total", "User turns the caller heard a reply to")
+# saved per turn: voice_turn_llm_calls_saved_total / voice_turns_answered_total
+
+
+def sounds_unfinished(text: str) -> bool:
+    text = text.strip().lower()
+    if not text or text.endswith("..."):
+        return bool(text)
+    if text[-1] in ".?!":
+        return False
+    if text[-1] in ",-":
+        return True
+    match = _LAST_WORD.search(text)
+    return bool(match) and match.group(1) in DANGLING_WORDS
+
+
+class TurnAggregator:
+    """
+    Turns the user fragments of one turn into a single backend request.
+
+    Endpointing closes the user turn at every long enough pause, so a caller
+    who stops mid-sentence gets a reply requested for each fragment and
+    interrupts it with the next one. `prepare` is given every user message
+    since the last reply the caller heard and joins them. When the text
+    sounds unfinished it first waits `window` seconds: if the caller goes on
+    talking the request is cancelled during that wait and never reaches the
+    backend, and the next one carries all the fragments.
+
+    A request that did reach the backend but was cut off before any of the
+    reply was spoken left its user message in the session; the next request
+    of the turn is flagged `interrupted` so the backend replaces it.
+
+    `pending` is the user input already sent for the turn, which the next
+    request will repeat; the Speculator keys its speculation on it.
+    """
+
+    def __init__(self, window: float = VOICE_TURN_MERGE_MS / 1000):
+        self.window = window
+        # backend requests in the current turn
+        self._calls = 0
+        # a cut-off request left this turn's user message in the backend
+        self._recorded = False
+        # user input of the turn's last request, until a reply is heard
+        self.pending = ""
+
+    async def prepare(self, parts: List[str]) -> Tuple[str, bool]:
+        """(user input, interrupted) for this request; cancelled if the caller keeps talking meanwhile."""
+        text = " ".join(part.strip() for part in parts if part.strip())
+        if self.window > 0 and sounds_unfinished(text):
+            try:
+                await asyncio.sleep(self.window)
+            except asyncio.CancelledError:
+                calls_saved.inc()
+                logger.info(f"Caller went on after {text!r}, no reply requested")
+                raise
+        if len(parts) > 1:
+            fragments_merged.inc(len(parts) - 1)
+        return text, self._recorded
+
+    def sent(self, text: str):
+        """A backend request for `text` went out for the turn."""
+        self.pending = text
+        self._calls += 1
+        llm_calls.inc()
+
+    def cut_off(self, recorded: bool):
+        """The request was cancelled before any reply was spoken; `recorded` if the backend kept its user message."""
+        self._recorded = self._recorded or recorded
+
+    def answered(self):
+        """The caller heard (some of) a reply: the turn is over."""
+        if self._calls:
+            calls_per_turn.observe(self._calls)
+        turns_answered.inc()
+        self._calls = 0
+        self._recorded = False
+        self.pending = ""
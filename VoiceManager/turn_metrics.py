@@ -0,0 +1,40 @@
+import os
+import logging
+
+from livekit.agents import metrics as lk_metrics
+
+from common import metrics
+
+logger = logging.getLogger("custom_llm_1")
+
+# every job process exports its own registry on the first free port from here
+VOICE_METRICS_PORT = int(os.getenv("VOICE_METRICS_PORT", "9100"))
+VOICE_METRICS_PORT_RANGE = int(os.getenv("VOICE_METRICS_PORT_RANGE", "16"))
+
+stt_final_latency = metrics.histogram("voice_stt_final_latency_seconds", "Time from end of speech to the final transcript")
+end_of_turn_delay = metrics.histogram("voice_end_of_turn_delay_seconds", "Time from end of speech to the end of the user turn")
+llm_ttft = metrics.histogram("voice_llm_ttft_seconds", "Time from the end of the user turn to the first reply token")
+llm_tokens_per_second = metrics.histogram(
+    "voice_llm_tokens_per_second", "Reply tokens per second", buckets=metrics.RATE_BUCKETS
+)
+backend_ttft = metrics.histogram("voice_backend_ttft_seconds", "Time from sending a turn to the backend to its first reply text")
+tts_ttfb = metrics.histogram("voice_tts_ttfb_seconds", "Time from text to the first synthesized audio byte")
+
+
+def start_exporter():
+    return metrics.start_http_server(VOICE_METRICS_PORT, attempts=VOICE_METRICS_PORT_RANGE)
+
+
+def observe(agent_metrics):
+    """Feed one LiveKit metrics event (session "metrics_collected") into the histograms."""
+    if isinstance(agent_metrics, lk_metrics.EOUMetrics):
+        stt_final_latency.observe(agent_metrics.transcription_delay)
+        end_of_turn_delay.observe(agent_metrics.end_of_utterance_delay)
+    elif isinstance(agent_metrics, lk_metrics.LLMMetrics):
+        if agent_metrics.ttft >= 0:
+            llm_ttft.observe(agent_metrics.ttft)
+        if agent_metrics.tokens_per_second:
+            llm_tokens_per_second.observe(agent_metrics.tokens_per_second)
+    elif isinstance(agent_metrics, lk_metrics.TTSMetrics):
+        if agent_metrics.ttfb >= 0:
+            tts_ttfb.observe(agent_metrics.ttfb)
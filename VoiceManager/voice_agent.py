@@ -1,3 +1,6 @@
+import os
+import sys
+import asyncio
 import logging
 from typing import Optional
 from dotenv import load_dotenv
@@ -14,7 +17,17 @@ from livekit.agents import (
 )
 # from livekit.agents.voice_assistant import VoiceAssistant
 # from livekit.agents.pipeline.pipeline_agent import VoicePipelineAgent
-from custom_llm_1 import CustomLLM
+
+# shared modules (metrics, stream protocol) live in ../common; every VoiceManager
+# module imports them as `common`, this entrypoint puts the repo root on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from custom_llm import CustomLLM
+from backend_client import get_backend_client
+from speculation import Speculator, VOICE_SPECULATION_ENABLED
+from turn_aggregator import TurnAggregator
+import turn_metrics
+from common.metrics import METRICS_ENABLED
 from livekit.agents import (AutoSubscribe, JobContext, llm)
 from livekit.agents.llm import LLMStream
 from livekit.plugins import (
@@ -35,7 +48,13 @@ print("LIVEKIT_URL =", os.getenv("LIVEKIT_URL"))
 
 
 class Assistant(Agent):
-    def __init__(self, session_id: str, agent_id: str) -> None:
+    def __init__(
+        self,
+        session_id: str,
+        agent_id: str,
+        speculator: Optional[Speculator] = None,
+        aggregator: Optional[TurnAggregator] = None,
+    ) -> None:
         # This project is configured to use Deepgram STT, OpenAI LLM and Cartesia TTS plugins
         # Other great providers exist like Cerebras, ElevenLabs, Groq, Play.ht, Rime, and more
         # Learn more and pick the best one for your app:
@@ -45,7 +64,10 @@ class Assistant(Agent):
             "You should use short and concise responses, and avoiding usage of unpronouncable punctuation. "
             "You were created as a demo to showcase the capabilities of LiveKit's agents framework.",
             stt=openai.STT(),
-            llm=CustomLLM(session_id=session_id, agent_id=agent_id),
+            llm=CustomLLM(
+                session_id=session_id, agent_id=agent_id, backend=get_backend_client(),
+                speculator=speculator, aggregator=aggregator,
+            ),
             tts=openai.TTS(),
             # use LiveKit's transformer-based turn detector
             # turn_detection=MultilingualModel(),
@@ -59,11 +81,19 @@ class Assistant(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    # one pooled keep-alive client to the chat backend for every call in this process
+    proc.userdata["backend"] = get_backend_client()
+    # per-turn latency histograms at :VOICE_METRICS_PORT/metrics
+    turn_metrics.start_exporter()
 
 
 async def entrypoint(ctx: JobContext):
     logger.info(f"connecting to room {ctx.room.name}")
-    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    # open backend connections while the room connects; the process's first call
+    # starts the one keepalive loop of its shared client (prewarm has no event loop)
+    backend = ctx.proc.userdata["backend"]
+    backend.start_keep_warm()
+    await asyncio.gather(ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY), backend.warm())
 
     # Wait for the first participant to connect
     participant = await ctx.wait_for_participant()
@@ -71,15 +101,10 @@ async def entrypoint(ctx: JobContext):
 
     usage_collector = metrics.UsageCollector()
 
-    # Log metrics and collect usage data
-    # def on_metrics_collected(event):
-    #     print(f"Event Type: {type(event)}")
-    #     print(f"Metrics event data: {event}")
-    #     agent_metrics = event.agent_metrics
-    #     usage_collector.collect(agent_metrics)
-    #     if not hasattr(event, "agent_metrics"):
-    #         logger.warning("metrics_collected event missing agent_metrics")
-    #         return
+    # Collect usage data and per-turn latencies (STT, LLM, TTS)
+    def on_metrics_collected(event):
+        usage_collector.collect(event.metrics)
+        turn_metrics.observe(event.metrics)
 
     session = AgentSession(
         vad=ctx.proc.userdata["vad"],
@@ -90,13 +115,21 @@ async def entrypoint(ctx: JobContext):
     )
 
     # Trigger the on_metrics_collected function when metrics are collected
-    # session.on("metrics_collected", on_metrics_collected)
+    if METRICS_ENABLED:
+        session.on("metrics_collected", on_metrics_collected)
 
     room_name = ctx.room.name
     session_id, agent_id = room_name.split("::", 1)
     print(f"Creating Agent for Voice Agent with agent_id: {agent_id} and session_id: {session_id}")
 
-    assistant = Assistant(session_id=session_id, agent_id=agent_id)
+    # one turn, split over pauses, is one request; the speculation must match it
+    aggregator = TurnAggregator()
+    # start the reply on stable transcripts instead of waiting for endpointing
+    speculator = Speculator(backend, session_id, agent_id, aggregator=aggregator) if VOICE_SPECULATION_ENABLED else None
+    if speculator:
+        session.on("user_input_transcribed", lambda ev: speculator.on_transcript(ev.transcript, ev.is_final))
+
+    assistant = Assistant(session_id=session_id, agent_id=agent_id, speculator=speculator, aggregator=aggregator)
 
     await session.start(
         room=ctx.room,
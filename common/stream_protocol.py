@@ -0,0 +1,203 @@
+"""
+Streaming protocol between the backend and the voice worker.
+
+Newline-delimited JSON, one event per line, every event carrying the
+protocol version:
+
+    {"v": 1, "type": "delta", "text": "Hello there"}
+    {"v": 1, "type": "usage", "prompt_tokens": 812, "completion_tokens": 24}
+    {"v": 1, "type": "error", "code": "timeout", "message": "reply timed out"}
+    {"v": 1, "type": "done"}
+
+A stream ends with exactly one `done` or `error` event. Decoders ignore
+fields and event types they don't know; a newer major version is
+rejected. Error events carry a generic message and a code; the exception
+itself is only logged by the sender.
+"""
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger("stream_protocol")
+
+VERSION = 1
+MEDIA_TYPE = "application/x-ndjson"
+
+DELTA = "delta"
+USAGE = "usage"
+ERROR = "error"
+DONE = "done"
+
+# Tokens arriving within this window are sent as one delta event
+FLUSH_WINDOW = 0.02
+# ...unless the batch already holds this much text
+FLUSH_MAX_CHARS = 200
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(event_type: str, **fields) -> bytes:
+    event = {"v": VERSION, "type": event_type}
+    event.update(fields)
+    return (json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def delta(text: str) -> bytes:
+    return encode(DELTA, text=text)
+
+
+def usage(prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> bytes:
+    fields = {}
+    if prompt_tokens is not None:
+        fields["prompt_tokens"] = prompt_tokens
+    if completion_tokens is not None:
+        fields["completion_tokens"] = completion_tokens
+    return encode(USAGE, **fields)
+
+
+def error(message: str, code: str = "internal") -> bytes:
+    return encode(ERROR, code=code, message=message)
+
+
+def error_for(e: BaseException) -> bytes:
+    """Error event for a failed reply; details stay in the server log."""
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+        return error("reply timed out", code="timeout")
+    return error("reply failed", code="internal")
+
+
+def done() -> bytes:
+    return encode(DONE)
+
+
+async def batch_deltas(
+    tokens: AsyncIterator[str],
+    window: float = FLUSH_WINDOW,
+    max_chars: int = FLUSH_MAX_CHARS,
+) -> AsyncIterator[str]:
+    """
+    Merge streamed tokens into fewer, larger pieces.
+
+    The first token goes out at once so time-to-first-token is untouched;
+    after that, tokens are held for up to `window` seconds (or `max_chars`)
+    and sent together. A stalled LLM never holds back text it already sent.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def pump():
+        try:
+            async for token in tokens:
+                queue.put_nowait(token)
+        except Exception as e:
+            # re-raised on the consuming side
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(finished)
+
+    reader = asyncio.create_task(pump())
+    first = True
+    pending: List[str] = []
+    size = 0
+    deadline = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(pending)
+                pending, size, deadline = [], 0, None
+                continue
+
+            if item is finished or isinstance(item, Exception):
+                if pending:
+                    yield "".join(pending)
+                if item is not finished:
+                    raise item
+                return
+            if not item:
+                continue
+
+            if first:
+                first = False
+                yield item
+                continue
+            pending.append(item)
+            size += len(item)
+            if deadline is None:
+                deadline = time.monotonic() + window
+            if size >= max_chars:
+                yield "".join(pending)
+                pending, size, deadline = [], 0, None
+    finally:
+        if not reader.done():
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+
+async def encode_stream(tokens: AsyncIterator[str], window: float = FLUSH_WINDOW, turn_usage=None) -> AsyncIterator[bytes]:
+    """
+    Full event stream for a reply: batched deltas, usage, then done (or error).
+
+    `turn_usage` (anything with prompt_tokens / completion_tokens) supplies
+    the counts for the usage event once `tokens` is exhausted; without it
+    the deltas are counted.
+    """
+    completion_tokens = 0
+
+    async def counted():
+        nonlocal completion_tokens
+        async for token in tokens:
+            # the LLM streams roughly one token per delta
+            completion_tokens += 1
+            yield token
+
+    try:
+        async for text in batch_deltas(counted(), window):
+            yield delta(text)
+    except Exception as e:
+        logger.exception("Reply stream failed")
+        yield error_for(e)
+        return
+    if turn_usage is not None and turn_usage.completion_tokens is not None:
+        yield usage(turn_usage.prompt_tokens, turn_usage.completion_tokens)
+    else:
+        yield usage(completion_tokens=completion_tokens)
+    yield done()
+
+
+class StreamDecoder:
+    """Incremental decoder: feed raw bytes as they arrive, get complete events back."""
+
+    def __init__(self):
+        self._partial = b""
+
+    def feed(self, data: bytes) -> List[Dict]:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [event for event in map(self._decode, lines) if event is not None]
+
+    def close(self) -> List[Dict]:
+        """End of the body: decode whatever is left without a trailing newline."""
+        rest, self._partial = self._partial, b""
+        event = self._decode(rest)
+        return [event] if event is not None else []
+
+    def _decode(self, line: bytes) -> Optional[Dict]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            event = json.loads(line)
+        except ValueError as e:
+            raise ProtocolError(f"Malformed stream event: {line[:80]!r}") from e
+        if not isinstance(event, dict) or "type" not in event:
+            raise ProtocolError(f"Not a stream event: {line[:80]!r}")
+        if event.get("v", VERSION) > VERSION:
+            raise ProtocolError(f"Unsupported stream protocol version {event['v']}")
+        return event
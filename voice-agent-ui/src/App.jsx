@@ -9,6 +9,7 @@ function App() {
   const [transcripts, setTranscripts] = useState([]);
   const [inputText, setInputText] = useState("");
   const [connectionStatus, setConnectionStatus] = useState("Ready");
+  const [isAgentMode, setIsAgentMode] = useState(false);
 
   const socketRef = useRef(null);
   const mediaRecorderRef = useRef(null);
@@ -32,11 +33,31 @@ function App() {
     }
   }, [inputText]);
 
-  const startRecording = async () => {
+  const appendToAgentMessage = (text, isFinal) => {
+    setTranscripts(prev => {
+      const newArr = [...prev];
+      const lastIndex = newArr.length - 1;
+      if (lastIndex >= 0 && newArr[lastIndex].sender === 'agent') {
+        newArr[lastIndex] = {
+          ...newArr[lastIndex],
+          text: newArr[lastIndex].text + text,
+          isFinal
+        };
+      }
+      return newArr;
+    });
+  };
+
+  const startRecording = async (agentMode = false) => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
       setConnectionStatus("Connecting...");
-      socketRef.current = new WebSocket("ws://localhost:8000/api/listen");
+      // In agent mode the server answers each utterance on the same socket
+      const url = agentMode
+        ? `ws://localhost:8000/api/listen?mode=turn&session_id=${sessionIdRef.current}`
+        : "ws://localhost:8000/api/listen";
+      socketRef.current = new WebSocket(url);
+      setIsAgentMode(agentMode);
 
       socketRef.current.onopen = () => {
         setConnectionStatus("Listening...");
@@ -66,6 +87,21 @@ function App() {
           } else {
             setInputText((confirmedTextRef.current ? confirmedTextRef.current + " " : "") + transcript);
           }
+        } else if (data.type === 'reply_start') {
+          // The utterance became a user message; stream the agent reply below it
+          confirmedTextRef.current = "";
+          setInputText("");
+          setTranscripts(prev => [
+            ...prev.map(t => (t.sender === 'agent' && !t.isFinal ? { ...t, isFinal: true } : t)),
+            { text: data.text, sender: 'user', isFinal: true },
+            { text: "", sender: 'agent', isFinal: false }
+          ]);
+        } else if (data.type === 'reply_delta') {
+          appendToAgentMessage(data.text, false);
+        } else if (data.type === 'reply_done') {
+          appendToAgentMessage("", true);
+        } else if (data.type === 'reply_error') {
+          appendToAgentMessage(" (Error: Failed to get response)", true);
         }
       };
 
@@ -97,6 +133,7 @@ function App() {
 
   const stopCleanup = () => {
     setIsRecording(false);
+    setIsAgentMode(false);
     setConnectionStatus("Ready");
     socketRef.current = null;
     mediaRecorderRef.current = null;
@@ -108,6 +145,11 @@ function App() {
     else startRecording();
   };
 
+  const handleToggleAgent = () => {
+    if (isRecording) stopRecording();
+    else startRecording(true);
+  };
+
   const handleSend = async () => {
     if (!inputText.trim()) return;
 
@@ -236,16 +278,16 @@ function App() {
 
             {/* Mic / Stop Button */}
             <button
-              className={`icon-btn mic-action ${isRecording ? 'recording' : ''}`}
+              className={`icon-btn mic-action ${isRecording && !isAgentMode ? 'recording' : ''}`}
               onClick={handleToggleRecord}
             >
               {isRecording ? <IoStop size={24} /> : <IoMic size={24} />}
             </button>
 
-            {/* NEW: Voice Agent Button */}
+            {/* Voice Agent Button: hands-free turns answered over the listen socket */}
             <button 
-              className="icon-btn agent-action"
-              onClick={() => console.log("Voice Agent toggled")}
+              className={`icon-btn agent-action ${isAgentMode ? 'recording' : ''}`}
+              onClick={handleToggleAgent}
               title="Voice Agent"
             >
               <IoHeadset size={24} />